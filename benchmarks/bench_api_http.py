@@ -0,0 +1,134 @@
+"""HTTP-нагрузка на API: запросов в секунду и хвостовые задержки.
+
+Поднимает API на временной базе (gunicorn, если установлен и передан
+--gunicorn, иначе многопоточный werkzeug) и гоняет /api/promocodes
+в трёх режимах: полный ответ, gzip и перепроверка по If-None-Match.
+
+Запуск: python -m benchmarks.bench_api_http [--rows 2000] [--requests 3000] [--gunicorn]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+from benchmarks.common import use_temp_db, percentile
+from benchmarks.datagen import fill_promocodes
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_werkzeug(port):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from bot.api import app
+
+    class QuietHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', port, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def start_gunicorn(port, workers):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'bot/gunicorn_conf.py',
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers), 'bot.api:app'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return process.terminate
+
+
+async def wait_ready(url):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("API не запустился")
+
+
+async def load(url, total, concurrency, headers):
+    latencies = []
+    sizes = []
+    statuses = {}
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        while not queue.empty():
+            i = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get(url, params={'user_id': 1000 + i}, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            # httpx сам распаковывает gzip - считаем байты по сети
+            sizes.append(int(response.headers.get('Content-Length', len(response.content))))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return total / elapsed, latencies, sum(sizes) / len(sizes), statuses
+
+
+async def run(url, args):
+    await wait_ready(url)
+    async with httpx.AsyncClient() as client:
+        etag = (await client.get(url, params={'user_id': 1})).headers['ETag']
+
+    scenarios = [
+        ("полный ответ", {'Accept-Encoding': 'identity'}),
+        ("gzip", {'Accept-Encoding': 'gzip'}),
+        ("If-None-Match", {'Accept-Encoding': 'gzip', 'If-None-Match': etag}),
+    ]
+    print(f"🌐 {url}, {args.requests} запросов, {args.concurrency} одновременно")
+    for name, headers in scenarios:
+        rps, latencies, size, statuses = await load(url, args.requests, args.concurrency, headers)
+        print(f"   {name:14} {rps:8,.0f} rps  p50 {percentile(latencies, 50) * 1000:6.1f} мс  "
+              f"p99 {percentile(latencies, 99) * 1000:6.1f} мс  {size:9,.0f} Б/ответ  {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--gunicorn', action='store_true')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    use_temp_db(seed=False)
+    os.environ.pop('BOT_TOKEN', None)
+    from database import db
+    with db.get_connection() as conn:
+        fill_promocodes(conn, args.rows)
+
+    port = free_port()
+    stop = start_gunicorn(port, args.workers) if args.gunicorn else start_werkzeug(port)
+    try:
+        asyncio.run(run(f"http://127.0.0.1:{port}/api/promocodes", args))
+    finally:
+        stop()
+
+
+if __name__ == '__main__':
+    main()
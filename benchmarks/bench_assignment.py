@@ -0,0 +1,99 @@
+"""Закрепление промокода за пользователем: скорость и перетасовка.
+
+1. Сколько пользователей меняют промокод при добавлении/удалении одного
+   промокода: консистентное хэширование против user_id % N (среднее по
+   нескольким изменениям). Завершается с кодом 1, если новая схема
+   двигает больше 2/N пользователей.
+2. /promo на базе с N строк: старый путь (весь список + остаток от
+   деления) против get_user_promocode.
+
+Запуск: python -m benchmarks.bench_assignment
+"""
+import random
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import use_temp_db, ops_per_second
+from benchmarks.datagen import fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from database import db
+from database.assignment import PromoAssignment
+from database.cache import catalogue_cache
+
+CHURN_SIZES = [20, 1000, 30000]
+DB_ROWS = [1000, 100000]
+USERS = 100000
+
+
+def moved_share(before, after, users):
+    return sum(before(u) != after(u) for u in users) / len(users)
+
+
+def measure_churn(n, rnd, trials=5):
+    """Средняя доля перемещённых пользователей по нескольким изменениям"""
+    users = [rnd.randrange(1, 10 ** 10) for _ in range(USERS)]
+    ids = list(range(1, n + 1))
+    base = PromoAssignment(ids)
+    totals = {'добавили': [0.0, 0.0], 'удалили': [0.0, 0.0]}
+    for trial in range(trials):
+        removed = rnd.choice(ids)
+        changes = (
+            ('добавили', ids + [n + 1 + trial]),
+            ('удалили', [i for i in ids if i != removed]),
+        )
+        for name, changed in changes:
+            index = PromoAssignment(changed)
+            totals[name][0] += moved_share(base.lookup, index.lookup, users) / trials
+            totals[name][1] += moved_share(
+                lambda u: ids[u % len(ids)], lambda u: changed[u % len(changed)], users
+            ) / trials
+    return totals
+
+
+def old_user_promocode(user_id):
+    """Как было: весь список активных и остаток от деления"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    promocodes = conn.execute(db.ACTIVE_PROMOCODES_SQL).fetchall()
+    conn.close()
+    return promocodes[user_id % len(promocodes)] if promocodes else None
+
+
+def main():
+    rnd = random.Random(7)
+    failed = False
+
+    print("🔀 Доля пользователей, сменивших промокод:")
+    for n in CHURN_SIZES:
+        for name, (ring, modulo) in measure_churn(n, rnd).items():
+            ok = ring <= 2 / n
+            failed |= not ok
+            print(f"   N={n:>6}, {name} 1: хэширование {ring:.4%} (идеал {1 / n:.4%}) "
+                  f"{'✅' if ok else '❌'}, user_id % N: {modulo:.2%}")
+
+    print("\n⏱ Персональный промокод, запросов в секунду:")
+    for rows in DB_ROWS:
+        with db.get_connection() as conn:
+            conn.execute("DELETE FROM promocodes")
+        with db.get_connection() as conn:
+            fill_promocodes(conn, rows)
+        catalogue_cache.invalidate()
+
+        started = time.perf_counter()
+        index = db.get_assignment_index()
+        build = time.perf_counter() - started
+
+        old = ops_per_second(lambda: old_user_promocode(rnd.randrange(10 ** 9)), 1.0)
+        new = ops_per_second(lambda: db.get_user_promocode(rnd.randrange(10 ** 9)), 1.0)
+        lookup = ops_per_second(lambda: index.lookup(rnd.randrange(10 ** 9)), 0.5)
+        print(f"   {rows:>7} строк: старый путь {old:,.0f}, get_user_promocode {new:,.0f} "
+              f"(поиск в таблице {lookup:,.0f}), сборка таблицы {build * 1000:.0f} мс")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Рассылка всем пользователям через поддельный Telegram.
+
+Поддельный Bot API соблюдает лимиты как настоящий (429 при превышении)
+и отвечает 403 части пользователей - они «заблокировали бота». Посреди
+рассылки бот останавливается и запускается заново: рассылка должна
+продолжиться с отметки в базе.
+
+Проверяется: каждый незаблокированный пользователь получил сообщение
+ровно один раз, заблокировавшие помечены в базе, повторный /broadcast
+с тем же текстом ничего не отправляет. Печатается скорость и отчёты,
+которые видел админ.
+
+Запуск: python -m benchmarks.bench_broadcast [--users 450] [--restart-after 5]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+from benchmarks.common import use_temp_db
+from benchmarks.fake_telegram import FakeTelegramServer
+
+use_temp_db(seed=False)
+
+from bot import broadcast, main_bot
+from bot.outbound import OutboundLimiter
+from database import db
+
+TOKEN = "123456:TEST"
+ADMIN_ID = 1
+FIRST_USER_ID = 1000
+TEXT = "🔥 Новый промокод!\n\n🏪 Ozon\n🔑 OZONTEST"
+# Каждый двадцатый пользователь заблокировал бота
+BLOCKED_EVERY = 20
+
+
+async def start_application(fake):
+    application = main_bot.build_application(
+        TOKEN, base_url=f"{fake.url}/bot", limiter=OutboundLimiter(priority_chats={ADMIN_ID})
+    )
+    await application.initialize()
+    await application.start()
+    return application
+
+
+async def stop_application(application):
+    # stop() ждёт фоновые задачи: рассылка дорабатывает текущую пачку
+    await application.stop()
+    await application.shutdown()
+
+
+async def wait_finished(broadcast_id):
+    while broadcast.is_running(broadcast_id):
+        await asyncio.sleep(0.1)
+
+
+async def run(fake, restart_after):
+    started = time.perf_counter()
+    application = await start_application(fake)
+    row, _ = await asyncio.to_thread(db.create_broadcast, broadcast.text_key(TEXT), TEXT)
+    broadcast.start_broadcast(application, row['id'], ADMIN_ID)
+    await asyncio.sleep(restart_after)
+    await stop_application(application)
+    interrupted = await asyncio.to_thread(db.get_broadcast, row['id'])
+    print(f"🔁 Перезапуск: статус {interrupted['status']}, дошли до user_id {interrupted['last_user_id']}")
+
+    application = await start_application(fake)
+    await broadcast.resume_broadcasts(application, ADMIN_ID)
+    await wait_finished(row['id'])
+    elapsed = time.perf_counter() - started
+
+    # Повторная рассылка того же текста не должна ничего отправить
+    repeat, created = await asyncio.to_thread(db.create_broadcast, broadcast.text_key(TEXT), TEXT)
+    await stop_application(application)
+    return elapsed, row['id'], created
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=450)
+    parser.add_argument('--restart-after', type=float, default=5)
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    user_ids = [FIRST_USER_ID + i for i in range(args.users)]
+    blocked = {user_id for user_id in user_ids if user_id % BLOCKED_EVERY == 0}
+    for user_id in user_ids:
+        db.upsert_user(user_id, f"User{user_id}")
+
+    fake = FakeTelegramServer(latency=args.latency, flood_control=True, blocked_users=blocked).start()
+    try:
+        elapsed, broadcast_id, created_again = asyncio.run(run(fake, args.restart_after))
+    finally:
+        fake.stop()
+        main_bot.shutdown_db()
+
+    received = Counter(int(p['chat_id']) for p in fake.sent_messages if int(p['chat_id']) != ADMIN_ID)
+    expected = set(user_ids) - blocked
+    duplicates = sum(1 for count in received.values() if count > 1)
+    missing = len(expected - set(received))
+    result = db.get_broadcast(broadcast_id)
+    marked = db.count_users()
+
+    print(f"📤 {len(received)} получателей за {elapsed:.1f} с ({len(received) / elapsed:.1f} сообщ./с), "
+          f"ответов 429: {dict(fake.rejected)}")
+    print(f"   в базе: {dict(result)}")
+    print(f"   дублей: {duplicates}, не получили: {missing}, "
+          f"заблокированных помечено: {args.users - marked}/{len(blocked)}, "
+          f"повторная рассылка создана: {created_again}")
+    reports = [p['text'] for p in fake.sent_messages + fake.edited_messages if int(p['chat_id']) == ADMIN_ID]
+    print(f"   отчётов админу: {len(reports)}, последний:\n{reports[-1] if reports else '-'}")
+
+    # Рассылка «не больше одного раза»: пачка, прерванная остановкой, доработана
+    ok = (not duplicates and result['status'] == 'done' and not created_again
+          and args.users - marked == len(blocked) and missing == 0)
+    print("✅ Рассылка прошла корректно" if ok else "❌ Рассылка прошла с ошибками")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
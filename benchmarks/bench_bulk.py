@@ -0,0 +1,98 @@
+"""Загрузка фида и выгрузка каталога: строк в секунду и пик памяти.
+
+Генерируется фид партнёра (CSV и JSONL) с небольшой долей неверных
+строк и повторов (store, code). Замеряются: первая загрузка в пустую
+базу, повторная загрузка того же фида (всё - обновления), проверка без
+записи и выгрузка в оба формата. Пик памяти (tracemalloc) меряется
+отдельным прогоном и не должен расти с размером таблицы.
+
+Запуск: python -m benchmarks.bench_bulk [число_строк]
+"""
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import use_temp_db
+from benchmarks.datagen import promocode_rows
+
+use_temp_db(seed=False)
+
+from database import bulk, db
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+# Каждая сотая строка - с ошибкой, каждая двадцатая повторяет предыдущую
+INVALID_EVERY = 100
+DUPLICATE_EVERY = 20
+
+
+def feed_rows(count):
+    previous = None
+    for i, (store, code, description, expires_at, is_active, _) in enumerate(promocode_rows(count)):
+        row = {'store': store, 'code': code, 'description': description,
+               'expires_at': expires_at, 'category': '', 'is_active': is_active}
+        if i % INVALID_EVERY == 0:
+            row['expires_at'] = '31.12.2025'
+        elif i % DUPLICATE_EVERY == 0 and previous:
+            row.update(store=previous['store'], code=previous['code'])
+        previous = row
+        yield row
+
+
+def write_feed(path, fmt, count):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=bulk.FIELDS)
+            writer.writeheader()
+            writer.writerows(feed_rows(count))
+        else:
+            for row in feed_rows(count):
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    tmp = tempfile.mkdtemp(prefix='promo_bulk_')
+    feeds = {fmt: os.path.join(tmp, f"feed.{fmt}") for fmt in bulk.FORMATS}
+    for fmt, path in feeds.items():
+        write_feed(path, fmt, ROWS)
+    size = os.path.getsize(feeds['csv']) / 1024 / 1024
+    print(f"📦 Фид: {ROWS} строк ({size:.1f} МБ CSV)")
+
+    for name, fmt, options in (
+        ("загрузка CSV в пустую базу", 'csv', {}),
+        ("повторная загрузка JSONL", 'jsonl', {}),
+        ("проверка без записи", 'csv', {'dry_run': True}),
+    ):
+        report = bulk.import_file(feeds[fmt], **options)
+        print(f"   {name:<28} {report['rows_per_second']:>10,.0f} строк/с  "
+              f"новых {report['inserted']}, обновлено {report['updated']}, ошибок {report['invalid']}")
+
+    with db.get_connection() as conn:
+        total = conn.execute(db.PROMO_TOTALS_SQL).fetchone()['total']
+    for fmt in bulk.FORMATS:
+        path = os.path.join(tmp, f"export.{fmt}")
+        started = time.perf_counter()
+        count = bulk.export_file(path, fmt)
+        elapsed = time.perf_counter() - started
+        print(f"   выгрузка {fmt:<19} {count / elapsed:>10,.0f} строк/с  "
+              f"{count} из {total} строк, {os.path.getsize(path) / 1024 / 1024:.1f} МБ")
+
+    print(f"🧠 Пик памяти: загрузка "
+          f"{peak_memory(lambda: bulk.import_file(feeds['csv'])) / 1024 / 1024:.1f} МБ, "
+          f"выгрузка {peak_memory(lambda: bulk.export_file(os.path.join(tmp, 'export.csv'))) / 1024 / 1024:.1f} МБ "
+          f"(таблица {total} строк)")
+
+
+if __name__ == '__main__':
+    main()
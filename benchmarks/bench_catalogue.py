@@ -0,0 +1,102 @@
+"""Снимок каталога и синхронизация по версиям: размер и время ответа.
+
+Таблица заполняется синтетикой, затем сравниваются размеры полного
+снимка /api/catalogue (строки-списки) и того же каталога объектами,
+как в /api/promocodes, без сжатия и в gzip. Дальше каталог меняется
+небольшой порцией (новые, изменённые, удалённые, просроченные) и
+замеряется ответ с since_version - сколько байт скачивает клиент с
+прошлой версией. Клиент, применивший изменения, должен совпасть с
+новым полным снимком.
+
+Запуск: python -m benchmarks.bench_catalogue [число_строк]
+"""
+import gzip
+import json
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import use_temp_db, percentile
+from benchmarks.datagen import fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from bot.api import app, format_promocodes
+from database import catalogue, db, expiry
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+# Изменений между двумя открытиями мини-аппы
+CHANGES = 50
+REPEAT = 50
+
+
+def sizes(payload):
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+    return len(body), len(gzip.compress(body, compresslevel=9))
+
+
+def request_ms(client, url):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        timings.append(time.perf_counter() - started)
+    return percentile(timings, 50) * 1000, len(response.data)
+
+
+def apply(state, data):
+    """То же, что applyCatalogue в мини-аппе"""
+    rows = {} if data['full'] else dict(state)
+    for promo_id in data['removed']:
+        rows.pop(promo_id, None)
+    for row in data['promocodes']:
+        rows[row[0]] = row
+    return rows
+
+
+def change_catalogue(conn):
+    fill_promocodes(conn, CHANGES // 5, seed=7, start=ROWS)
+    conn.execute("UPDATE promocodes SET description = description || '!' WHERE id IN "
+                 "(SELECT id FROM promocodes WHERE is_active = 1 LIMIT ?)", (CHANGES // 5,))
+    conn.execute("DELETE FROM promocodes WHERE id IN (SELECT id FROM promocodes LIMIT ?)", (CHANGES // 5,))
+    conn.execute("UPDATE promocodes SET expires_at = DATE('now', '-1 day') WHERE id IN "
+                 "(SELECT id FROM promocodes WHERE is_active = 1 ORDER BY id DESC LIMIT ?)", (CHANGES // 5,))
+    conn.commit()
+    expiry.sweep_expired()
+
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    fill_promocodes(conn, ROWS)
+    expiry.sweep_expired()
+
+    full = catalogue.snapshot()
+    with db.get_connection() as read:
+        objects = {'promocodes': format_promocodes(read.execute(db.ACTIVE_PROMOCODES_SQL).fetchall())}
+    print(f"📦 Активных: {len(full['promocodes'])}, версия {full['version']}")
+    print("   полный снимок: {:,} Б (gzip {:,} Б), объектами: {:,} Б (gzip {:,} Б)".format(
+        *sizes(full), *sizes(objects)))
+
+    with app.test_client() as client:
+        ms, size = request_ms(client, '/api/catalogue')
+        print(f"   /api/catalogue: p50 {ms:.2f} мс, {size:,} Б по сети")
+        state = apply({}, full)
+
+        change_catalogue(conn)
+        ms, size = request_ms(client, f"/api/catalogue?since_version={full['version']}")
+        delta = catalogue.changes(full['version'])
+        print(f"🔄 После {CHANGES} изменений: since_version p50 {ms:.2f} мс, {size:,} Б по сети "
+              f"(изменено {len(delta['promocodes'])}, убрано {len(delta['removed'])})")
+        ms, size = request_ms(client, f"/api/catalogue?since_version={delta['version']}")
+        print(f"   без изменений: p50 {ms:.2f} мс, {size:,} Б")
+    conn.close()
+
+    synced = apply(state, delta)
+    fresh = apply({}, catalogue.snapshot())
+    ok = synced == fresh
+    print("✅ Клиент с изменениями совпадает с полным снимком" if ok else "❌ Клиент разошёлся с каталогом")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
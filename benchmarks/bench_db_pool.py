@@ -0,0 +1,72 @@
+"""Сравнение sqlite3.connect на каждый запрос и общего пула соединений.
+
+Запуск: python -m benchmarks.bench_db_pool
+"""
+import sqlite3
+import threading
+import time
+
+from benchmarks.common import use_temp_db, ops_per_second
+
+DB_PATH = use_temp_db()
+
+from database import db
+from database.pool import ConnectionPool
+
+THREADS = 8
+DURATION = 1.0
+
+
+def query_per_connect():
+    """Старый путь: новое соединение на каждый запрос"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute(db.ACTIVE_PROMOCODES_SQL).fetchall()
+    conn.close()
+
+
+def make_query_pooled(pool):
+    def query_pooled():
+        with pool.connection() as conn:
+            conn.execute(db.ACTIVE_PROMOCODES_SQL).fetchall()
+    return query_pooled
+
+
+def run_threads(func, threads=THREADS, duration=DURATION):
+    """Запросов в секунду суммарно по всем потокам"""
+    counts = [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def worker(i):
+        while time.perf_counter() < deadline:
+            func()
+            counts[i] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def main():
+    pool = ConnectionPool(DB_PATH)
+    query_pooled = make_query_pooled(pool)
+
+    results = [
+        ("connect на запрос, 1 поток", ops_per_second(query_per_connect, DURATION)),
+        ("пул, 1 поток", ops_per_second(query_pooled, DURATION)),
+        (f"connect на запрос, {THREADS} потоков", run_threads(query_per_connect)),
+        (f"пул, {THREADS} потоков", run_threads(query_pooled)),
+    ]
+    pool.close()
+
+    print("📊 Активные промокоды, запросов в секунду:")
+    for name, rate in results:
+        print(f"   • {name}: {rate:,.0f}")
+    print(f"🚀 Ускорение (1 поток): x{results[1][1] / results[0][1]:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Приём событий аналитики: запись в буфер, сброс в базу и /api/events.
+
+Замеряются: record() из одного и из нескольких потоков, скорость
+сброса пачками в SQLite, запросы POST /api/events через тестовый
+клиент Flask - с обычной записью и с «зависшей» базой (запись пачки
+спит), чтобы убедиться, что ответ API записи не ждёт. Всплеск record()
+быстрее записи в базу, поэтому часть событий вытесняется из буфера -
+это ожидаемо; в конце проверяется, что каждое событие либо записано
+ровно один раз, либо учтено как потерянное, а итоги event_daily
+совпадают с журналом events.
+
+Запуск: python -m benchmarks.bench_events [число_событий]
+"""
+import json
+import sys
+import threading
+import time
+
+from benchmarks.common import use_temp_db, percentile
+
+use_temp_db(seed=False)
+
+from bot.api import app
+from database import db, events
+
+EVENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+THREADS = 8
+REQUESTS = 2000
+STALL = 0.5
+
+
+def record_rate(count, threads):
+    """Событий в секунду через record() из threads потоков"""
+    per_thread = count // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            events.record('view', 100000 + offset, promo_id=1 + (offset * per_thread + i) % 500)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - started)
+
+
+def drain():
+    """Ждём, пока фоновый поток запишет буфер; возвращаем событий в секунду"""
+    started = time.perf_counter()
+    written = events.stats()['written']
+    while events.stats()['pending']:
+        time.sleep(0.01)
+    return (events.stats()['written'] - written) / (time.perf_counter() - started)
+
+
+def post_events(requests):
+    # Воронка одной сессии: 10 показов, 5 переходов, 3 открытия, 2 копирования
+    funnel = {'view': 10, 'visit': 5, 'reveal': 3, 'copy': 2}
+    payload = json.dumps({'user_id': 42, 'events': [
+        {'type': kind, 'promo_id': promo_id}
+        for kind, count in funnel.items() for promo_id in range(1, count + 1)
+    ]})
+    timings = []
+    with app.test_client() as client:
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.post('/api/events', data=payload, content_type='text/plain')
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 202, response.status_code
+    return len(timings) / sum(timings), percentile(timings, 50) * 1000, percentile(timings, 99) * 1000
+
+
+def main():
+    print(f"📥 record(): 1 поток {record_rate(EVENTS, 1):,.0f} соб./с, "
+          f"{THREADS} потоков {record_rate(EVENTS, THREADS):,.0f} соб./с")
+    print(f"💾 Сброс в SQLite: {drain():,.0f} соб./с "
+          f"(пачки по {events.recorder.batch_size}, последняя {events.stats()['last_flush_ms']:.1f} мс), "
+          f"вытеснено при всплеске: {events.stats()['dropped']}")
+    dropped = events.stats()['dropped']
+
+    rps, p50, p99 = post_events(REQUESTS)
+    drain()
+    print(f"🌐 /api/events по 20 соб.: {rps:,.0f} запр./с, p50 {p50:.2f} мс, p99 {p99:.2f} мс")
+
+    # База «зависла»: каждая пачка пишется STALL секунд
+    writer = events.recorder.writer
+    events.recorder.writer = lambda batch: (time.sleep(STALL), writer(batch))
+    rps, p50, p99 = post_events(REQUESTS // 4)
+    print(f"   при записи пачки {STALL * 1000:.0f} мс: {rps:,.0f} запр./с, p50 {p50:.2f} мс, p99 {p99:.2f} мс")
+    events.recorder.writer = writer
+    drain()
+    events.recorder.close()
+
+    stats = events.stats()
+    with db.get_connection() as conn:
+        logged = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        daily = conn.execute("SELECT SUM(count) FROM event_daily").fetchone()[0]
+    top = max(events.promo_click_through(1), key=lambda row: row['reveal'])
+    print(f"📊 {stats}")
+    print(f"   журнал {logged}, итоги {daily}; больше всего открытий у #{top['promo_id']}: "
+          f"показов {top['view']}, открыли {top['reveal_rate']:.0%}, скопировали {top['copy_rate']:.0%}")
+
+    # После всплеска буфер успевал: новых потерь быть не должно
+    ok = (logged == daily == stats['written'] and stats['written'] + stats['dropped'] == stats['recorded']
+          and stats['dropped'] == dropped)
+    print("✅ События записаны без потерь и дублей" if ok else "❌ События потеряны или задвоены")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
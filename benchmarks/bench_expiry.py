@@ -0,0 +1,85 @@
+"""Сборщик просроченных промокодов: длительность проверок и снятых строк.
+
+Таблица заполняется синтетикой (около трети сроков уже в прошлом) в
+обход миграции, поэтому первая проверка снимает весь накопившийся хвост.
+Дальше замеряются пустая проверка (её бот делает раз в минуту) и
+проверка после «полуночи», когда истекает срок у суточной порции
+промокодов. Для сравнения печатается время выдачи первой страницы
+активных по флагу и с проверкой срока на чтении, как было раньше.
+
+Запуск: python -m benchmarks.bench_expiry [число_строк]
+"""
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import use_temp_db, percentile
+from benchmarks.datagen import fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from database import db, expiry
+from database.cache import catalogue_changed
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+# Промокодов, у которых срок истекает за сутки
+DAILY_EXPIRING = 2000
+REPEAT = 50
+
+OLD_PAGE_SQL = '''
+    SELECT * FROM promocodes
+    WHERE is_active = 1 AND (expires_at IS NULL OR expires_at > DATE('now'))
+    ORDER BY created_at DESC, id DESC
+    LIMIT 50
+'''
+PAGE_SQL = db.PAGE_SQL.format(filters='')
+
+
+def page_ms(conn, sql, *params):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - started)
+    return percentile(timings, 50) * 1000
+
+
+def sweep(name):
+    moved = expiry.sweep_expired()
+    print(f"   {name:<34} снято {moved:>7}, {expiry.sweep_stats['last_duration_ms']:>9.1f} мс")
+
+
+def main():
+    signals = []
+    catalogue_changed.connect(lambda *tags, **info: signals.append(info))
+
+    conn = sqlite3.connect(DB_PATH)
+    started = time.perf_counter()
+    fill_promocodes(conn, ROWS)
+    print(f"📦 Строк: {ROWS} (заполнение {time.perf_counter() - started:.1f} с)")
+
+    print(f"   страница с проверкой срока  {page_ms(conn, OLD_PAGE_SQL):>9.3f} мс")
+    sweep("первая проверка (весь хвост)")
+    sweep("пустая проверка")
+
+    # Суточная порция: срок истёк вчера, флаг ещё стоит
+    conn.execute('''
+        UPDATE promocodes SET is_active = 1, expires_at = DATE('now', '-1 day')
+        WHERE id IN (SELECT id FROM promocodes WHERE is_active = 1 LIMIT ?)
+    ''', (DAILY_EXPIRING,))
+    conn.commit()
+    sweep(f"после полуночи ({DAILY_EXPIRING} истекли)")
+
+    print(f"   страница по флагу           {page_ms(conn, PAGE_SQL, 50):>9.3f} мс")
+    stale = conn.execute(
+        "SELECT COUNT(*) FROM promocodes WHERE is_active = 1 AND expires_at <= DATE('now')"
+    ).fetchone()[0]
+    conn.close()
+
+    print(f"📊 Проверок: {expiry.sweep_stats['sweeps']}, снято всего: {expiry.sweep_stats['rows_moved']}, "
+          f"макс. {expiry.sweep_stats['max_duration_ms']:.0f} мс; сигналов: {len(signals)}, "
+          f"просроченных с флагом: {stale}")
+
+
+if __name__ == '__main__':
+    main()
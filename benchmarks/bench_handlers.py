@@ -0,0 +1,104 @@
+"""Нагрузочный тест обработчиков /promo и /start.
+
+Тысячи смоделированных Update одновременно отправляются в обработчики,
+ответы перехватываются подменённым send_message. Параллельно работает
+поток, который держит блокировку записи, а отдельная задача меряет
+задержку цикла событий.
+
+Запуск: python -m benchmarks.bench_handlers [число_апдейтов]
+"""
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from benchmarks.common import use_temp_db, percentile
+
+DB_PATH = use_temp_db()
+
+from telegram import Bot, Chat, Message, Update, User
+from bot import main_bot
+
+UPDATES = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+
+class FakeBot(Bot):
+    """Bot, который ничего не отправляет в сеть"""
+
+    async def send_message(self, *args, **kwargs):
+        return None
+
+
+def make_update(bot, update_id, user_id, text):
+    user = User(id=user_id, first_name=f"User{user_id}", is_bot=False)
+    chat = Chat(id=user_id, type=Chat.PRIVATE)
+    message = Message(
+        message_id=update_id, date=datetime.now(), chat=chat, from_user=user, text=text
+    )
+    message.set_bot(bot)
+    return Update(update_id=update_id, message=message)
+
+
+def slow_writer(stop):
+    """Периодически держим блокировку записи, как медленная админ-операция"""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    while not stop.is_set():
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE channels SET is_required = is_required")
+        time.sleep(0.05)
+        conn.commit()
+        time.sleep(0.01)
+    conn.close()
+
+
+async def measure_loop_lag(stop, lags):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def run(handler, command, bot):
+    updates = [make_update(bot, i, 1000 + i, command) for i in range(UPDATES)]
+    context = SimpleNamespace(args=[])
+    latencies = []
+
+    async def one(update):
+        started = time.perf_counter()
+        await handler(update, context)
+        latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(u) for u in updates))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    return latencies, elapsed, max(lags, default=0.0)
+
+
+async def main():
+    bot = FakeBot("123456:TEST")
+    stop_writer = threading.Event()
+    writer = threading.Thread(target=slow_writer, args=(stop_writer,))
+    writer.start()
+    try:
+        for command, handler in (("/promo", main_bot.promo_command), ("/start", main_bot.start_command)):
+            latencies, elapsed, max_lag = await run(handler, command, bot)
+            print(f"📨 {command}: {UPDATES} апдейтов за {elapsed:.2f} с ({UPDATES / elapsed:,.0f}/с)")
+            print(f"   p50: {percentile(latencies, 50) * 1000:.1f} мс, "
+                  f"p99: {percentile(latencies, 99) * 1000:.1f} мс, "
+                  f"макс. задержка цикла событий: {max_lag * 1000:.1f} мс")
+    finally:
+        stop_writer.set()
+        writer.join()
+        main_bot.shutdown_db()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
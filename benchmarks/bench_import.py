@@ -0,0 +1,58 @@
+"""Время холодного старта: import bot.api в новом процессе.
+
+Также проверяет, что импорт не трогает базу: файл базы не меняется.
+
+Запуск: python -m benchmarks.bench_import [число_запусков]
+"""
+import hashlib
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import use_temp_db
+
+DB_PATH = use_temp_db()
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def time_import(module):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', f'import {module}'], cwd=ROOT, check=True)
+    return time.perf_counter() - started
+
+
+def self_import_time(module):
+    """Собственное время импорта модуля по -X importtime, мкс"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import bot.api'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    for line in result.stderr.splitlines():
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[0].split(':')[-1])
+    return None
+
+
+def main():
+    before = file_digest(DB_PATH)
+    baseline = [time_import('json') for _ in range(RUNS)]
+    api = [time_import('bot.api') for _ in range(RUNS)]
+    after = file_digest(DB_PATH)
+
+    print(f"⏱ import bot.api, медиана из {RUNS}: {statistics.median(api) * 1000:.0f} мс "
+          f"(пустой интерпретатор: {statistics.median(baseline) * 1000:.0f} мс)")
+    print(f"   собственное время database.db: {self_import_time('database.db')} мкс")
+    print(f"💾 База при импорте {'не изменилась ✅' if before == after else 'ИЗМЕНИЛАСЬ ❌'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Запросы бота на синтетической таблице до и после индексов.
+
+Схема без индексов (миграция 1) заполняется строками, затем
+замеряются запросы из database.db, применяются остальные миграции
+и замеры повторяются.
+
+Запуск: python -m benchmarks.bench_indexes [число_строк]
+"""
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import use_temp_db
+from benchmarks.datagen import fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from database import db, migrations
+from database.query_audit import explain
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+REPEAT = 3
+
+QUERIES = [
+    'ACTIVE_PROMOCODES_SQL',
+    'ACTIVE_PROMOCODES_SQL LIMIT 50',
+    'COUNT_PROMOCODES_SQL',
+    'COUNT_ACTIVE_PROMOCODES_SQL',
+    'COUNT_EXPIRED_PROMOCODES_SQL',
+    'ACTIVE_BY_STORE_SQL',
+]
+# Агрегаты /promo_stats до счётчиков из миграции 7 (их сравнивает bench_stats)
+LEGACY_QUERIES = {
+    'COUNT_PROMOCODES_SQL': 'SELECT COUNT(*) FROM promocodes',
+    'COUNT_ACTIVE_PROMOCODES_SQL': 'SELECT COUNT(*) FROM promocodes WHERE is_active = 1',
+    'COUNT_EXPIRED_PROMOCODES_SQL': 'SELECT COUNT(*) FROM promocodes WHERE is_active = 0',
+    'ACTIVE_BY_STORE_SQL': 'SELECT store, COUNT(*) as count FROM promocodes WHERE is_active = 1 GROUP BY store',
+}
+
+
+def best_time(conn, sql):
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        conn.execute(sql).fetchall()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def query_text(name):
+    if name == 'ACTIVE_PROMOCODES_SQL LIMIT 50':
+        # Первая страница: индекс отдаёт строки уже в нужном порядке
+        return db.ACTIVE_PROMOCODES_SQL + ' LIMIT 50'
+    return LEGACY_QUERIES.get(name) or getattr(db, name)
+
+
+def measure(conn):
+    return {name: (best_time(conn, query_text(name)), explain(conn, query_text(name)))
+            for name in QUERIES}
+
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    # Пересоздаём базу на схеме без индексов
+    tables = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    for (table,) in tables:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+    migrations.MIGRATIONS[0][2](conn)
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+
+    started = time.perf_counter()
+    fill_promocodes(conn, ROWS)
+    print(f"🧪 Сгенерировано {ROWS:,} строк за {time.perf_counter() - started:.1f} с")
+
+    before = measure(conn)
+
+    started = time.perf_counter()
+    migrations.migrate(conn)
+    conn.execute("ANALYZE")
+    print(f"🔧 Индексы построены за {time.perf_counter() - started:.1f} с")
+
+    after = measure(conn)
+    conn.close()
+
+    print(f"\n{'запрос':34} {'без индексов':>14} {'с индексами':>14} {'ускорение':>10}")
+    for name in QUERIES:
+        t0, _ = before[name]
+        t1, plan = after[name]
+        print(f"{name:34} {t0 * 1000:11.1f} мс {t1 * 1000:11.1f} мс {t0 / t1:9.1f}x")
+        print(f"{'':34} план: {'; '.join(plan)}")
+
+
+if __name__ == '__main__':
+    main()
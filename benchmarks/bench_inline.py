@@ -0,0 +1,121 @@
+"""Инлайн-режим: запросов в секунду и p99 на поток нажатий клавиш.
+
+Пользователи набирают начало магазина или кода по одной букве
+(«w», «wi», «wil»...), каждое нажатие - инлайн-запрос. Один и тот же
+поток запросов проходит через:
+  - полнотекстовый поиск в базе (database.search, что было бы без индекса);
+  - индекс префиксов без LRU ответов;
+  - индекс с LRU;
+  - обработчик inline_query целиком (run_db и сборка карточек) с
+    Bot, который ничего не отправляет.
+
+Запуск: python -m benchmarks.bench_inline [число_строк] [запросов]
+"""
+import asyncio
+import random
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import use_temp_db, percentile
+from benchmarks.datagen import STORES, fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from telegram import Bot, InlineQuery, Update, User
+from bot import main_bot
+from database import db, expiry, inline_index, search
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+QUERIES = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+# Столько пользователей одновременно набирают запросы
+TYPISTS = 200
+
+
+class FakeBot(Bot):
+    """Bot, который ничего не отправляет в сеть"""
+
+    async def answer_inline_query(self, *args, **kwargs):
+        return True
+
+
+def keystrokes(conn, count, seed=42):
+    """Поток запросов: префиксы названий магазинов и кодов по нарастающей"""
+    rnd = random.Random(seed)
+    codes = [row[0] for row in conn.execute(
+        "SELECT code FROM promocodes WHERE is_active = 1 ORDER BY RANDOM() LIMIT 500")]
+    typed = []
+    while len(typed) < count:
+        word = rnd.choice(STORES) if rnd.random() < 0.8 else rnd.choice(codes)
+        typed.extend(word[:length] for length in range(1, min(len(word), 8) + 1))
+    # Пользователи печатают одновременно: их нажатия перемешаны
+    chunks = [typed[i::TYPISTS] for i in range(TYPISTS)]
+    return [query for chunk in zip(*chunks) for query in chunk][:count]
+
+
+def measure(name, func, queries):
+    latencies = []
+    started = time.perf_counter()
+    for query in queries:
+        begin = time.perf_counter()
+        func(query)
+        latencies.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - started
+    report(name, latencies, elapsed)
+    return len(queries) / elapsed
+
+
+def report(name, latencies, elapsed):
+    print(f"   {name:<28} {len(latencies) / elapsed:>10,.0f} запр/с, "
+          f"p50 {percentile(latencies, 50) * 1000:7.3f} мс, p99 {percentile(latencies, 99) * 1000:7.3f} мс")
+
+
+async def measure_handler(queries):
+    bot = FakeBot("123456:TEST")
+    user = User(id=1, first_name="User", is_bot=False)
+    updates = []
+    for i, query in enumerate(queries):
+        update = Update(update_id=i, inline_query=InlineQuery(
+            id=str(i), from_user=user, query=query, offset=''))
+        update.inline_query.set_bot(bot)
+        updates.append(update)
+    latencies = []
+
+    async def one(update):
+        begin = time.perf_counter()
+        await main_bot.inline_query(update, None)
+        latencies.append(time.perf_counter() - begin)
+
+    started = time.perf_counter()
+    # Пачками по TYPISTS - как одновременные запросы через вебхук
+    for i in range(0, len(updates), TYPISTS):
+        await asyncio.gather(*(one(update) for update in updates[i:i + TYPISTS]))
+    report("обработчик inline_query", latencies, time.perf_counter() - started)
+
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    fill_promocodes(conn, ROWS)
+    expiry.sweep_expired()
+    queries = keystrokes(conn, QUERIES)
+    conn.close()
+
+    started = time.perf_counter()
+    index = inline_index.get_inline_index()
+    print(f"📦 Индекс: {len(index):,} активных промокодов, {len(index.keys):,} ключей, "
+          f"сборка {time.perf_counter() - started:.2f} с; {len(queries):,} запросов, "
+          f"{len(set(queries)):,} разных")
+
+    fts_queries = queries[:max(1, len(queries) // 10)]
+    fts = measure("FTS в базе (первые 10%)", lambda q: search.search_promocodes(q, limit=50), fts_queries)
+    plain = inline_index.InlineIndex(db.get_active_promocodes(), cache_size=0)
+    raw = measure("индекс без LRU", plain.search, queries)
+    lru = measure("индекс с LRU", index.search, queries)
+    print(f"   LRU: попаданий {index.hits:,}, промахов {index.misses:,}")
+    asyncio.run(measure_handler(queries))
+    main_bot.shutdown_db()
+    print(f"📊 Индекс без LRU {raw / fts:.0f}x быстрее FTS, с LRU ещё {lru / raw:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Цена метрик: каждый путь с инструментированием и без, в одном процессе.
+
+Отдельные процессы на разных базах шумят сильнее самой надбавки, поэтому
+варианты сравниваются на одних данных пачками по BATCH операций вперемешку
+(A, B, A, B...), от каждого берётся медиана времени пачки:
+  - sql - страница каталога (db.PAGE_SQL) на TimedConnection и на обычном
+    sqlite3.Connection;
+  - api - GET /api/promocodes через тестовый клиент Flask с хуками
+    before/after_request и без них;
+  - /search и inline_query - обработчики из build_application с обёрткой
+    metrics.timed и без неё (__wrapped__), Bot ничего не отправляет;
+  - профилировщик - весь набор с запущенным SamplingProfiler и без.
+В конце печатается фрагмент /metrics.
+
+Запуск: python -m benchmarks.bench_metrics [пачек] [строк]
+"""
+import asyncio
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from benchmarks.common import use_temp_db
+from benchmarks.datagen import fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from telegram import Bot, Chat, InlineQuery, Message, Update, User
+from telegram.ext import CommandHandler, InlineQueryHandler
+from bot import api, main_bot
+from database import db, expiry
+import metrics
+
+BATCHES = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+ROWS = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+BATCH = 100
+CATEGORIES = ('food', 'ozon', 'wb')
+INLINE_QUERIES = ('w', 'wi', 'wil', 'o', 'oz', 'ozo', 'ozon', 'sub', 'bu', 'bur')
+
+
+class FakeBot(Bot):
+    """Bot, который ничего не отправляет в сеть"""
+
+    async def send_message(self, *args, **kwargs):
+        return None
+
+    async def answer_inline_query(self, *args, **kwargs):
+        return True
+
+
+def make_updates(bot, count):
+    user = User(id=1, first_name="User", is_bot=False)
+    chat = Chat(id=1, type=Chat.PRIVATE)
+    messages, queries = [], []
+    for i in range(count):
+        message = Message(message_id=i, date=datetime.now(), chat=chat, from_user=user, text="/search скидка")
+        message.set_bot(bot)
+        messages.append(Update(update_id=i, message=message))
+        query = InlineQuery(id=str(i), from_user=user, query=INLINE_QUERIES[i % len(INLINE_QUERIES)], offset='')
+        query.set_bot(bot)
+        queries.append(Update(update_id=i, inline_query=query))
+    return messages, queries
+
+
+def compare(name, plain, instrumented, batches=BATCHES):
+    """Медианы пачек без и с инструментированием (мкс на операцию) и надбавка"""
+    timings = {plain: [], instrumented: []}
+    for _ in range(batches):
+        for func in (plain, instrumented):
+            started = time.perf_counter()
+            func()
+            timings[func].append((time.perf_counter() - started) / BATCH * 1e6)
+    base, timed = statistics.median(timings[plain]), statistics.median(timings[instrumented])
+    print(f"   {name:<26} {base:>9.1f} мкс {timed:>9.1f} мкс {(timed / base - 1) * 100:>+7.1f}%")
+    return base, timed
+
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    fill_promocodes(conn, ROWS)
+    conn.close()
+    # Иначе просроченные строки активны и индекс инлайн-режима сразу устаревает
+    expiry.sweep_expired()
+
+    sql, _ = db.build_page_query(category='food', limit=20)
+    params = [db.build_page_query(category=category, limit=20)[1] for category in CATEGORIES]
+    raw = sqlite3.connect(DB_PATH)
+    timed_conn = sqlite3.connect(DB_PATH, factory=metrics.TimedConnection)
+
+    def sql_batch(conn):
+        return lambda: [conn.execute(sql, params[i % len(params)]).fetchall() for i in range(BATCH)]
+
+    client = api.app.test_client()
+    hooks = (api.app.before_request_funcs[None], api.app.after_request_funcs[None])
+
+    def api_batch(enabled):
+        def run():
+            api.app.before_request_funcs[None], api.app.after_request_funcs[None] = hooks if enabled else ([], [])
+            for i in range(BATCH):
+                client.get(f'/api/promocodes?user_id=1&limit=20&category={CATEGORIES[i % len(CATEGORIES)]}')
+        return run
+
+    bot = FakeBot("123456:TEST")
+    handlers = main_bot.build_application(token="123456:TEST").handlers[0]
+    search_handler = next(h for h in handlers if isinstance(h, CommandHandler) and 'search' in h.commands)
+    inline_handler = next(h for h in handlers if isinstance(h, InlineQueryHandler))
+    messages, queries = make_updates(bot, BATCH)
+    search_context = SimpleNamespace(args=['скидка'])
+    loop = asyncio.new_event_loop()
+
+    def handler_batch(callback, updates, context):
+        async def run():
+            for update in updates:
+                await callback(update, context)
+        return lambda: loop.run_until_complete(run())
+
+    print(f"📦 {ROWS:,} промокодов, {BATCHES} пачек по {BATCH} операций на вариант")
+    print(f"   {'путь':<26} {'без метрик':>13} {'с метриками':>13} {'надбавка':>8}")
+    compare("sql (PAGE_SQL)", sql_batch(raw), sql_batch(timed_conn))
+    compare("api /api/promocodes", api_batch(False), api_batch(True))
+    compare("обработчик /search", handler_batch(search_handler.callback.__wrapped__, messages, search_context),
+            handler_batch(search_handler.callback, messages, search_context))
+    compare("обработчик inline_query", handler_batch(inline_handler.callback.__wrapped__, queries, None),
+            handler_batch(inline_handler.callback, queries, None))
+
+    workload = [sql_batch(timed_conn), api_batch(True),
+                handler_batch(search_handler.callback, messages, search_context),
+                handler_batch(inline_handler.callback, queries, None)]
+
+    def everything():
+        for run in workload:
+            run()
+
+    def profiled():
+        metrics.profiler.start()
+        everything()
+        metrics.profiler.stop()
+
+    print(f"\n🔬 Профилировщик (сэмпл раз в {metrics.PROFILE_INTERVAL * 1000:.0f} мс), весь набор:")
+    compare("без / с профилировщиком", everything, profiled, batches=max(3, BATCHES // 3))
+    loop.close()
+    raw.close()
+    timed_conn.close()
+    main_bot.shutdown_db()
+
+    print("\n📈 Фрагмент /metrics:")
+    counts = [line for line in metrics.render().splitlines() if '_count{' in line]
+    sql_lines = sorted((line for line in counts if line.startswith('promo_sql')),
+                       key=lambda line: -int(line.rsplit(' ', 1)[1]))
+    print('\n'.join([line for line in counts if not line.startswith('promo_sql')] + sql_lines[:5]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Исходящие сообщения под лимитами Telegram: без очереди и с OutboundLimiter.
+
+Поддельный Bot API отвечает 429 с retry_after, как настоящий (общий
+лимит ~30 сообщений/с, один чат - раз в секунду), и дополнительно
+отбивает случайные сообщения. Всплеск ответов пользователям отправляется
+сразу целиком; через секунду админ отправляет несколько команд.
+
+Без очереди часть сообщений теряется на RetryAfter. С OutboundLimiter
+должны дойти все, а ответы админу - раньше ответов пользователям.
+
+Запуск: python -m benchmarks.bench_outbound [--chats 100] [--per-chat 3]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from benchmarks.common import percentile
+from benchmarks.fake_telegram import FakeTelegramServer
+from bot.outbound import OutboundLimiter
+
+TOKEN = "123456:TEST"
+ADMIN_ID = 1
+ADMIN_MESSAGES = 3
+ADMIN_DELAY = 1.0
+
+
+async def send(bot, chat_id, text, latencies, lost):
+    started = time.perf_counter()
+    try:
+        await bot.send_message(chat_id, text)
+        latencies.append(time.perf_counter() - started)
+    except RetryAfter:
+        lost.append(chat_id)
+
+
+async def run(fake, args, limiter):
+    bot = ExtBot(TOKEN, base_url=f"{fake.url}/bot", rate_limiter=limiter,
+                 request=HTTPXRequest(connection_pool_size=64))
+    users, admin, lost = [], [], []
+
+    async def admin_commands():
+        await asyncio.sleep(ADMIN_DELAY)
+        await asyncio.gather(*(send(bot, ADMIN_ID, f"admin {i}", admin, lost)
+                               for i in range(ADMIN_MESSAGES)))
+
+    async with bot:
+        started = time.perf_counter()
+        await asyncio.gather(
+            admin_commands(),
+            *(send(bot, 1000 + chat, f"reply {i}", users, lost)
+              for i in range(args.per_chat) for chat in range(args.chats)),
+        )
+        elapsed = time.perf_counter() - started
+    return elapsed, users, admin, lost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--per-chat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    args = parser.parse_args()
+
+    total = args.chats * args.per_chat + ADMIN_MESSAGES
+    print(f"📤 {total} сообщений в {args.chats + 1} чатов, случайных 429: {args.error_rate:.0%}")
+    ok = True
+    for name, limiter in (("без очереди", None), ("OutboundLimiter", OutboundLimiter(priority_chats={ADMIN_ID}))):
+        fake = FakeTelegramServer(latency=args.latency, flood_control=True, error_rate=args.error_rate).start()
+        try:
+            elapsed, users, admin, lost = asyncio.run(run(fake, args, limiter))
+        finally:
+            fake.stop()
+        delivered = len(users) + len(admin)
+        print(f"\n{name}: доставлено {delivered}/{total} за {elapsed:.1f} с "
+              f"({delivered / elapsed:.1f} сообщ./с), потеряно {len(lost)}, "
+              f"ответов 429: {dict(fake.rejected)}")
+        print(f"   пользователи p50 {percentile(users, 50):.2f} с, p99 {percentile(users, 99):.2f} с; "
+              f"админ p50 {percentile(admin, 50):.2f} с, макс. {max(admin, default=0):.2f} с")
+        if limiter is not None:
+            print(f"   метрики очереди: {limiter.report()}")
+            if lost or percentile(admin, 50) >= percentile(users, 50):
+                ok = False
+    print("\n✅ Все сообщения доставлены, админ обслужен первым" if ok else "\n❌ Очередь не справилась")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""/api/promocodes: весь каталог одним ответом против страниц с фильтрами.
+
+Таблица promocodes растёт до каждого размера из списка, для каждого
+замеряются размер ответа (как есть и в gzip) и время обработки запроса
+через тестовый клиент Flask (без сети, без BOT_TOKEN - доступ открыт).
+Полный ответ меряется без кэша: столько стоит первый запрос после
+любого изменения каталога.
+
+Запуск: python -m benchmarks.bench_pagination [10000,100000,1000000]
+"""
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import use_temp_db, percentile
+from benchmarks.datagen import fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from bot.api import app
+from database.cache import catalogue_cache
+
+SIZES = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '10000,100000,1000000').split(',')]
+REPEAT = 20
+USER_ID = 1000
+
+
+def request(params, headers=None):
+    with app.test_client() as client:
+        started = time.perf_counter()
+        response = client.get('/api/promocodes', query_string={'user_id': USER_ID, **params},
+                              headers=headers or {})
+        elapsed = time.perf_counter() - started
+    assert response.status_code == 200, response.status_code
+    return elapsed, response
+
+
+def measure(params, repeat, cold=False):
+    """(медиана мс, байт как есть, байт gzip, ответ)"""
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            catalogue_cache.invalidate()
+        elapsed, response = request(params)
+        timings.append(elapsed)
+    _, gzipped = request(params, {'Accept-Encoding': 'gzip'})
+    return percentile(timings, 50) * 1000, len(response.data), len(gzipped.data), response.get_json()
+
+
+def scenarios():
+    """(название, параметры, повторов, без кэша)"""
+    _, _, _, first = measure({'limit': 50}, 1)
+    cursor = first['next_cursor']
+    return [
+        ('весь каталог', {}, 1, True),
+        ('весь каталог из кэша', {}, REPEAT, False),
+        ('первая страница', {'limit': 50}, REPEAT, False),
+        ('вторая страница', {'limit': 50, 'cursor': cursor}, REPEAT, False),
+        ('category=food', {'category': 'food'}, REPEAT, False),
+        ('store=Ozon', {'store': 'Ozon'}, REPEAT, False),
+        ('q=подарок', {'q': 'подарок'}, REPEAT, False),
+    ]
+
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    filled = 0
+    for size in SIZES:
+        started = time.perf_counter()
+        fill_promocodes(conn, size - filled, seed=size, start=filled)
+        filled = size
+        print(f"\n📦 Строк: {size} (заполнение {time.perf_counter() - started:.1f} с)")
+        print(f"{'запрос':<24}{'мс':>10}{'байт':>14}{'gzip':>12}{'строк':>8}")
+        for name, params, repeat, cold in scenarios():
+            ms, raw, gzipped, payload = measure(params, repeat, cold)
+            print(f"{name:<24}{ms:>10.2f}{raw:>14}{gzipped:>12}{len(payload['promocodes']):>8}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
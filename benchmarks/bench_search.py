@@ -0,0 +1,94 @@
+"""Полнотекстовый поиск (FTS5) против LIKE '%...%' на большой таблице.
+
+Таблица заполняется синтетикой (индекс FTS ведут триггеры, время
+заполнения печатается), затем для каждого запроса замеряется p50 первых
+SEARCH_LIMIT результатов: database.search (по релевантности) и прежний
+фильтр search страницы каталога (LIKE по трём колонкам, по дате; в API
+его больше нет, search= теперь тоже идёт через database.search).
+Печатается и число найденных строк: LIKE не находит другие формы слова.
+
+Запуск: python -m benchmarks.bench_search [число_строк]
+"""
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import use_temp_db, percentile
+from benchmarks.datagen import fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from database import db, search
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+REPEAT = 20
+QUERIES = [
+    "скидка",            # слово в четверти описаний
+    "скидки доставка",   # другая форма слова и второе слово
+    "starbucks",         # магазин
+    "дост",              # начало слова, как при наборе
+    "SUB0123456",        # точный код
+    "несуществующий",    # ничего не найдётся
+]
+# Прежний фильтр search страницы каталога
+PAGE_LIKE_SQL = '''
+    SELECT * FROM promocodes
+    WHERE is_active = 1 AND (store LIKE ? OR code LIKE ? OR description LIKE ?)
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+'''
+# Как считали раньше: все совпадения LIKE и все совпадения FTS
+COUNT_LIKE_SQL = '''
+    SELECT COUNT(*) FROM promocodes
+    WHERE is_active = 1 AND (store LIKE ? OR code LIKE ? OR description LIKE ?)
+'''
+COUNT_FTS_SQL = '''
+    SELECT COUNT(*) FROM promocodes_fts
+    CROSS JOIN promocodes ON promocodes.id = promocodes_fts.rowid
+    WHERE promocodes_fts MATCH ? AND promocodes.is_active = 1
+'''
+
+
+def p50_ms(func):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return percentile(timings, 50) * 1000
+
+
+def like_page(text):
+    with db.get_connection() as conn:
+        return conn.execute(PAGE_LIKE_SQL, (f"%{text}%",) * 3 + (search.SEARCH_LIMIT,)).fetchall()
+
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    started = time.perf_counter()
+    fill_promocodes(conn, ROWS)
+    elapsed = time.perf_counter() - started
+    print(f"📦 {ROWS:,} строк за {elapsed:.1f} с ({ROWS / elapsed:,.0f} строк/с, с индексом FTS)")
+    pages = dict(conn.execute(
+        "SELECT name, SUM(pgsize) FROM dbstat WHERE name LIKE 'promocodes_fts%' OR name = 'promocodes' GROUP BY 1"
+    ).fetchall()) if conn.execute("SELECT 1 FROM pragma_module_list WHERE name = 'dbstat'").fetchone() else {}
+    if pages:
+        fts = sum(size for name, size in pages.items() if name.startswith('promocodes_fts'))
+        print(f"   таблица {pages.get('promocodes', 0) / 2**20:.1f} МБ, индекс FTS {fts / 2**20:.1f} МБ")
+
+    print(f"{'запрос':<18} {'FTS, мс':>9} {'LIKE, мс':>9} {'найдено FTS':>12} {'найдено LIKE':>13}")
+    like_total = fts_total = 0.0
+    for text in QUERIES:
+        fts_ms = p50_ms(lambda: search.search_promocodes(text, limit=search.SEARCH_LIMIT))
+        like_ms = p50_ms(lambda: like_page(text))
+        fts_found = conn.execute(COUNT_FTS_SQL, (search.match_query(text),)).fetchone()[0]
+        like_found = conn.execute(COUNT_LIKE_SQL, (f"%{text}%",) * 3).fetchone()[0]
+        like_total += like_ms
+        fts_total += fts_ms
+        print(f"{text:<18} {fts_ms:>9.2f} {like_ms:>9.2f} {fts_found:>12,} {like_found:>13,}")
+    conn.close()
+    print(f"📊 Сумма p50: FTS {fts_total:.1f} мс, LIKE {like_total:.1f} мс ({like_total / fts_total:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
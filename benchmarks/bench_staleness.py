@@ -0,0 +1,164 @@
+"""Окно устаревания снимков каталога между процессами.
+
+Несколько процессов-читателей (как воркеры API и бот) читают каталог
+через кэш раз в READ_INTERVAL: db.get_active_promocodes() и
+db.get_required_channels(). Этот процесс пишет в ту же базу: добавляет
+промокоды и каналы, а между ними - много записей пользователей, которые
+каталог не меняют. Для каждого изменения и читателя считается, через
+сколько после коммита читатель его увидел.
+
+Прогон повторяется для каждого CACHE_VERSION_CHECK_INTERVAL; окно должно
+быть не больше интервала плюс READ_INTERVAL, а перезагрузок снимков -
+примерно по одной на изменение каталога, а не на каждую запись в базу.
+Затем меряется цена проверки на одно чтение снимка.
+
+Завершается с кодом 1, если читатель не увидел изменение или окно
+вышло за предел.
+
+Запуск: python -m benchmarks.bench_staleness [--readers 4] [--changes 30]
+        [--intervals 0,0.1,0.5]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import use_temp_db, percentile
+
+# Читатели работают с базой этого процесса (DB_PATH в окружении)
+READER = len(sys.argv) > 2 and sys.argv[1] == '--reader'
+DB_PATH = os.environ['DB_PATH'] if READER else use_temp_db()
+
+from database import db, expiry
+from database.cache import catalogue_cache
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+READ_INTERVAL = 0.005
+# Запас на планировщик ОС: читатели - отдельные процессы
+SLACK = 0.25
+# Записей пользователей между изменениями каталога
+OTHER_WRITES = 20
+
+
+def reader(stop_path):
+    """Читаем каталог, пока не появится stop_path; печатаем, когда что увидели"""
+    seen = {}
+    reads = 0
+    print('ready', flush=True)
+    while not os.path.exists(stop_path):
+        now = time.time()
+        for promo in db.get_active_promocodes():
+            if promo['code'].startswith('STALE') and promo['code'] not in seen:
+                seen[promo['code']] = now
+        for channel in db.get_required_channels():
+            if channel['username'].startswith('stale_') and channel['username'] not in seen:
+                seen[channel['username']] = now
+        reads += 1
+        time.sleep(READ_INTERVAL)
+    print(json.dumps({
+        'seen': seen,
+        'reads': reads,
+        'loads': catalogue_cache.stats()['misses'],
+        **db.version_watcher.stats(),
+    }), flush=True)
+
+
+def write_changes(changes, run_no, seed=42):
+    """Изменения каталога с моментом коммита; между ними - чужие для каталога записи"""
+    rnd = random.Random(seed)
+    written = {}
+    for i in range(changes):
+        time.sleep(rnd.uniform(0.05, 0.2))
+        for _ in range(OTHER_WRITES):
+            db.upsert_user(rnd.randint(1, 10**6), 'User')
+        if i % 5 == 4:
+            key = f"stale_{run_no}_{i}"
+            db.add_channel(f"Канал {i}", key)
+        else:
+            key = f"STALE{run_no}_{i}"
+            db.add_promocode('Bench', key, 'окно устаревания', '2099-12-31')
+        written[key] = time.time()
+    return written
+
+
+def run(run_no, readers, changes, interval):
+    stop_path = os.path.join(tempfile.mkdtemp(prefix='promo_bench_'), 'stop')
+    env = {**os.environ, 'CACHE_VERSION_CHECK_INTERVAL': str(interval)}
+    processes = [
+        subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_staleness', '--reader', stop_path],
+                         cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(readers)
+    ]
+    for process in processes:
+        while process.stdout.readline().strip() != 'ready':
+            pass
+    written = write_changes(changes, run_no)
+    time.sleep(interval + SLACK)
+    open(stop_path, 'w').close()
+    results = [json.loads(process.stdout.read().strip().splitlines()[-1]) for process in processes]
+    for process in processes:
+        process.wait()
+
+    windows, missed = [], 0
+    for result in results:
+        for key, committed in written.items():
+            if key in result['seen']:
+                windows.append(max(0.0, result['seen'][key] - committed))
+            else:
+                missed += 1
+    bound = interval + READ_INTERVAL + SLACK
+    ok = not missed and max(windows) <= bound
+    loads = [result['loads'] for result in results]
+    print(f"   интервал {interval:>5.2f} с: окно p50 {percentile(windows, 50) * 1000:6.1f} мс, "
+          f"p99 {percentile(windows, 99) * 1000:6.1f} мс, макс {max(windows) * 1000:6.1f} мс  "
+          f"не увидели {missed}  загрузок снимков {min(loads)}-{max(loads)} "
+          f"(изменений {changes}, записей {changes * (OTHER_WRITES + 1)}) {'✅' if ok else '❌'}")
+    return ok
+
+
+def check_cost(repeat=100_000):
+    """Цена чтения снимка из кэша: без проверки, с проверкой раз в интервал и каждый раз"""
+    db.get_active_promocodes()
+    watcher = db.version_watcher
+    results = {}
+    for name, before_read, interval in (('без проверки', None, None),
+                                        ('раз в 0.1 с', watcher.check, 0.1),
+                                        ('каждое чтение', watcher.check, 0.0)):
+        catalogue_cache.before_read = before_read
+        if interval is not None:
+            watcher.interval = interval
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.get_active_promocodes()
+        results[name] = (time.perf_counter() - started) / repeat * 1e6
+    catalogue_cache.before_read = watcher.check
+    print("⏱ Чтение снимка: " + ", ".join(f"{name} {micros:.2f} мкс" for name, micros in results.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--changes', type=int, default=30)
+    parser.add_argument('--intervals', default='0,0.1,0.5')
+    args = parser.parse_args()
+
+    print(f"👀 {args.readers} читателей, чтение раз в {READ_INTERVAL * 1000:.0f} мс, "
+          f"{args.changes} изменений каталога, между ними по {OTHER_WRITES} записей пользователей")
+    # Иначе снимки с просроченными промокодами перестраивались бы на каждом чтении
+    expiry.sweep_expired()
+    intervals = [float(interval) for interval in args.intervals.split(',')]
+    ok = all([run(run_no, args.readers, args.changes, interval) for run_no, interval in enumerate(intervals)])
+    check_cost()
+    db.get_pool(DB_PATH).close()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    if READER:
+        reader(sys.argv[2])
+    else:
+        sys.exit(main())
@@ -0,0 +1,143 @@
+"""Отдача мини-аппы: время до первого байта и трафик на открытие.
+
+webapp/app.py запускается настоящим HTTP-сервером дважды: без сборки
+(файлы как есть, как раньше) и со сборкой webapp/build.py (отпечатки,
+предсжатие, immutable). Клиент ведёт себя как браузер: загружает
+index.html и всё, на что он ссылается в assets/, кэширует ответы по
+Cache-Control и при повторном открытии шлёт If-None-Match только для
+того, что нужно перепроверить. Для холодного (пустой кэш) и тёплого
+открытия печатаются число запросов, байты по сети (заголовки и тело) и
+p50 времени до первого байта index.html. Из srcset и image-set
+браузер с экраном 3x и поддержкой AVIF скачивает один вариант - самый
+плотный первого типа, а url() перед image-set ему не нужен.
+
+Запуск: python -m benchmarks.bench_static [открытий]
+"""
+import gzip
+import http.client
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import percentile
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+WEBAPP_DIR = os.path.join(os.path.dirname(__file__), '..', 'webapp')
+sys.path.insert(0, WEBAPP_DIR)
+DIST_DIR = tempfile.mkdtemp(prefix='promo_static_')
+os.environ['WEBAPP_DIST'] = DIST_DIR
+
+import app as webapp
+import build
+
+OPENS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+ASSET_RE = re.compile(r'''(?:\./)?(assets/[\w.-]+)''')
+# url()-запаска и следующий за ней image-set в одном правиле CSS
+IMAGE_SET_RE = re.compile(r"url\([^)]*\);\s*[\w-]+:\s*image-set\((.*?)\);")
+SRCSET_RE = re.compile(r'srcset="([^"]*)"')
+CANDIDATE_RE = re.compile(r"(assets/[\w.-]+)'?\)?\s+([\d.]+)x(?:\s+type\('([^']+)'\))?")
+
+
+def pick_candidate(candidates):
+    """Вариант, который выберет браузер: первый тип, наибольшая плотность"""
+    found = CANDIDATE_RE.findall(candidates)
+    first_type = found[0][2]
+    best = max((item for item in found if item[2] == first_type), key=lambda item: float(item[1]))
+    return best[0]
+
+
+def referenced(html):
+    """Что из assets/ скачает браузер при открытии страницы"""
+    html = IMAGE_SET_RE.sub(lambda m: pick_candidate(m.group(1)), html)
+    html = SRCSET_RE.sub(lambda m: pick_candidate(m.group(1)), html)
+    return sorted(set(ASSET_RE.findall(html)))
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Browser:
+    """Кэш по Cache-Control и ETag, как у браузера"""
+
+    def __init__(self, port):
+        self.port = port
+        self.cache = {}
+
+    def fetch(self, conn, path):
+        """(тело, байт по сети, время до первого байта); из кэша - 0 байт"""
+        cached = self.cache.get(path)
+        if cached and 'immutable' in cached['cache_control']:
+            return cached['body'], 0, 0.0, False
+        headers = {'Accept-Encoding': 'gzip, br'}
+        if cached and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        started = time.perf_counter()
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        ttfb = time.perf_counter() - started
+        body = response.read()
+        size = len(body) + sum(len(k) + len(v) + 4 for k, v in response.getheaders()) + 17
+        if response.status == 304:
+            return cached['body'], size, ttfb, True
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        self.cache[path] = {
+            'body': body,
+            'etag': response.getheader('ETag'),
+            'cache_control': response.getheader('Cache-Control') or '',
+        }
+        return body, size, ttfb, True
+
+    def open(self):
+        """Открытие мини-аппы: (запросов, байт, ttfb index.html)"""
+        conn = http.client.HTTPConnection('127.0.0.1', self.port)
+        body, total, ttfb, _ = self.fetch(conn, '/')
+        requests = 1
+        for path in referenced(body.decode('utf-8')):
+            _, size, _, sent = self.fetch(conn, '/' + path)
+            total += size
+            requests += sent
+        conn.close()
+        return requests, total, ttfb
+
+
+def serve(manifest):
+    webapp.manifest = manifest
+    server = make_server('127.0.0.1', 0, webapp.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(name, manifest):
+    server = serve(manifest)
+    port = server.server_port
+    cold = [Browser(port).open() for _ in range(OPENS)]
+    browser = Browser(port)
+    browser.open()
+    warm = [browser.open() for _ in range(OPENS)]
+    server.shutdown()
+    print(f"📱 {name}")
+    for label, opens in (('холодное', cold), ('тёплое', warm)):
+        requests, size, _ = opens[-1]
+        ttfb = percentile([item[2] for item in opens], 50) * 1000
+        print(f"   {label:<9} запросов {requests:>2}, {size:>9,} Б, TTFB index.html p50 {ttfb:.2f} мс")
+    return cold[-1][1], warm[-1][1]
+
+
+def main():
+    started = time.perf_counter()
+    manifest = build.build(out_dir=DIST_DIR)
+    print(f"📦 Сборка: {len(manifest['files'])} файлов за {(time.perf_counter() - started) * 1000:.0f} мс")
+    plain = measure("без сборки (файлы как есть)", None)
+    built = measure("сборка с отпечатками и предсжатием", manifest)
+    print(f"📊 Трафик: холодное {plain[0] / built[0]:.2f}x меньше, тёплое {plain[1]:,} → {built[1]:,} Б")
+
+
+if __name__ == '__main__':
+    main()
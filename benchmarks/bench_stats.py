@@ -0,0 +1,112 @@
+"""Статистика промокодов: агрегаты по таблице против счётчиков.
+
+Таблица заполняется синтетикой (счётчики ведут триггеры), затем идёт
+смешанная нагрузка: сборщик просроченных, удаление, смена магазина,
+повторная загрузка с включением промокодов. После неё счётчики
+сверяются с COUNT(*) по таблице. Печатается время /promo_stats на
+агрегатах (как было) и на счётчиках и цена триггеров при вставке.
+
+Запуск: python -m benchmarks.bench_stats [число_строк]
+"""
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import use_temp_db, percentile
+from benchmarks.datagen import fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from database import db, expiry
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+REPEAT = 20
+TRIGGERS = ('promocodes_stats_insert', 'promocodes_stats_delete', 'promocodes_stats_update')
+
+# Запросы /promo_stats до миграции 7
+LEGACY_STATS = (
+    'SELECT COUNT(*) FROM promocodes',
+    'SELECT COUNT(*) FROM promocodes WHERE is_active = 1',
+    'SELECT COUNT(*) FROM promocodes WHERE is_active = 0',
+    'SELECT store, COUNT(*) as count FROM promocodes WHERE is_active = 1 GROUP BY store',
+)
+
+
+def median_ms(func):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return percentile(timings, 50) * 1000
+
+
+def insert_rate(conn, count, start):
+    started = time.perf_counter()
+    fill_promocodes(conn, count, seed=start, start=start)
+    return count / (time.perf_counter() - started)
+
+
+def trigger_overhead(conn):
+    """Строк/с при вставке с триггерами и без них (триггеры потом вернём)"""
+    sample = min(ROWS // 10, 100_000)
+    with_triggers = insert_rate(conn, sample, ROWS)
+    sql = {name: conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (name,)).fetchone()[0]
+           for name in TRIGGERS}
+    for name in TRIGGERS:
+        conn.execute(f"DROP TRIGGER {name}")
+    without_triggers = insert_rate(conn, sample, ROWS + sample)
+    conn.execute("DELETE FROM promocodes WHERE id > ?", (ROWS + sample,))
+    for text in sql.values():
+        conn.execute(text)
+    conn.commit()
+    return with_triggers, without_triggers
+
+
+def workload(conn):
+    expiry.sweep_expired()
+    conn.execute("DELETE FROM promocodes WHERE id % 97 = 0")
+    conn.execute("UPDATE promocodes SET store = 'Ozon' WHERE id % 89 = 0")
+    conn.execute("UPDATE promocodes SET is_active = 1 WHERE id % 83 = 0")
+    conn.commit()
+
+
+def mismatches(conn):
+    total, active = db.get_promo_totals()
+    real_total, real_active = conn.execute(
+        "SELECT COUNT(*), SUM(is_active = 1) FROM promocodes").fetchone()
+    problems = []
+    if (total, active) != (real_total, real_active):
+        problems.append(f"итого {total}/{active}, в таблице {real_total}/{real_active}")
+    real = dict(conn.execute(LEGACY_STATS[3]).fetchall())
+    counted = {row['store']: row['count'] for row in db.get_promo_stats()[3]}
+    if real != counted:
+        problems.append(f"по магазинам: {set(real.items()) ^ set(counted.items())}")
+    return problems
+
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    started = time.perf_counter()
+    fill_promocodes(conn, ROWS)
+    print(f"📦 Строк: {ROWS} (заполнение {time.perf_counter() - started:.1f} с)")
+
+    with_triggers, without_triggers = trigger_overhead(conn)
+    print(f"   вставка: {with_triggers:,.0f} строк/с с триггерами, {without_triggers:,.0f} без них")
+
+    workload(conn)
+    problems = mismatches(conn)
+
+    legacy = median_ms(lambda: [conn.execute(sql).fetchall() for sql in LEGACY_STATS])
+    counters = median_ms(lambda: (db.get_promo_stats(), db.get_promo_history(30)))
+    print(f"   /promo_stats: агрегаты {legacy:.1f} мс, счётчики и история {counters:.2f} мс "
+          f"({legacy / counters:.0f}x)")
+    print(f"   дней в истории: {len(db.get_promo_history(400))}")
+    conn.close()
+
+    print("✅ Счётчики совпадают с таблицей" if not problems else f"❌ Расхождения: {problems}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
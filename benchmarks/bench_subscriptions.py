@@ -0,0 +1,95 @@
+"""Проверка подписок через поддельный Telegram Bot API.
+
+Сравнивает старый способ (новый Bot на каждый канал, каналы по очереди)
+с SubscriptionChecker: общий клиент, параллельные проверки, кэш и
+объединение одинаковых запросов. Пользователи открывают мини-аппу
+несколько раз подряд, часть запросов приходит одновременно.
+
+Запуск: python -m benchmarks.bench_subscriptions [пользователей]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from benchmarks.common import percentile
+from benchmarks.fake_telegram import FakeTelegramServer
+
+from telegram import Bot
+from bot.subscriptions import SubscriptionChecker, MEMBER_STATUSES
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+OPENS_PER_USER = 5
+CHANNELS = ['promo_channel_1', 'promo_channel_2', 'promo_channel_3']
+LATENCY = 0.02
+TOKEN = '123456:TEST'
+
+
+def make_requests():
+    rnd = random.Random(1)
+    requests = [user_id for user_id in range(1, USERS + 1) for _ in range(OPENS_PER_USER)]
+    rnd.shuffle(requests)
+    return requests
+
+
+async def naive_check(api_url, user_id):
+    """Как было в bot/api.py: новый Bot и по одному каналу"""
+    results = {}
+    for channel in CHANNELS:
+        bot = Bot(token=TOKEN, base_url=f"{api_url}/bot")
+        member = await bot.get_chat_member(f"@{channel}", user_id)
+        results[channel] = member.status in MEMBER_STATUSES
+    return results
+
+
+async def run(check, requests, parallel=50):
+    """Запросы идут волнами по parallel штук, возвращаем задержки"""
+    latencies = []
+    results = {}
+
+    async def one(user_id):
+        started = time.perf_counter()
+        results[user_id] = await check(user_id)
+        latencies.append(time.perf_counter() - started)
+
+    for i in range(0, len(requests), parallel):
+        await asyncio.gather(*(one(u) for u in requests[i:i + parallel]))
+    return latencies, results
+
+
+async def main():
+    server = FakeTelegramServer(latency=LATENCY).start()
+    requests = make_requests()
+
+    naive_requests = requests[:len(requests) // 10]
+    started = time.perf_counter()
+    naive_latencies, naive_results = await run(lambda u: naive_check(server.url, u), naive_requests)
+    naive_elapsed = time.perf_counter() - started
+    naive_calls = server.calls['getChatMember']
+
+    server.calls.clear()
+    checker = SubscriptionChecker(TOKEN, api_url=server.url)
+    started = time.perf_counter()
+    latencies, results = await run(lambda u: checker.check(u, CHANNELS), requests)
+    elapsed = time.perf_counter() - started
+    await checker.close()
+    server.stop()
+
+    # Результаты обоих способов должны совпадать
+    for user_id, expected in naive_results.items():
+        assert results[user_id] == expected, user_id
+
+    report = checker.report()
+    print(f"🐢 По-старому ({len(naive_requests)} проверок): "
+          f"p50 {percentile(naive_latencies, 50) * 1000:.0f} мс, p99 {percentile(naive_latencies, 99) * 1000:.0f} мс, "
+          f"вызовов API: {naive_calls}, {len(naive_requests) / naive_elapsed:.0f} проверок/с")
+    print(f"🚀 SubscriptionChecker ({len(requests)} проверок): "
+          f"p50 {percentile(latencies, 50) * 1000:.1f} мс, p99 {percentile(latencies, 99) * 1000:.1f} мс, "
+          f"{len(requests) / elapsed:.0f} проверок/с")
+    print(f"📞 Вызовов getChatMember: {server.calls['getChatMember']} "
+          f"вместо {len(requests) * len(CHANNELS)}; сэкономлено {report['api_calls_saved']} "
+          f"(кэш: {report['cache_hits']}, объединено в полёте: {report['coalesced']})")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+"""Открытые промокоды на сервере: строка на пользователя против строки на открытие.
+
+Для USERS пользователей и каталога из PROMOS промокодов генерируется
+перекошенное распределение: большинство открыло несколько промокодов,
+часть - сотни, единицы - почти весь каталог. Одни и те же множества
+пишутся в user_unlocks (компактные BLOB из database.unlocks) и в
+наивную таблицу unlocks(user_id, promo_id, unlocked) без rowid - строка
+на каждый посещённый промокод с флагом «открыт». Печатаются размер
+файла базы и байт на пользователя, объём самих данных, время заполнения
+и p50 чтения состояния и добавления одного промокода.
+
+Запуск: python -m benchmarks.bench_unlocks [пользователей] [промокодов]
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import use_temp_db, percentile
+from benchmarks.datagen import fill_promocodes
+
+DB_PATH = use_temp_db(seed=False)
+
+from database import unlocks
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PROMOS = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+NAIVE_PATH = os.path.join(os.path.dirname(DB_PATH), 'naive.db')
+BATCH = 10_000
+SAMPLES = 2000
+
+NAIVE_TABLE_SQL = '''
+    CREATE TABLE unlocks (
+        user_id INTEGER NOT NULL,
+        promo_id INTEGER NOT NULL,
+        unlocked INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, promo_id)
+    ) WITHOUT ROWID
+'''
+NAIVE_READ_SQL = 'SELECT promo_id, unlocked FROM unlocks WHERE user_id = ?'
+NAIVE_ADD_SQL = '''
+    INSERT INTO unlocks (user_id, promo_id, unlocked) VALUES (?, ?, ?)
+    ON CONFLICT (user_id, promo_id) DO UPDATE SET unlocked = MAX(unlocked, excluded.unlocked)
+'''
+
+
+def unlock_count(rng):
+    """Сколько промокодов открыл пользователь: 90% - до 20, 9% - до 300, 1% - до всего каталога"""
+    roll = rng.random()
+    if roll < 0.90:
+        return rng.randint(1, min(20, PROMOS))
+    if roll < 0.99:
+        return rng.randint(1, min(300, PROMOS))
+    return rng.randint(1, PROMOS)
+
+
+def users(seed=1):
+    """(user_id, открытые, посещённые) - посещённые включают открытые"""
+    rng = random.Random(seed)
+    for user_id in range(1, USERS + 1):
+        unlocked = rng.sample(range(1, PROMOS + 1), unlock_count(rng))
+        visited = unlocked + rng.sample(range(1, PROMOS + 1), rng.randint(0, 3))
+        yield user_id, unlocked, visited
+
+
+def db_size(conn):
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    return page_count * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def fill(conn, sql, rows):
+    """Пишем пачками по BATCH, возвращаем секунды"""
+    started = time.perf_counter()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            conn.executemany(sql, batch)
+            conn.commit()
+            batch = []
+    conn.executemany(sql, batch)
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def compact_rows(payload):
+    for user_id, unlocked, visited in users():
+        row = (user_id, unlocks.encode(unlocks.from_ids(unlocked)), unlocks.encode(unlocks.from_ids(visited)))
+        payload[0] += len(row[1]) + len(row[2])
+        yield row
+
+
+def naive_rows(counter):
+    for user_id, unlocked, visited in users():
+        unlocked = set(unlocked)
+        counter[0] += len(unlocked)
+        for promo_id in sorted(set(visited)):
+            yield user_id, promo_id, int(promo_id in unlocked)
+
+
+def timed_ms(func, args):
+    timings = []
+    for arg in args:
+        started = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - started)
+    return percentile(timings, 50) * 1000
+
+
+def main():
+    print(f"👥 Пользователей: {USERS:,}, промокодов: {PROMOS:,}")
+    compact = sqlite3.connect(DB_PATH)
+    # update_unlocks отбрасывает id больше последнего промокода в базе
+    fill_promocodes(compact, PROMOS)
+    payload = [0]
+    seconds = fill(compact, unlocks.SAVE_UNLOCKS_SQL, compact_rows(payload))
+    compact_size = db_size(compact)
+    compact.close()
+
+    naive = sqlite3.connect(NAIVE_PATH)
+    naive.execute("PRAGMA journal_mode = WAL")
+    naive.execute(NAIVE_TABLE_SQL)
+    entries = [0]
+    naive_seconds = fill(naive, NAIVE_ADD_SQL, naive_rows(entries))
+    naive_size = db_size(naive)
+
+    print(f"   открытий: {entries[0]:,} (в среднем {entries[0] / USERS:.1f} на пользователя)")
+    print(f"📦 user_unlocks: {compact_size / 2 ** 20:,.1f} МБ ({compact_size / USERS:.1f} Б/польз., "
+          f"данные {payload[0] / USERS:.1f} Б/польз.), заполнение {seconds:.0f} с")
+    print(f"📦 строка на открытие: {naive_size / 2 ** 20:,.1f} МБ ({naive_size / USERS:.1f} Б/польз.), "
+          f"заполнение {naive_seconds:.0f} с")
+    print(f"   компактнее в {naive_size / compact_size:.1f} раза")
+
+    rng = random.Random(2)
+    sample = [rng.randint(1, USERS) for _ in range(SAMPLES)]
+    read = timed_ms(lambda user_id: unlocks.to_ids(unlocks.get_unlocks(user_id)[0]), sample)
+    naive_read = timed_ms(lambda user_id: naive.execute(NAIVE_READ_SQL, (user_id,)).fetchall(), sample)
+
+    def naive_add(user_id):
+        naive.execute(NAIVE_ADD_SQL, (user_id, rng.randint(1, PROMOS), 1))
+        naive.commit()
+
+    add = timed_ms(lambda user_id: unlocks.update_unlocks(user_id, unlock=[rng.randint(1, PROMOS)]), sample)
+    naive_add_ms = timed_ms(naive_add, sample)
+    naive.close()
+    print(f"⏱️  p50 чтения: {read:.3f} мс против {naive_read:.3f} мс, "
+          f"открытия одного: {add:.3f} мс против {naive_add_ms:.3f} мс")
+
+
+if __name__ == '__main__':
+    main()
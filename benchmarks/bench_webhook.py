@@ -0,0 +1,161 @@
+"""Пропускная способность вебхука: апдейтов в секунду.
+
+Записанные апдейты (файл JSONL из WEBHOOK_RECORD или синтетический
+всплеск команд) отправляются POST-запросами на вебхук PTB с
+OrderedUpdateProcessor из bot.webhook так, как их шлёт Telegram: до 40
+соединений, с секретом в заголовке, апдейты одного пользователя по
+порядку. Ответы бота уходят в локальный поддельный Bot API с задержкой,
+как у настоящего. После отправки бот сразу останавливается: все
+принятые апдейты должны быть обработаны при остановке.
+
+Проверяется, что ответы каждому пользователю пришли в порядке его команд
+и что запрос без секрета получает 403.
+
+Запуск: python -m benchmarks.bench_webhook [--users 250] [--per-user 4]
+        [--latency 0.01] [--workers 1,8,32,128] [--file updates.jsonl]
+"""
+import argparse
+import asyncio
+import json
+import socket
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.common import use_temp_db
+from benchmarks.datagen import fill_promocodes, telegram_updates
+from benchmarks.fake_telegram import FakeTelegramServer
+
+use_temp_db()
+
+from bot import main_bot
+from bot.outbound import OutboundLimiter
+from bot.webhook import OrderedUpdateProcessor
+from database import db
+
+TOKEN = "123456:TEST"
+# Лимиты Telegram здесь не проверяются (см. bench_outbound) - меряем обработку
+UNLIMITED = 1e9
+CONNECTIONS = 40
+SECRET = "bench-secret"
+WEBHOOK_PATH = "telegram"
+
+# Команда по началу ответа бота
+REPLIES = {"Привет": "/start", "🎁": "/promo", "😔": "/promo", "🆔": "/myid"}
+
+
+def reply_command(text):
+    text = text.strip()
+    for prefix, command in REPLIES.items():
+        if text.startswith(prefix):
+            return command
+    return "/help"
+
+
+def load_updates(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def send_all(url, updates):
+    """Отправка как у Telegram: апдейты пользователя - по одному соединению по порядку.
+
+    Возвращает число запросов, получивших не 200.
+    """
+    shards = defaultdict(list)
+    for update in updates:
+        user = update.get('message', {}).get('from', {}).get('id', update['update_id'])
+        shards[user % CONNECTIONS].append(json.dumps(update).encode())
+    headers = {'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': SECRET}
+    failed = 0
+
+    async def connection(client, bodies):
+        nonlocal failed
+        for body in bodies:
+            response = await client.post(url, content=body, headers=headers)
+            failed += response.status_code != 200
+
+    limits = httpx.Limits(max_connections=CONNECTIONS, max_keepalive_connections=CONNECTIONS)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await asyncio.gather(*(connection(client, bodies) for bodies in shards.values()))
+        forged = await client.post(url, content=shards[next(iter(shards))][0],
+                                   headers={'Content-Type': 'application/json'})
+    return failed, forged.status_code
+
+
+def check_order(updates, sent_messages):
+    """Число пользователей, у которых порядок ответов не совпал с порядком команд"""
+    expected = defaultdict(list)
+    for update in updates:
+        message = update.get('message')
+        if message and message.get('text', '').startswith('/'):
+            expected[message['chat']['id']].append(message['text'].split()[0])
+    actual = defaultdict(list)
+    for params in sent_messages:
+        actual[int(params['chat_id'])].append(reply_command(params.get('text', '')))
+    return sum(1 for chat_id, commands in expected.items() if actual[chat_id] != commands)
+
+
+async def run(fake, updates, workers, queue_size):
+    fake.sent_messages.clear()
+    fake.calls.clear()
+    limiter = OutboundLimiter(global_rate=UNLIMITED, chat_rate=UNLIMITED, chat_burst=UNLIMITED)
+    processor = OrderedUpdateProcessor(workers, queue_size)
+    application = main_bot.build_application(TOKEN, base_url=f"{fake.url}/bot", webhook=True,
+                                             limiter=limiter, processor=processor)
+    port = free_port()
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_webhook(listen='127.0.0.1', port=port, url_path=WEBHOOK_PATH,
+                                            webhook_url=f"{fake.url}/webhook", secret_token=SECRET)
+    await application.start()
+    url = f"http://127.0.0.1:{port}/{WEBHOOK_PATH}"
+
+    started = time.perf_counter()
+    failed, forged = await send_all(url, updates)
+    # Останавливаемся сразу: принятое дорабатывается при остановке
+    await application.updater.stop()
+    await application.stop()
+    elapsed = time.perf_counter() - started
+    await application.shutdown()
+    return elapsed, failed, forged, processor.stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=250)
+    parser.add_argument('--per-user', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--workers', default='1,8,32,128')
+    parser.add_argument('--queue-size', type=int, default=5000)
+    parser.add_argument('--file', help='JSONL с апдейтами, записанными через WEBHOOK_RECORD')
+    args = parser.parse_args()
+
+    with db.get_connection() as conn:
+        fill_promocodes(conn, 1000)
+    updates = load_updates(args.file) if args.file else list(telegram_updates(args.users, args.per_user))
+    fake = FakeTelegramServer(latency=args.latency).start()
+    print(f"📨 {len(updates)} апдейтов, ответ Bot API {args.latency * 1000:.0f} мс, "
+          f"очередь {args.queue_size}")
+    try:
+        for workers in (int(w) for w in args.workers.split(',')):
+            elapsed, failed, forged, stats = asyncio.run(run(fake, updates, workers, args.queue_size))
+            broken = check_order(updates, fake.sent_messages)
+            print(f"   обработчиков {workers:4}: {len(updates) / elapsed:8,.0f} апдейтов/с  "
+                  f"обработано {stats['processed']}/{len(updates)}  "
+                  f"не 200: {failed}  макс. в работе {stats['max_pending']}  "
+                  f"нарушений порядка: {broken}  без секрета: HTTP {forged}")
+    finally:
+        fake.stop()
+        main_bot.shutdown_db()
+
+
+if __name__ == '__main__':
+    main()
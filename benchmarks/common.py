@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import time
+
+# Бенчмарки запускаются из корня проекта: python -m benchmarks.<имя>
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def use_temp_db(seed=True):
+    """Переключаем DB_PATH на временный файл, чтобы не трогать promo_bot.db.
+
+    Вызывать до импорта database.db: путь к базе читается при импорте.
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix='promo_bench_'), 'promo_bot.db')
+    os.environ['DB_PATH'] = path
+
+    from database import db
+    db.init_db()
+    if seed:
+        db.add_sample_data()
+    return path
+
+
+def ops_per_second(func, duration=1.0):
+    """Сколько раз в секунду успевает выполниться func"""
+    count = 0
+    started = time.perf_counter()
+    deadline = started + duration
+    while time.perf_counter() < deadline:
+        func()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def percentile(values, p):
+    """Перцентиль p (0-100) по списку значений"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,135 @@
+"""Генератор синтетических данных: promocodes/channels и апдейты Telegram.
+
+Заполнить файл базы (схема создаётся миграциями, повторный запуск
+дописывает строки):
+    python -m benchmarks.datagen /tmp/bench.db [--promocodes 100000] [--channels 3]
+"""
+import argparse
+import os
+import random
+import sqlite3
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from database import migrations
+from database.categories import guess_category
+
+STORES = [
+    "Wildberries", "Ozon", "AliExpress", "Lamoda", "Яндекс.Маркет", "СберМегаМаркет",
+    "KFC", "Burger King", "McDonald's", "Пятёрочка", "Лента", "Магнит", "Додо Пицца",
+    "Subway", "Starbucks", "Adidas", "Nike", "Reebok", "Rive Gauche", "Л’Этуаль",
+]
+WORDS = ["скидка", "бесплатно", "доставка", "заказ", "подарок", "кэшбэк", "акция", "новинки"]
+
+BATCH = 10000
+
+
+def promocode_rows(count, seed=42, active_share=0.9, start=0):
+    """Строки (store, code, description, expires_at, is_active, created_at).
+
+    Код строится из номера строки: при дозаполнении передавайте start,
+    иначе (store, code) совпадут с уже вставленными.
+    """
+    rnd = random.Random(seed)
+    today = date.today()
+    now = datetime.now()
+    for i in range(start, start + count):
+        store = rnd.choice(STORES)
+        expires = today + timedelta(days=rnd.randint(-180, 365))
+        created = now - timedelta(seconds=rnd.randint(0, 365 * 86400))
+        yield (
+            store,
+            f"{store[:3].upper()}{i:07d}",
+            f"{rnd.randint(5, 50)}% {rnd.choice(WORDS)} {rnd.choice(WORDS)}",
+            expires.isoformat(),
+            1 if rnd.random() < active_share else 0,
+            created.strftime('%Y-%m-%d %H:%M:%S'),
+        )
+
+
+def fill_promocodes(conn, count, seed=42, start=0):
+    """Заполняем promocodes пачками по BATCH строк.
+
+    Колонка category появилась в миграции 3: на более старой схеме
+    (bench_indexes) её заполнит сама миграция.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(promocodes)")}
+    with_category = 'category' in columns
+    sql = '''
+        INSERT INTO promocodes (store, code, description, expires_at, is_active, created_at{})
+        VALUES (?, ?, ?, ?, ?, ?{})
+    '''.format(', category' if with_category else '', ', ?' if with_category else '')
+    rows = promocode_rows(count, seed, start=start)
+    while True:
+        batch = [row for _, row in zip(range(BATCH), rows)]
+        if not batch:
+            break
+        if with_category:
+            batch = [row + (guess_category(row[0]),) for row in batch]
+        conn.executemany(sql, batch)
+    conn.commit()
+
+
+def fill_channels(conn, count, start=0):
+    conn.executemany(
+        "INSERT INTO channels (name, username, is_required) VALUES (?, ?, 1)",
+        [(f"Канал {i}", f"bench_channel_{i}") for i in range(start, start + count)],
+    )
+    conn.commit()
+
+
+COMMANDS = ["/start", "/promo", "/help", "/myid"]
+
+
+def telegram_updates(users, per_user, first_user_id=100000, seed=42):
+    """Апдейты в формате Bot API, как их присылает вебхук.
+
+    Каждый пользователь отправляет per_user команд подряд, пользователи
+    перемешаны между собой - как всплеск после поста в канале.
+    """
+    rnd = random.Random(seed)
+    now = int(datetime.now().timestamp())
+    queue = [user for user in range(users) for _ in range(per_user)]
+    rnd.shuffle(queue)
+    sent = Counter()
+    for update_id, user in enumerate(queue, 1):
+        user_id = first_user_id + user
+        text = COMMANDS[sent[user] % len(COMMANDS)]
+        sent[user] += 1
+        person = {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}
+        yield {
+            'update_id': update_id,
+            'message': {
+                'message_id': sent[user],
+                'date': now,
+                'chat': {'id': user_id, 'type': 'private', 'first_name': person['first_name']},
+                'from': person,
+                'text': text,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}],
+            },
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Заполнить базу синтетическими промокодами и каналами")
+    parser.add_argument('path', help='файл базы (создаётся, если его нет)')
+    parser.add_argument('--promocodes', type=int, default=100_000)
+    parser.add_argument('--channels', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.path)
+    migrations.migrate(conn)
+    promo_start = conn.execute("SELECT COUNT(*) FROM promocodes").fetchone()[0]
+    channel_start = conn.execute("SELECT COUNT(*) FROM channels").fetchone()[0]
+    fill_promocodes(conn, args.promocodes, seed=args.seed, start=promo_start)
+    fill_channels(conn, args.channels, start=channel_start)
+    promocodes = conn.execute("SELECT COUNT(*) FROM promocodes").fetchone()[0]
+    channels = conn.execute("SELECT COUNT(*) FROM channels").fetchone()[0]
+    conn.close()
+    print(f"✅ {args.path}: промокодов {promocodes:,}, каналов {channels}, "
+          f"{os.path.getsize(args.path) / 2**20:.1f} МБ")
+
+
+if __name__ == '__main__':
+    main()
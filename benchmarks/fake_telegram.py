@@ -0,0 +1,196 @@
+"""Локальный поддельный Telegram Bot API для тестов и бенчмарков.
+
+Понимает запросы вида POST /bot<токен>/<метод> в том виде, в каком их
+шлёт python-telegram-bot, считает вызовы по методам и отвечает как
+настоящий API. Работает целиком офлайн.
+
+    server = FakeTelegramServer(latency=0.02).start()
+    bot = Bot(token, base_url=f"{server.url}/bot")
+    ...
+    server.stop()
+
+С flood_control=True сервер, как настоящий, отвечает 429 с retry_after
+на сообщения чаще FLOOD_GLOBAL_RATE в секунду в сумме или чаще одного
+в FLOOD_CHAT_INTERVAL секунд в один чат; error_rate добавляет случайные 429.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+BOT_USER = {'id': 1000000, 'is_bot': True, 'first_name': 'PromoBot', 'username': 'promo_test_bot'}
+
+FLOOD_GLOBAL_RATE = 30
+# Чуть меньше секунды: запас на неравномерность сети между клиентом и сервером
+FLOOD_CHAT_INTERVAL = 0.9
+FLOOD_RETRY_AFTER = 1
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # По умолчанию очередь 5 соединений - мало для нагрузочных тестов
+    request_queue_size = 1024
+
+
+def default_member_status(user_id, chat_id):
+    """Чётные пользователи подписаны на все каналы, нечётные - ни на один"""
+    return 'member' if user_id % 2 == 0 else 'left'
+
+
+class FakeTelegramServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, member_status=default_member_status,
+                 flood_control=False, error_rate=0.0, blocked_users=(), seed=42):
+        self.latency = latency
+        self.member_status = member_status
+        self.flood_control = flood_control
+        self.error_rate = error_rate
+        # Пользователи, заблокировавшие бота: sendMessage им отвечает 403
+        self.blocked_users = set(blocked_users)
+        self.calls = Counter()
+        self.sent_messages = []
+        self.edited_messages = []
+        self.rejected = Counter()
+        self._random = random.Random(seed)
+        self._recent = deque()
+        self._last_by_chat = {}
+        self._lock = threading.Lock()
+        self._message_id = 0
+        self._server = _Server((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # ---------- методы API ----------
+
+    def handle(self, method, params):
+        """Возвращает (HTTP-статус, тело ответа)"""
+        if method.startswith('send') and self._flooded(params.get('chat_id')):
+            return 429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {FLOOD_RETRY_AFTER}",
+                'parameters': {'retry_after': FLOOD_RETRY_AFTER},
+            }
+        handler = getattr(self, f"api_{method}", None)
+        if handler is None:
+            return 200, {'ok': True, 'result': True}
+        return handler(params)
+
+    def _flooded(self, chat_id):
+        """Нужно ли ответить 429 на это сообщение"""
+        with self._lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.rejected['injected'] += 1
+                return True
+            if not self.flood_control:
+                return False
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - 1:
+                self._recent.popleft()
+            if len(self._recent) >= FLOOD_GLOBAL_RATE:
+                self.rejected['global'] += 1
+                return True
+            last = self._last_by_chat.get(chat_id)
+            if last is not None and now - last < FLOOD_CHAT_INTERVAL:
+                self.rejected['chat'] += 1
+                return True
+            self._recent.append(now)
+            self._last_by_chat[chat_id] = now
+            return False
+
+    def api_getMe(self, params):
+        return 200, {'ok': True, 'result': BOT_USER}
+
+    def api_getChatMember(self, params):
+        user_id = int(params['user_id'])
+        status = self.member_status(user_id, params['chat_id'])
+        if status is None:
+            return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: chat not found'}
+        user = {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}
+        return 200, {'ok': True, 'result': {'status': status, 'user': user}}
+
+    def api_sendMessage(self, params):
+        if int(params['chat_id']) in self.blocked_users:
+            return 403, {'ok': False, 'error_code': 403,
+                         'description': 'Forbidden: bot was blocked by the user'}
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+            self.sent_messages.append(params)
+        chat_id = int(params['chat_id'])
+        return 200, {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }}
+
+    def api_editMessageText(self, params):
+        with self._lock:
+            self.edited_messages.append(params)
+        return 200, {'ok': True, 'result': True}
+
+    # ---------- HTTP ----------
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode() if length else ''
+                method = self.path.rsplit('/', 1)[-1]
+                params = fake._parse(body, self.headers.get('Content-Type', ''))
+
+                with fake._lock:
+                    fake.calls[method] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                status, payload = fake.handle(method, params)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    @staticmethod
+    def _parse(body, content_type):
+        if not body:
+            return {}
+        if 'json' in content_type:
+            return json.loads(body)
+        # PTB шлёт форму, где каждое значение - JSON
+        params = {}
+        for key, value in parse_qsl(body):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
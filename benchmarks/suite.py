@@ -0,0 +1,259 @@
+"""Воспроизводимый набор сценариев бота и API с результатами в JSON.
+
+Всё работает офлайн: временная база заполняется генератором (datagen,
+фиксированный seed), Application из bot.main_bot и проверяющий подписки
+из bot.api ходят в локальный FakeTelegramServer. Сценарии:
+  - bot:/start, bot:/promo - команды пользователей через
+    Application.process_update (обработчики, аналитика, ответ в Bot API),
+    по CONCURRENCY апдейтов одновременно, как с вебхука;
+  - bot:admin - админ-команды по кругу (ADMIN_COMMANDS), в том числе
+    добавление промокода; админ один и пишет по одной команде, поэтому
+    последовательно и в ADMIN_OPS_SHARE раз меньше операций (/list_promos
+    шлёт весь каталог кусками по 4000 символов);
+  - api:/api/promocodes (весь каталог и страница), api:/api/catalogue,
+    api:/api/check_subscriptions - через тестовый клиент Flask.
+Чётные пользователи подписаны на все каналы, нечётные - ни на один.
+
+Перед замером каждый сценарий прогревается WARMUP операциями (кэши и
+индексы строятся один раз, а не у первой пачки). Для каждого сценария -
+операций в секунду, p50/p95/p99 и вызовы Bot API.
+Результаты пишутся в --output; --compare прошлый.json печатает разницу и
+завершается с кодом 1, если p50 какого-то сценария вырос больше --threshold %.
+
+Запуск: python -m benchmarks.suite [--promocodes 10000] [--channels 3]
+        [--users 500] [--ops 2000] [--latency 0.005] [--only bot:/promo,api:...]
+        [--output bench_results.json] [--compare base.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import use_temp_db, percentile
+from benchmarks.datagen import fill_channels, fill_promocodes
+from benchmarks.fake_telegram import FakeTelegramServer
+
+TOKEN = "123456:TEST"
+ADMIN_ID = 1
+# Адрес Bot API, токен и админа модули бота читают при импорте
+FAKE = FakeTelegramServer().start()
+os.environ.update(BOT_TOKEN=TOKEN, ADMIN_ID=str(ADMIN_ID), TELEGRAM_API_URL=FAKE.url)
+DB_PATH = use_temp_db(seed=False)
+
+from telegram import Update
+from bot import api, main_bot
+from bot.outbound import OutboundLimiter
+from bot.webapp_auth import sign_init_data
+from database import expiry
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+FIRST_USER_ID = 100000
+# Одновременно обрабатываемых апдейтов, как у вебхука с WEBHOOK_WORKERS
+CONCURRENCY = 32
+# Лимиты Telegram здесь не проверяются (см. bench_outbound) - меряем обработку
+UNLIMITED = 1e9
+ADMIN_OPS_SHARE = 20
+# Операций прогрева перед замером: одна пачка (у админа - круг команд)
+WARMUP = CONCURRENCY
+ADMIN_COMMANDS = [
+    "/admin", "/stats", "/promo_stats", "/promo_ctr", "/list_promos",
+    "/list_channels", "/search скидка", "/add_promo Bench BENCH{n} скидка {date}",
+]
+SCENARIOS = ['bot:/start', 'bot:/promo', 'bot:admin', 'api:/api/promocodes',
+             'api:/api/promocodes?category', 'api:/api/catalogue', 'api:/api/check_subscriptions']
+
+
+def command_update(update_id, user_id, text):
+    """Апдейт с командой в формате Bot API"""
+    command = text.split()[0]
+    person = {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': person['first_name']},
+            'from': person,
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+        },
+    }
+
+
+def bot_updates(scenario, ops, users):
+    expires = (date.today() + timedelta(days=30)).isoformat()
+    for i in range(ops):
+        if scenario == 'bot:admin':
+            text = ADMIN_COMMANDS[i % len(ADMIN_COMMANDS)].format(n=i, date=expires)
+            yield command_update(i + 1, ADMIN_ID, text)
+        else:
+            yield command_update(i + 1, FIRST_USER_ID + i % users, scenario[len('bot:'):])
+
+
+def summary(latencies, elapsed, calls):
+    return {
+        'ops': len(latencies),
+        'seconds': round(elapsed, 4),
+        'ops_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'telegram_calls': dict(sorted(calls.items())),
+    }
+
+
+async def run_bot(scenario, ops, users):
+    limiter = OutboundLimiter(global_rate=UNLIMITED, chat_rate=UNLIMITED, chat_burst=UNLIMITED)
+    application = main_bot.build_application(TOKEN, base_url=f"{FAKE.url}/bot", webhook=True, limiter=limiter)
+    await application.initialize()
+    concurrency, warmup = CONCURRENCY, WARMUP
+    if scenario == 'bot:admin':
+        concurrency, warmup = 1, len(ADMIN_COMMANDS)
+        ops = max(len(ADMIN_COMMANDS), ops // ADMIN_OPS_SHARE)
+    updates = [Update.de_json(data, application.bot) for data in bot_updates(scenario, warmup + ops, users)]
+    latencies = []
+
+    async def one(update):
+        started = time.perf_counter()
+        await application.process_update(update)
+        latencies.append(time.perf_counter() - started)
+
+    warmup, updates = updates[:warmup], updates[warmup:]
+    for i in range(0, len(warmup), concurrency):
+        await asyncio.gather(*(one(update) for update in warmup[i:i + concurrency]))
+    latencies.clear()
+    FAKE.calls.clear()
+    started = time.perf_counter()
+    for i in range(0, len(updates), concurrency):
+        await asyncio.gather(*(one(update) for update in updates[i:i + concurrency]))
+    elapsed = time.perf_counter() - started
+    await application.shutdown()
+    return summary(latencies, elapsed, FAKE.calls)
+
+
+def api_request(client, scenario, i, users):
+    user_id = FIRST_USER_ID + i % users
+    # С BOT_TOKEN пользователя API берёт только из подписанной initData
+    headers = {'X-Telegram-Init-Data': sign_init_data({'id': user_id}, TOKEN)}
+    if scenario == 'api:/api/promocodes':
+        return client.get('/api/promocodes', headers=headers)
+    if scenario == 'api:/api/promocodes?category':
+        return client.get('/api/promocodes?category=food&limit=20', headers=headers)
+    if scenario == 'api:/api/catalogue':
+        return client.get('/api/catalogue')
+    return client.post('/api/check_subscriptions', json={}, headers=headers)
+
+
+def run_api(scenario, ops, users):
+    client = api.app.test_client()
+    for i in range(WARMUP):
+        api_request(client, scenario, ops + i, users)
+    FAKE.calls.clear()
+    latencies = []
+    started = time.perf_counter()
+    for i in range(ops):
+        begin = time.perf_counter()
+        response = api_request(client, scenario, i, users)
+        latencies.append(time.perf_counter() - begin)
+        if response.status_code != 200:
+            raise RuntimeError(f"{scenario}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}")
+    return summary(latencies, time.perf_counter() - started, FAKE.calls)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, base, threshold):
+    """Печатает разницу с прошлым прогоном; возвращает число регрессий p50"""
+    regressions = 0
+    print(f"\n📊 Сравнение с {base['meta'].get('git')} от {base['meta'].get('started_at')}:")
+    for name, current in results['scenarios'].items():
+        old = base['scenarios'].get(name)
+        if old is None:
+            print(f"   {name:<32} новый сценарий")
+            continue
+        change = (current['p50_ms'] / old['p50_ms'] - 1) * 100 if old['p50_ms'] else 0.0
+        speed = (current['ops_per_sec'] / old['ops_per_sec'] - 1) * 100 if old['ops_per_sec'] else 0.0
+        mark = '❌' if change > threshold else '✅'
+        regressions += change > threshold
+        print(f"   {mark} {name:<30} p50 {old['p50_ms']:>8.2f} → {current['p50_ms']:>8.2f} мс ({change:+6.1f}%), "
+              f"оп/с {speed:+6.1f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--promocodes', type=int, default=10_000)
+    parser.add_argument('--channels', type=int, default=3)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--ops', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.005, help='ответ поддельного Bot API, с')
+    parser.add_argument('--only', help='сценарии через запятую')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='JSON прошлого прогона')
+    # Повторные прогоны на одной машине расходятся на 10-20%
+    parser.add_argument('--threshold', type=float, default=20.0, help='допустимый рост p50, %%')
+    args = parser.parse_args()
+    scenarios = args.only.split(',') if args.only else SCENARIOS
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}; есть: {', '.join(SCENARIOS)}")
+
+    conn = sqlite3.connect(DB_PATH)
+    fill_promocodes(conn, args.promocodes)
+    fill_channels(conn, args.channels)
+    conn.close()
+    expiry.sweep_expired()
+    FAKE.latency = args.latency
+
+    results = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        },
+        'scenarios': {},
+    }
+    print(f"📦 {args.promocodes:,} промокодов, {args.channels} каналов, {args.users} пользователей, "
+          f"{args.ops} операций на сценарий, Bot API {args.latency * 1000:.0f} мс")
+    try:
+        for scenario in scenarios:
+            if scenario.startswith('bot:'):
+                result = asyncio.run(run_bot(scenario, args.ops, args.users))
+            else:
+                result = run_api(scenario, args.ops, args.users)
+            results['scenarios'][scenario] = result
+            calls = sum(result['telegram_calls'].values())
+            print(f"   {scenario:<32} {result['ops_per_sec']:>9,.1f} оп/с  p50 {result['p50_ms']:>8.2f} мс  "
+                  f"p99 {result['p99_ms']:>8.2f} мс  Bot API: {calls}")
+    finally:
+        FAKE.stop()
+        main_bot.shutdown_db()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"💾 Результаты: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            base = json.load(f)
+        return 1 if compare(results, base, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,83 +1,329 @@
-from flask import Flask, request, jsonify
-from database.db import get_active_promocodes, get_required_channels
-import sqlite3
+from flask import Flask, Response, g, request, jsonify
+from telegram.error import TelegramError
+from database.db import init_db, get_active_promocodes, get_required_channels, get_promocodes_page, PAGE_SIZE
 import os
-from telegram import Bot
-import asyncio
+import threading
+import time
+from bot.responses import PreparedResponse
+from bot.subscriptions import SubscriptionChecker, BackgroundLoop
+from bot.webapp_auth import verify_init_data
+from database.cache import cached, earliest_expiry
+from database import catalogue, events, search, unlocks
+import metrics
 
 app = Flask(__name__)
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+SUBSCRIPTION_TIMEOUT = float(os.getenv('SUBSCRIPTION_TIMEOUT', '10'))
+# Ответ зависит от подписки пользователя: общие кэши его хранить не должны,
+# а браузер переспрашивает каждый раз, получая дешёвый 304 по ETag
+API_CACHE_CONTROL = 'private, no-cache'
+# Снимок каталога одинаков для всех и без кодов (как статический
+# catalogue.json на GitHub Pages): коды отдают только /api/promocodes и
+# /api/unlocks после проверки подписки
+CATALOGUE_CACHE_CONTROL = 'public, no-cache'
+# Параметры, при которых /api/promocodes отдаёт страницу, а не весь каталог
+# (q - полнотекстовый поиск, результаты по релевантности; search - его
+# старое имя)
+PAGE_PARAMS = ('category', 'store', 'search', 'cursor', 'limit', 'q')
+# Мини-аппа копит события и присылает их пачкой
+MAX_EVENTS_PER_REQUEST = int(os.getenv('MAX_EVENTS_PER_REQUEST', '100'))
+# Первый запуск мини-аппы переносит на сервер всё открытое на устройстве
+MAX_UNLOCKS_PER_REQUEST = int(os.getenv('MAX_UNLOCKS_PER_REQUEST', '1000'))
 
-# Функция для проверки подписки пользователя на канал
-async def check_user_subscription(user_id, channel_username):
+_checker = None
+_checker_pid = None
+_checker_lock = threading.Lock()
+_loop = BackgroundLoop()
+
+def get_checker():
+    """Общий проверяющий подписки на процесс (None, если нет BOT_TOKEN)"""
+    global _checker, _checker_pid
+    if not BOT_TOKEN:
+        return None
+    with _checker_lock:
+        if _checker is None or _checker_pid != os.getpid():
+            _checker = SubscriptionChecker(BOT_TOKEN)
+            _checker_pid = os.getpid()
+        return _checker
+
+def request_user_id(data):
+    """id пользователя запроса (0, если его нет или подпись неверна).
+
+    С BOT_TOKEN - только из initData мини-аппы с проверенной подписью
+    (заголовок X-Telegram-Init-Data или поле init_data: sendBeacon
+    заголовков не шлёт), без токена - режим разработки, берём user_id
+    """
+    if BOT_TOKEN:
+        init_data = request.headers.get('X-Telegram-Init-Data') or data.get('init_data')
+        user = verify_init_data(init_data, BOT_TOKEN)
+        return user['id'] if user else 0
     try:
-        bot = Bot(token=BOT_TOKEN)
-        chat_member = await bot.get_chat_member(f"@{channel_username}", user_id)
-        return chat_member.status in ['member', 'administrator', 'creator']
-    except Exception as e:
-        print(f"Ошибка проверки подписки: {e}")
-        return False
+        return int(data.get('user_id') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def user_required():
+    """Ответ на запрос без пользователя"""
+    if BOT_TOKEN:
+        return jsonify({'error': 'Valid Telegram init data required'}), 401
+    return jsonify({'error': 'User ID required'}), 400
+
+def check_subscriptions(user_id, channels):
+    """Возвращает список каналов, на которые пользователь не подписан"""
+    checker = get_checker()
+    if checker is None or not channels:
+        # Без токена проверять нечем - режим разработки, пускаем всех
+        return []
+    usernames = [channel['username'] for channel in channels]
+    results = _loop.run(checker.check(user_id, usernames), timeout=SUBSCRIPTION_TIMEOUT)
+    return [channel for channel in channels if not results[channel['username']]]
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    """Время запроса по шаблону маршрута (/api/promocodes), а не по URL"""
+    if metrics.METRICS_ENABLED and 'started' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_seconds.observe(time.perf_counter() - g.started, route, request.method, response.status_code)
+    return response
+
+@app.errorhandler(TimeoutError)
+def subscription_timeout(error):
+    return jsonify({'error': 'Telegram не ответил вовремя, попробуй ещё раз'}), 503
+
+@app.errorhandler(TelegramError)
+def subscription_error(error):
+    """Сеть, таймаут или 429 при проверке подписки: результата нет, не «не подписан»"""
+    return jsonify({'error': 'Не удалось проверить подписку, попробуй ещё раз'}), 503
+
+def format_channels(channels):
+    """Каналы для JSON"""
+    return [{'id': channel['id'], 'name': channel['name'], 'username': channel['username']}
+            for channel in channels]
+
+def format_promocodes(promocodes):
+    """Промокоды для JSON"""
+    promocodes_list = []
+    for promo in promocodes:
+        promocodes_list.append({
+            'id': promo['id'],
+            'store': promo['store'],
+            'code': promo['code'],
+            'description': promo['description'],
+            'category': promo['category'],
+            'expires_at': promo['expires_at']
+        })
+    return promocodes_list
+
+@cached('promocodes', 'channels', expires=lambda response: response.expires_at)
+def catalogue_response():
+    """Ответ /api/promocodes для подписанного пользователя (один на версию каталога)"""
+    promocodes = get_active_promocodes()
+    
+    return PreparedResponse({
+        'access': True,
+        'promocodes': format_promocodes(promocodes),
+        'channels': format_channels(get_required_channels())
+    }, cache_control=API_CACHE_CONTROL, expires_at=earliest_expiry(promocodes))
+
+@cached('channels')
+def locked_response():
+    """Ответ /api/promocodes без подписки: только список каналов"""
+    return PreparedResponse({
+        'access': False,
+        'promocodes': [],
+        'channels': format_channels(get_required_channels())
+    }, cache_control=API_CACHE_CONTROL)
+
+def format_unlocks(unlocked, visited, promo_ids=None):
+    """Открытые и посещённые id для JSON (только из promo_ids, если заданы)"""
+    unlocked, visited = unlocks.to_ids(unlocked), unlocks.to_ids(visited)
+    if promo_ids is not None:
+        unlocked = [promo_id for promo_id in unlocked if promo_id in promo_ids]
+        visited = [promo_id for promo_id in visited if promo_id in promo_ids]
+    return {'unlocked': unlocked, 'visited': visited}
+
+@cached('promocodes', expires=lambda codes: earliest_expiry(get_active_promocodes()))
+def active_codes():
+    """{id: код} активных промокодов (один на версию каталога)"""
+    return {promo['id']: promo['code'] for promo in get_active_promocodes()}
+
+def unlocks_response(user_id, state):
+    """Открытые и посещённые id, а подписанному на каналы - и коды открытых"""
+    result = format_unlocks(*state)
+    if not check_subscriptions(user_id, get_required_channels()):
+        codes = active_codes()
+        result['codes'] = {promo_id: codes[promo_id] for promo_id in result['unlocked'] if promo_id in codes}
+    return jsonify(result)
+
+@cached('promocodes', 'channels')
+def catalogue_snapshot_response():
+    """Полный снимок каталога для мини-аппы (один на версию каталога)"""
+    return PreparedResponse(catalogue.snapshot(), cache_control=CATALOGUE_CACHE_CONTROL)
+
+def page_response(user_id):
+    """Страница каталога по фильтрам из запроса (None, если параметры неверные)"""
+    try:
+        query = request.args.get('q', request.args.get('search'))
+        if query is not None:
+            # Релевантность не продолжить курсором по дате: только первые limit
+            promocodes, next_cursor = search.search_promocodes(
+                query,
+                category=request.args.get('category'),
+                store=request.args.get('store'),
+                limit=request.args.get('limit', search.SEARCH_LIMIT, type=int),
+            ), None
+        else:
+            promocodes, next_cursor = get_promocodes_page(
+                category=request.args.get('category'),
+                store=request.args.get('store'),
+                cursor=request.args.get('cursor'),
+                limit=request.args.get('limit', PAGE_SIZE, type=int),
+            )
+    except ValueError:
+        return None
+    return PreparedResponse({
+        'access': True,
+        'promocodes': format_promocodes(promocodes),
+        'channels': format_channels(get_required_channels()),
+        'next_cursor': next_cursor,
+        **format_unlocks(*unlocks.get_unlocks(user_id), {promo['id'] for promo in promocodes})
+    }, cache_control=API_CACHE_CONTROL)
 
 # API endpoint для получения промокодов
+# Без параметров - весь каталог, с category/store/cursor/limit -
+# страница по created_at DESC, id DESC и next_cursor для следующей,
+# с q (или search) - найденные промокоды, самые подходящие первыми
 @app.route('/api/promocodes', methods=['GET'])
 def api_promocodes():
-    user_id = request.args.get('user_id')
+    user_id = request_user_id(request.args)
     
     if not user_id:
-        return jsonify({'error': 'User ID required'}), 400
+        return user_required()
     
     # Получаем обязательные каналы
     required_channels = get_required_channels()
     
-    # Проверяем подписки (пока заглушка - всегда True)
-    # В реальности нужно асинхронно проверять каждый канал
-    all_subscribed = True
-    
-    promocodes = get_active_promocodes()
+    # Проверяем подписки на все каналы параллельно (с кэшем)
+    all_subscribed = not check_subscriptions(user_id, required_channels)
     
-    # Форматируем промокоды для JSON
-    promocodes_list = []
-    for promo in promocodes:
-        promocodes_list.append({
-            'id': promo[0],
-            'store': promo[1],
-            'code': promo[2],
-            'description': promo[3],
-            'expires_at': promo[4]
-        })
+    if not all_subscribed:
+        return locked_response().to_response(request)
     
-    # Форматируем каналы для JSON
-    channels_list = []
-    for channel in required_channels:
-        channels_list.append({
-            'id': channel[0],
-            'name': channel[1],
-            'username': channel[2]
-        })
+    if any(param in request.args for param in PAGE_PARAMS):
+        prepared = page_response(user_id)
+        if prepared is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        return prepared.to_response(request)
     
-    return jsonify({
-        'access': all_subscribed,
-        'promocodes': promocodes_list if all_subscribed else [],
-        'channels': channels_list
-    })
+    # Весь каталог заранее сериализован, при совпадении ETag - 304 без тела.
+    # Открытые пользователем промокоды дописываются к готовому телу, а без
+    # них отдаётся общий ответ как есть
+    unlocked, visited = unlocks.get_unlocks(user_id)
+    prepared = catalogue_response()
+    if unlocked or visited:
+        prepared = prepared.with_fields(format_unlocks(unlocked, visited))
+    return prepared.to_response(request)
+
+# API endpoint для снимка каталога мини-аппы. С since_version - только
+# изменения после этой версии (или полный снимок, если они уже забыты)
+@app.route('/api/catalogue', methods=['GET'])
+def api_catalogue():
+    since_version = request.args.get('since_version', 0, type=int)
+    delta = catalogue.changes(since_version) if since_version > 0 else None
+    if delta is None:
+        return catalogue_snapshot_response().to_response(request)
+    return PreparedResponse(delta, cache_control=CATALOGUE_CACHE_CONTROL).to_response(request)
 
 # API endpoint для проверки подписок
 @app.route('/api/check_subscriptions', methods=['POST'])
 def api_check_subscriptions():
-    data = request.json
-    user_id = data.get('user_id')
+    data = request.get_json(silent=True) or {}
+    user_id = request_user_id(data)
     
     if not user_id:
-        return jsonify({'error': 'User ID required'}), 400
+        return user_required()
     
     required_channels = get_required_channels()
+    missing = check_subscriptions(user_id, required_channels)
+    
+    if missing:
+        return jsonify({
+            'subscribed': False,
+            'message': 'Подпишись на все каналы, чтобы получить промокоды',
+            'channels': [{'name': ch['name'], 'username': ch['username']} for ch in missing]
+        })
     
-    # Здесь будет реальная проверка подписок
-    # Пока возвращаем успех для теста
     return jsonify({
         'subscribed': True,
         'message': 'Все подписки подтверждены!'
     })
 
+# API endpoint для событий мини-аппы (показы, переходы, открытия, копирования).
+# navigator.sendBeacon шлёт text/plain, поэтому тип тела не проверяем.
+# События только кладутся в буфер: ответ не ждёт записи в базу
+@app.route('/api/events', methods=['POST'])
+def api_events():
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('events'), list):
+        return jsonify({'error': 'Events required'}), 400
+    user_id = request_user_id(data) or None
+    
+    accepted = 0
+    for event in data['events'][:MAX_EVENTS_PER_REQUEST]:
+        # Команды пишет сам бот, от мини-аппы - только события карточек
+        if not isinstance(event, dict) or event.get('type') not in events.PROMO_EVENT_TYPES:
+            continue
+        try:
+            events.record(event.get('type'), user_id, int(event.get('promo_id') or 0) or None)
+        except (TypeError, ValueError):
+            continue
+        accepted += 1
+    
+    return jsonify({'accepted': accepted, 'rejected': len(data['events']) - accepted}), 202
+
+# API endpoint для открытых промокодов пользователя: общее состояние для
+# всех его устройств. POST только добавляет id (unlock - открыт,
+# visit - переходил в канал) и возвращает новое состояние. Коды открытых
+# промокодов (codes) - только если пользователь подписан на каналы
+@app.route('/api/unlocks', methods=['GET', 'POST'])
+def api_unlocks():
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    user_id = request_user_id(data)
+    
+    if not user_id:
+        return user_required()
+    
+    if request.method == 'GET':
+        return unlocks_response(user_id, unlocks.get_unlocks(user_id))
+    
+    unlock, visit = data.get('unlock') or [], data.get('visit') or []
+    if not isinstance(unlock, list) or not isinstance(visit, list):
+        return jsonify({'error': 'Promo IDs required'}), 400
+    if len(unlock) + len(visit) > MAX_UNLOCKS_PER_REQUEST:
+        return jsonify({'error': 'Too many promo IDs'}), 400
+    try:
+        state = unlocks.update_unlocks(user_id, unlock=unlock, visit=visit)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid promo ID'}), 400
+    return unlocks_response(user_id, state)
+
+# Метрики этого процесса для Prometheus (у каждого воркера gunicorn свои).
+# В них тексты SQL и имена обработчиков, а API публичный: только с
+# METRICS_TOKEN в Authorization: Bearer, без заданного токена - 404
+@app.route('/metrics', methods=['GET'])
+def api_metrics():
+    if not metrics.METRICS_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not metrics.authorized(request.headers.get('Authorization')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    # Режим разработки. В продакшене: gunicorn -c bot/gunicorn_conf.py bot.api:app,
+    # миграции тогда запускаются отдельно: python -m database.db migrate
+    init_db()
+    app.run(host='0.0.0.0', port=5001, debug=os.getenv('API_DEBUG') == '1', threaded=True)
\ No newline at end of file
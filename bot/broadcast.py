@@ -0,0 +1,201 @@
+"""Рассылки всем пользователям бота.
+
+Рассылка - запись в таблице broadcasts. Получатели берутся пачками по
+user_id, отметка прогресса хранится в базе, поэтому после перезапуска
+бота рассылка продолжается с того же места. Сообщения уходят через общую
+очередь OutboundLimiter с низким приоритетом: ответы на команды не ждут
+за рассылкой, а лимиты Telegram соблюдаются. Кто заблокировал бота,
+помечается и больше рассылок не получает.
+"""
+import asyncio
+import hashlib
+import os
+import time
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from bot.outbound import OUTBOUND_GLOBAL_RATE, PRIORITY_LOW
+from database import db
+from database.async_db import run_db
+
+BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', '100'))
+# Отправок в полёте: очередь всё равно выпускает не больше лимита в секунду,
+# но ответы Telegram идут не мгновенно - держим запас на задержку сети
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', str(int(OUTBOUND_GLOBAL_RATE))))
+# Как часто обновлять сообщение админу с прогрессом, секунд
+BROADCAST_REPORT_INTERVAL = float(os.getenv('BROADCAST_REPORT_INTERVAL', '10'))
+# Сколько ждать запуска приложения рассылке, продолженной из post_init,
+# секунд: если бот так и не запустился, она продолжится при следующем запуске
+BROADCAST_START_TIMEOUT = float(os.getenv('BROADCAST_START_TIMEOUT', '60'))
+# Рассылать ли новый промокод сразу после /add_promo
+BROADCAST_ON_ADD = os.getenv('BROADCAST_ON_ADD', '0') == '1'
+
+# Ошибки BadRequest, после которых писать пользователю бессмысленно
+GONE_ERRORS = ('chat not found', 'user is deactivated')
+
+_jobs = {}
+
+
+def text_key(text):
+    return 'text:' + hashlib.sha1(text.encode()).hexdigest()
+
+
+def promo_key(promo_id):
+    return f'promo:{promo_id}'
+
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} ч {minutes} мин" if hours else f"{minutes} мин {seconds} с"
+
+
+class BroadcastJob:
+    """Одна выполняющаяся рассылка"""
+
+    def __init__(self, application, broadcast_id, admin_chat_id=None,
+                 batch_size=BROADCAST_BATCH_SIZE, concurrency=BROADCAST_CONCURRENCY,
+                 report_interval=BROADCAST_REPORT_INTERVAL, start_timeout=BROADCAST_START_TIMEOUT):
+        self.application = application
+        self.bot = application.bot
+        self.broadcast_id = broadcast_id
+        self.admin_chat_id = admin_chat_id
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.report_interval = report_interval
+        self.start_timeout = start_timeout
+        self.cancelled = False
+        self._semaphore = None
+        self._progress_message = None
+        self._started = None
+        self._processed = 0
+
+    def cancel(self):
+        """Остановиться после текущей пачки"""
+        self.cancelled = True
+
+    async def _send(self, user_id, text):
+        """'sent', 'blocked' или 'failed'"""
+        async with self._semaphore:
+            try:
+                await self.bot.send_message(user_id, text, rate_limit_args={'priority': PRIORITY_LOW})
+                return 'sent'
+            except Forbidden:
+                return 'blocked'
+            except BadRequest as e:
+                return 'blocked' if any(error in str(e).lower() for error in GONE_ERRORS) else 'failed'
+            except TelegramError as e:
+                print(f"❌ Рассылка #{self.broadcast_id}, пользователь {user_id}: {e}")
+                return 'failed'
+
+    def _progress_text(self, broadcast, finished=False):
+        done = broadcast['sent'] + broadcast['failed'] + broadcast['blocked']
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        rate = self._processed / elapsed
+        if finished:
+            header = "✅ Рассылка завершена" if broadcast['status'] == 'done' else "⏹ Рассылка остановлена"
+        else:
+            header = "📤 Идёт рассылка"
+        text = (
+            f"{header} #{broadcast['id']}\n\n"
+            f"👥 Обработано: {done} из ~{broadcast['total']}\n"
+            f"✅ Доставлено: {broadcast['sent']}\n"
+            f"🚫 Заблокировали бота: {broadcast['blocked']}\n"
+            f"❌ Ошибок: {broadcast['failed']}\n"
+            f"⚡️ Скорость: {rate:.1f} сообщ./с"
+        )
+        if not finished and rate > 0:
+            remaining = max(broadcast['total'] - done, 0)
+            text += f"\n⏳ Осталось примерно: {format_eta(remaining / rate)}"
+        return text
+
+    async def _report(self, broadcast, finished=False):
+        """Отправляем или обновляем сообщение с прогрессом админу"""
+        if not self.admin_chat_id:
+            return
+        text = self._progress_text(broadcast, finished)
+        try:
+            if self._progress_message is None:
+                self._progress_message = await self.bot.send_message(self.admin_chat_id, text)
+            else:
+                await self._progress_message.edit_text(text)
+        except TelegramError as e:
+            print(f"⚠️ Не удалось обновить прогресс рассылки: {e}")
+
+    async def _wait_for_application(self):
+        """Ждём запуска приложения; False - отменили или не дождались"""
+        deadline = time.monotonic() + self.start_timeout
+        while not self.application.running:
+            if self.cancelled or time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    async def run(self):
+        # Рассылки, продолженные из post_init, стартуют раньше приложения
+        if not await self._wait_for_application():
+            _jobs.pop(self.broadcast_id, None)
+            print(f"⏹ Рассылка #{self.broadcast_id} не началась: бот не запустился")
+            return None
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._started = time.monotonic()
+        broadcast = await run_db(db.get_broadcast, self.broadcast_id)
+        await self._report(broadcast)
+        last_report = time.monotonic()
+
+        try:
+            # При остановке бота (application.running == False) дорабатываем
+            # текущую пачку и выходим: рассылка продолжится после запуска
+            while self.application.running and not self.cancelled:
+                user_ids = await run_db(db.claim_broadcast_batch, self.broadcast_id, self.batch_size)
+                if not user_ids:
+                    await run_db(db.set_broadcast_status, self.broadcast_id, 'done')
+                    break
+
+                results = await asyncio.gather(*(self._send(u, broadcast['text']) for u in user_ids))
+                blocked = [u for u, result in zip(user_ids, results) if result == 'blocked']
+                await run_db(db.record_broadcast_batch, self.broadcast_id,
+                             results.count('sent'), results.count('failed'), blocked)
+                self._processed += len(user_ids)
+
+                if time.monotonic() - last_report >= self.report_interval:
+                    broadcast = await run_db(db.get_broadcast, self.broadcast_id)
+                    await self._report(broadcast)
+                    last_report = time.monotonic()
+        finally:
+            _jobs.pop(self.broadcast_id, None)
+
+        broadcast = await run_db(db.get_broadcast, self.broadcast_id)
+        if broadcast['status'] != 'running':
+            await self._report(broadcast, finished=True)
+        return broadcast
+
+
+def start_broadcast(application, broadcast_id, admin_chat_id=None, **options):
+    """Запускаем рассылку в фоне (если она ещё не идёт в этом процессе)"""
+    job = _jobs.get(broadcast_id)
+    if job is None:
+        job = _jobs[broadcast_id] = BroadcastJob(application, broadcast_id, admin_chat_id, **options)
+        application.create_task(job.run())
+    return job
+
+
+def cancel_broadcast(broadcast_id):
+    """Останавливаем рассылку в этом процессе; False - она здесь не идёт"""
+    job = _jobs.get(broadcast_id)
+    if job is None:
+        return False
+    job.cancel()
+    return True
+
+
+def is_running(broadcast_id):
+    return broadcast_id in _jobs
+
+
+async def resume_broadcasts(application, admin_chat_id=None):
+    """Продолжаем рассылки, прерванные остановкой бота"""
+    for broadcast in await run_db(db.get_running_broadcasts):
+        print(f"📤 Продолжаем рассылку #{broadcast['id']}")
+        start_broadcast(application, broadcast['id'], admin_chat_id)
@@ -0,0 +1,16 @@
+# Продакшен-запуск API: gunicorn -c bot/gunicorn_conf.py bot.api:app
+# Перед запуском: python -m database.db migrate
+import multiprocessing
+import os
+
+bind = os.getenv('API_BIND', '0.0.0.0:5001')
+# Процессы на ядра, потоки на ожидание Telegram при проверке подписок
+workers = int(os.getenv('API_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = 'gthread'
+threads = int(os.getenv('API_THREADS', '8'))
+keepalive = 15
+# Пул соединений с базой и HTTP-клиент создаются лениво в каждом воркере
+preload_app = True
+max_requests = 10000
+max_requests_jitter = 1000
+accesslog = None
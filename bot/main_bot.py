@@ -1,19 +1,32 @@
+import asyncio
+import functools
+import html
+import io
 import os
 import logging
 import sys
-import sqlite3
+import tempfile
 import telegram
 from datetime import datetime
-from telegram import Update, WebAppInfo, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram import (Update, WebAppInfo, InlineKeyboardButton, InlineKeyboardMarkup,
+                      InlineQueryResultArticle, InputTextMessageContent)
+from telegram.ext import Application, CommandHandler, ContextTypes, InlineQueryHandler, MessageHandler, filters
 from dotenv import load_dotenv
 
 # Добавляем путь к корню проекта для импорта database
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-# Загружаем переменные из .env
+# Загружаем переменные из .env до импорта модулей, которые читают настройки
 load_dotenv()
 
+from database import bulk, catalogue, db, events, expiry, inline_index, search
+from database.cache import catalogue_cache
+from database.async_db import run_db, shutdown as shutdown_db
+from bot.webhook import WEBHOOK_URL, BoundedUpdateQueue, OrderedUpdateProcessor, run_webhook
+from bot.outbound import OutboundLimiter
+from bot import broadcast
+import metrics
+
 # Настраиваем логирование
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -23,77 +36,89 @@ logging.basicConfig(
 # Получаем токен из .env
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 ADMIN_ID = int(os.getenv('ADMIN_ID', '0'))
+# Больше Bot API скачать боту не даст
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+# История в /promo_stats: по умолчанию и максимум дней
+PROMO_HISTORY_DAYS = 7
+MAX_PROMO_HISTORY_DAYS = 90
+# Сколько промокодов показывать в /promo_ctr
+PROMO_CTR_LIMIT = 15
+# Сколько найденных промокодов показывать в /search
+SEARCH_RESULTS_LIMIT = 10
+WEBAPP_URL = "https://nekiforovoleg20-sketch.github.io/telegram_promo_bot/"
+# Ответ на инлайн-запрос одинаков для всех (is_personal=False): Telegram
+# сам отдаёт его повторно столько секунд, не спрашивая бота
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '60'))
+# /profile без аргумента и самое долгое профилирование, секунды
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
 
 # ========== БАЗА ДАННЫХ ==========
 
-def get_db_connection():
-    """Создаем соединение с базой данных"""
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'database', 'promo_bot.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def get_active_promocodes():
-    """Получаем активные промокоды из базы"""
+    """Получаем активные промокоды (снимок из кэша, список не изменять)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM promocodes 
-            WHERE is_active = 1 AND (expires_at IS NULL OR expires_at > DATE('now'))
-            ORDER BY created_at DESC
-        ''')
-        promocodes = cursor.fetchall()
-        conn.close()
-        
-        result = []
-        for promo in promocodes:
-            result.append({
-                'id': promo['id'],
-                'store': promo['store'],
-                'code': promo['code'],
-                'description': promo['description'],
-                'expires_at': promo['expires_at']
-            })
-        return result
+        return db.get_active_promocodes()
     except Exception as e:
         print(f"❌ Ошибка при получении промокодов: {e}")
         return []
 
+def get_user_promocode(user_id):
+    """Персональный промокод пользователя или None"""
+    try:
+        return db.get_user_promocode(user_id)
+    except Exception as e:
+        print(f"❌ Ошибка при получении промокода: {e}")
+        return None
+
 def get_referral_channels():
-    """Получаем каналы для реферальных ссылок"""
+    """Получаем каналы для реферальных ссылок (снимок из кэша)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM channels WHERE is_required = TRUE')
-        channels = cursor.fetchall()
-        conn.close()
-        
-        result = []
-        for channel in channels:
-            result.append({
-                'id': channel['id'],
-                'name': channel['name'],
-                'username': channel['username']
-            })
-        return result
+        return db.get_required_channels()
     except Exception as e:
         print(f"❌ Ошибка при получении каналов: {e}")
         return []
 
+def save_user(user):
+    """Сохраняем пользователя (ошибка не должна ломать /start)"""
+    try:
+        db.upsert_user(user.id, user.first_name, user.username)
+    except Exception as e:
+        print(f"❌ Ошибка при сохранении пользователя: {e}")
+
+def track(event_type, user_id, promo_id=None, detail=None):
+    """Событие для аналитики (только буфер в памяти, ошибка не ломает ответ)"""
+    try:
+        events.record(event_type, user_id, promo_id, detail)
+    except Exception as e:
+        print(f"❌ Ошибка при записи события: {e}")
+
+async def track_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Считаем каждую команду (группа -1, до обработчиков команд)"""
+    if not update.effective_user or not update.effective_message or not update.effective_message.text:
+        return
+    command = update.effective_message.text.split()[0].split('@')[0].lower()
+    # Неизвестные команды в одну строку, чтобы не плодить итоги по опечаткам
+    if command[1:] not in context.bot_data.get('commands', ()):
+        command = '/other'
+    track('command', update.effective_user.id, detail=command)
+
 # ========== ОСНОВНЫЕ КОМАНДЫ ==========
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /start"""
     user = update.effective_user
     
+    # Запоминаем пользователя для рассылок
+    await run_db(save_user, user)
+    
     # Получаем каналы для реферальных ссылок
-    channels = get_referral_channels()
+    channels = await run_db(get_referral_channels)
     channels_text = "\n".join([f"📢 {ch['name']} - https://t.me/{ch['username']}" for ch in channels])
     
     # Создаем кнопку для открытия мини-аппы
     keyboard = [
-        [InlineKeyboardButton("🎁 Получить промокоды", web_app=WebAppInfo(url="https://nekiforovoleg20-sketch.github.io/telegram_promo_bot/"))]
+        [InlineKeyboardButton("🎁 Получить промокоды", web_app=WebAppInfo(url=WEBAPP_URL))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -114,6 +139,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 /start - Начать работу с ботом  
 /help - Показать это сообщение
 /promo - Показать ваш персональный промокод
+/search текст - Найти промокоды по магазину или описанию
 /myid - Узнать свой ID
 
 🎁 **Как получить промокоды:**
@@ -121,6 +147,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 2. Выбирай любые промокоды из списка
 3. Копируй и используй!
 
+💬 **Поделиться промокодом:** в любом чате набери @ и имя бота, а за ним начало названия магазина
+
 📢 **Поддержи нас:** подпишись на наши каналы по ссылкам из /start
     """
     await update.message.reply_text(help_text)
@@ -129,17 +157,15 @@ async def promo_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     """Команда /promo - показывает фиксированный промокод для пользователя"""
     user_id = update.effective_user.id
     
-    # Получаем активные промокоды
-    promocodes = get_active_promocodes()
+    # Промокод закреплён за пользователем консистентным хэшированием:
+    # пользователь видит один и тот же промокод, пока тот активен
+    promo = await run_db(get_user_promocode, user_id)
     
-    if not promocodes:
+    if promo is None:
         await update.message.reply_text("😔 Промокоды временно отсутствуют. Попробуй позже!")
         return
     
-    # Создаем фиксированный промокод для пользователя на основе его ID
-    # Это гарантирует, что пользователь всегда будет видеть один и тот же промокод
-    promo_index = user_id % len(promocodes)
-    promo = promocodes[promo_index]
+    track('reveal', user_id, promo['id'], detail='bot')
     
     await update.message.reply_text(
         f"🎁 **Ваш персональный промокод:**\n\n"
@@ -150,6 +176,94 @@ async def promo_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         f"✨ Больше промокодов в мини-приложении!"
     )
 
+def search_promocodes(text):
+    """Поиск промокодов (ошибка не должна ломать ответ)"""
+    try:
+        return search.search_promocodes(text, limit=SEARCH_RESULTS_LIMIT)
+    except Exception as e:
+        print(f"❌ Ошибка при поиске промокодов: {e}")
+        return []
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /search - полнотекстовый поиск по магазину, коду и описанию"""
+    user_id = update.effective_user.id
+    text = ' '.join(context.args)
+    
+    if not text:
+        await update.message.reply_text(
+            "🔍 Формат команды:\n"
+            "/search текст\n\n"
+            "Например: /search бургер или /search скидка ozon"
+        )
+        return
+    
+    promocodes = await run_db(search_promocodes, text)
+    
+    if not promocodes:
+        await update.message.reply_text(f"😔 По запросу «{text}» ничего не нашлось")
+        return
+    
+    # Админ ищет промокод, чтобы удалить или проверить: ему - ID и код,
+    # остальным коды открываются в мини-аппе
+    admin = is_admin(user_id)
+    lines = [f"🔍 <b>Найдено по запросу «{html.escape(text)}»:</b>\n"]
+    for promo in promocodes:
+        line = f"🏪 <b>{html.escape(promo['store'])}</b> - {html.escape(promo['description'] or '')}"
+        if admin:
+            line += f"\n   ID: {promo['id']}, код: <code>{html.escape(promo['code'])}</code>"
+        lines.append(f"{line}\n   📅 до {promo['expires_at']}")
+    
+    reply_markup = None
+    if not admin:
+        reply_markup = InlineKeyboardMarkup(
+            [[InlineKeyboardButton("🎁 Открыть промокоды", web_app=WebAppInfo(url=WEBAPP_URL))]]
+        )
+    await update.message.reply_html('\n'.join(lines), reply_markup=reply_markup)
+
+def search_inline(query):
+    """Промокоды для инлайн-режима (ошибка не должна ломать ответ)"""
+    try:
+        return inline_index.search_inline(query)
+    except Exception as e:
+        print(f"❌ Ошибка при инлайн-поиске: {e}")
+        return []
+
+@functools.lru_cache(maxsize=inline_index.INLINE_CACHE_SIZE)
+def inline_result(promo):
+    """Карточка промокода для инлайн-ответа.
+
+    Карточки неизменяемы, а строка промокода - ключ кэша: после правки
+    промокода строка другая, и карточка соберётся заново
+    """
+    text = (
+        f"🎁 <b>{html.escape(promo['store'])}</b>\n"
+        f"🔑 Промокод: <code>{html.escape(promo['code'])}</code>\n"
+        f"📝 {html.escape(promo['description'] or '')}\n"
+        f"📅 Действует до: {promo['expires_at']}"
+    )
+    return InlineQueryResultArticle(
+        id=str(promo['id']),
+        title=f"{promo['store']} - {promo['code']}",
+        description=f"{promo['description'] or ''} (до {promo['expires_at']})",
+        input_message_content=InputTextMessageContent(text, parse_mode='HTML'),
+    )
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Инлайн-режим: @бот начало названия магазина или кода"""
+    query = update.inline_query.query
+    # Готовый индекс ищет в памяти прямо в цикле событий, а пересборка
+    # после изменений каталога читает базу - её отдаём в поток
+    index = inline_index.get_inline_index.peek()
+    if index is not None:
+        promocodes = index.search(query)
+    else:
+        promocodes = await run_db(search_inline, query)
+    await update.inline_query.answer(
+        [inline_result(promo) for promo in promocodes],
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=False,
+    )
+
 async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показывает ID пользователя"""
     user_id = update.effective_user.id
@@ -174,12 +288,24 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 📊 Статистика:
 /stats - Статистика бота
-/promo_stats - Статистика промокодов
+/promo_stats [дней] - Статистика промокодов и история
+/promo_ctr [дней] - Показы, открытия и копирования промокодов
 
 🎁 Управление промокодами:
 /add_promo - Добавить промокод
 /delete_promo - Удалить промокод  
 /list_promos - Список всех промокодов
+/search текст - Найти промокод (с ID и кодом)
+/export - Выгрузить промокоды в файл
+📎 Пришли CSV/JSONL-файл - загрузить промокоды пачкой
+
+📤 Рассылки:
+/broadcast - Разослать сообщение всем пользователям
+/broadcast_stop - Остановить рассылку
+
+🔬 Производительность:
+/profile [секунд] - Профилировать бота (по умолчанию 30 с)
+/profile stop - Остановить и прислать результат
 
 📢 Управление каналами:
 /add_channel - Добавить канал
@@ -196,14 +322,28 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text("❌ У тебя нет прав для этой команды")
         return
     
-    promocodes = get_active_promocodes()
-    channels = get_referral_channels()
+    # Счётчики вместо загрузки всех промокодов и каналов ради len()
+    _, active = await run_db(db.get_promo_totals)
+    channels = await run_db(db.count_channels)
+    cache = catalogue_cache.stats()
+    outbound = context.bot.rate_limiter.report()
+    sweeper = expiry.report()
+    tracked = events.stats()
     
     await update.message.reply_text(
         f"📊 **Статистика бота:**\n\n"
-        f"🎁 Активных промокодов: {len(promocodes)}\n"
-        f"📢 Реферальных каналов: {len(channels)}\n"
-        f"🔄 База данных: ✅ Работает\n\n"
+        f"🎁 Активных промокодов: {active}\n"
+        f"📢 Реферальных каналов: {channels}\n"
+        f"🔄 База данных: ✅ Работает\n"
+        f"🗄 Кэш: попаданий {cache['hits']}, промахов {cache['misses']} "
+        f"({cache['hit_rate']:.0%}), сбросов {cache['invalidations']}\n"
+        f"📤 Отправка: в очереди {outbound['queue_depth']}, отправлено {outbound['sent']}, "
+        f"429: {outbound['retry_after']}, задержка p50 {outbound['latency_p50_ms']:.0f} мс, "
+        f"p99 {outbound['latency_p99_ms']:.0f} мс\n"
+        f"🧹 Просроченные: проверок {sweeper['sweeps']}, снято {sweeper['rows_moved']}, "
+        f"последняя {sweeper['last_duration_ms']:.0f} мс (макс. {sweeper['max_duration_ms']:.0f} мс)\n"
+        f"📈 События: записано {tracked['written']}, в буфере {tracked['pending']}, "
+        f"потеряно {tracked['dropped']}\n\n"
         f"Для доступа ко всем промокодам используй мини-приложение!"
     )
 
@@ -215,7 +355,7 @@ async def channels_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await update.message.reply_text("❌ У тебя нет прав для этой команды")
         return
     
-    channels = get_referral_channels()
+    channels = await run_db(get_referral_channels)
     
     if not channels:
         await update.message.reply_text("📭 Нет каналов в базе")
@@ -238,23 +378,31 @@ async def add_promo_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("❌ У тебя нет прав администратора")
         return
     
-    if not context.args or len(context.args) < 4:
+    args = list(context.args or [])
+    # notify в конце - сразу разослать промокод всем пользователям
+    notify = broadcast.BROADCAST_ON_ADD
+    if args and args[-1].lower() == 'notify':
+        notify = True
+        args.pop()
+    
+    if len(args) < 4:
         await update.message.reply_text(
             "📝 Формат команды:\n"
-            "`/add_promo магазин код описание дата`\n\n"
+            "`/add_promo магазин код описание дата [notify]`\n\n"
             "Пример:\n"
             "`/add_promo Wildberries SUMMER100 \"100 рублей скидка\" 2025-12-31`\n\n"
             "📌 Описание в кавычках если содержит пробелы!\n"
-            "📅 Дата в формате: ГГГГ-ММ-ДД"
+            "📅 Дата в формате: ГГГГ-ММ-ДД\n"
+            "📤 notify в конце - разослать промокод всем пользователям"
         )
         return
     
     try:
-        store = context.args[0]
-        code = context.args[1]
-        description_parts = context.args[2:-1]
+        store = args[0]
+        code = args[1]
+        description_parts = args[2:-1]
         description = ' '.join(description_parts)
-        expires_at = context.args[-1]
+        expires_at = args[-1]
         
         # Проверяем дату
         try:
@@ -267,14 +415,7 @@ async def add_promo_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
             return
         
         # Добавляем в базу
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO promocodes (store, code, description, expires_at, is_active)
-            VALUES (?, ?, ?, ?, 1)
-        ''', (store, code, description, expires_at))
-        conn.commit()
-        conn.close()
+        promo_id = await run_db(db.add_promocode, store, code, description, expires_at)
         
         await update.message.reply_text(
             f"✅ Промокод добавлен!\n\n"
@@ -284,6 +425,17 @@ async def add_promo_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
             f"📅 Действует до: {expires_at}"
         )
         
+        if notify:
+            text = (
+                f"🔥 Новый промокод!\n\n"
+                f"🏪 {store}\n"
+                f"🔑 {code}\n"
+                f"📝 {description}\n"
+                f"📅 Действует до: {expires_at}"
+            )
+            row, _ = await run_db(db.create_broadcast, broadcast.promo_key(promo_id), text)
+            broadcast.start_broadcast(context.application, row['id'], update.effective_chat.id)
+        
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка при добавлении: {str(e)}")
 
@@ -295,7 +447,7 @@ async def list_promos_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("❌ У тебя нет прав администратора")
         return
     
-    promocodes = get_active_promocodes()
+    promocodes = await run_db(get_active_promocodes)
     
     if not promocodes:
         await update.message.reply_text("📭 Нет активных промокодов")
@@ -323,29 +475,23 @@ async def promo_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("❌ У тебя нет прав администратора")
         return
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM promocodes")
-    total = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM promocodes WHERE is_active = 1")
-    active = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM promocodes WHERE expires_at < DATE('now')")
-    expired = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT store, COUNT(*) as count FROM promocodes WHERE is_active = 1 GROUP BY store')
-    by_store = cursor.fetchall()
+    days = PROMO_HISTORY_DAYS
+    if context.args:
+        try:
+            days = min(max(int(context.args[0]), 1), MAX_PROMO_HISTORY_DAYS)
+        except ValueError:
+            await update.message.reply_text("❌ Число дней должно быть числом: `/promo_stats 30`")
+            return
     
-    conn.close()
+    total, active, expired, by_store = await run_db(db.get_promo_stats)
+    history = await run_db(db.get_promo_history, days)
     
     text = f"""
 📊 **Статистика промокодов:**
 
 🎁 Всего промокодов: {total}
 ✅ Активных: {active}
-❌ Просроченных: {expired}
+❌ Снято с выдачи: {expired}
 
 🏪 По магазинам:
 """
@@ -353,6 +499,48 @@ async def promo_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     for store in by_store:
         text += f"   • {store['store']}: {store['count']}\n"
     
+    if history:
+        text += f"\n📈 За {days} дн. (добавлено / снято / удалено → активных):\n"
+        for day in history:
+            active_at = day['active'] if day['active'] is not None else '—'
+            text += (f"   {day['day'][8:10]}.{day['day'][5:7]}: +{day['added']} / "
+                     f"{day['deactivated']} / {day['deleted']} → {active_at}\n")
+    
+    await update.message.reply_text(text)
+
+async def promo_ctr_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Воронка по промокодам: показы, переходы, открытия, копирования"""
+    user_id = update.effective_user.id
+    
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ У тебя нет прав администратора")
+        return
+    
+    days = PROMO_HISTORY_DAYS
+    if context.args:
+        try:
+            days = min(max(int(context.args[0]), 1), MAX_PROMO_HISTORY_DAYS)
+        except ValueError:
+            await update.message.reply_text("❌ Число дней должно быть числом: `/promo_ctr 30`")
+            return
+    
+    rows = await run_db(events.promo_click_through, days, PROMO_CTR_LIMIT)
+    commands = await run_db(events.command_counts, days)
+    
+    if not rows and not commands:
+        await update.message.reply_text(f"📭 За {days} дн. событий нет")
+        return
+    
+    text = f"📈 **Промокоды за {days} дн.** (показы / переходы / открытия / копирования):\n\n"
+    for row in rows:
+        text += (f"   • #{row['promo_id']} {row['store'] or '?'}: "
+                 f"{row['view']} / {row['visit']} / {row['reveal']} / {row['copy']} "
+                 f"(открыли {row['reveal_rate']:.0%}, скопировали {row['copy_rate']:.0%})\n")
+    if commands:
+        text += "\n🤖 Команды:\n"
+        for command, count in commands.most_common():
+            text += f"   • {command}: {count}\n"
+    
     await update.message.reply_text(text)
 
 async def delete_promo_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -374,12 +562,7 @@ async def delete_promo_command(update: Update, context: ContextTypes.DEFAULT_TYP
     try:
         promo_id = int(context.args[0])
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM promocodes WHERE id = ?", (promo_id,))
-        deleted = cursor.rowcount
-        conn.commit()
-        conn.close()
+        deleted = await run_db(db.delete_promocode, promo_id)
         
         if deleted > 0:
             await update.message.reply_text(f"✅ Промокод #{promo_id} удалён")
@@ -415,14 +598,7 @@ async def add_channel_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         username = context.args[1].lower().replace('@', '')
         
         # Добавляем в базу
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO channels (name, username, is_required)
-            VALUES (?, ?, 1)
-        ''', (name, username))
-        conn.commit()
-        conn.close()
+        await run_db(db.add_channel, name, username)
         
         await update.message.reply_text(
             f"✅ Канал добавлен!\n\n"
@@ -453,12 +629,7 @@ async def delete_channel_command(update: Update, context: ContextTypes.DEFAULT_T
     try:
         channel_id = int(context.args[0])
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM channels WHERE id = ?", (channel_id,))
-        deleted = cursor.rowcount
-        conn.commit()
-        conn.close()
+        deleted = await run_db(db.delete_channel, channel_id)
         
         if deleted > 0:
             await update.message.reply_text(f"✅ Канал #{channel_id} удалён")
@@ -478,7 +649,7 @@ async def list_channels_command(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("❌ У тебя нет прав администратора")
         return
     
-    channels = get_referral_channels()
+    channels = await run_db(get_referral_channels)
     
     if not channels:
         await update.message.reply_text("📭 Нет каналов в базе")
@@ -492,6 +663,173 @@ async def list_channels_command(update: Update, context: ContextTypes.DEFAULT_TY
     
     await update.message.reply_text(text, parse_mode='Markdown', disable_web_page_preview=True)
 
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Загрузка промокодов из присланного CSV/JSONL-файла"""
+    document = update.message.document
+    
+    try:
+        fmt = bulk.detect_format(document.file_name or '')
+    except ValueError:
+        await update.message.reply_text(
+            "📎 Пришли файл .csv или .jsonl с колонками:\n"
+            "store, code, description, expires_at, category, is_active"
+        )
+        return
+    
+    if document.file_size and document.file_size > MAX_UPLOAD_SIZE:
+        await update.message.reply_text("❌ Файл больше 20 МБ - загрузи его через python -m database.bulk")
+        return
+    
+    await update.message.reply_text("⏳ Загружаю промокоды...")
+    try:
+        file = await document.get_file()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f"upload.{fmt}")
+            await file.download_to_drive(path)
+            report = await run_db(bulk.import_file, path, fmt)
+        await update.message.reply_text(bulk.format_report(report))
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка при загрузке: {str(e)}")
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Выгрузка промокодов файлом: /export [csv|jsonl] [active]"""
+    user_id = update.effective_user.id
+    
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ У тебя нет прав администратора")
+        return
+    
+    args = [arg.lower() for arg in context.args or []]
+    fmt = 'jsonl' if 'jsonl' in args else 'csv'
+    active_only = 'active' in args
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f"promocodes.{fmt}")
+            count = await run_db(bulk.export_file, path, fmt, active_only)
+            with open(path, 'rb') as f:
+                await update.message.reply_document(f, caption=f"📤 Промокодов: {count}")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка при выгрузке: {str(e)}")
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Рассылка сообщения всем пользователям"""
+    user_id = update.effective_user.id
+    
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ У тебя нет прав администратора")
+        return
+    
+    # Текст берём целиком, с переносами строк
+    text = update.message.text.partition(' ')[2].strip()
+    if not text:
+        await update.message.reply_text(
+            "📝 Формат команды:\n"
+            "`/broadcast текст сообщения`\n\n"
+            "Сообщение получат все пользователи, которые запускали бота"
+        )
+        return
+    
+    row, created = await run_db(db.create_broadcast, broadcast.text_key(text), text)
+    
+    if row['status'] == 'done':
+        await update.message.reply_text(
+            f"ℹ️ Такая рассылка уже отправлена (#{row['id']}): доставлено {row['sent']}"
+        )
+        return
+    if broadcast.is_running(row['id']):
+        await update.message.reply_text(f"ℹ️ Рассылка #{row['id']} уже идёт")
+        return
+    
+    if not created:
+        # Остановленную рассылку с тем же текстом продолжаем с места остановки
+        await run_db(db.set_broadcast_status, row['id'], 'running')
+    broadcast.start_broadcast(context.application, row['id'], update.effective_chat.id)
+
+async def broadcast_stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Остановка рассылки"""
+    user_id = update.effective_user.id
+    
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ У тебя нет прав администратора")
+        return
+    
+    if not context.args:
+        await update.message.reply_text(
+            "⏹ Формат команды:\n"
+            "`/broadcast_stop ID_рассылки`"
+        )
+        return
+    
+    try:
+        broadcast_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("❌ ID должен быть числом")
+        return
+    
+    updated = await run_db(db.set_broadcast_status, broadcast_id, 'cancelled')
+    if not updated:
+        await update.message.reply_text(f"❌ Рассылка #{broadcast_id} не найдена")
+        return
+    if not broadcast.cancel_broadcast(broadcast_id):
+        await update.message.reply_text(f"⏹ Рассылка #{broadcast_id} остановлена")
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Сэмплирующий профилировщик: /profile [секунд] или /profile stop"""
+    user_id = update.effective_user.id
+    
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ У тебя нет прав администратора")
+        return
+    
+    chat_id = update.effective_chat.id
+    arg = context.args[0].lower() if context.args else ''
+    if arg == 'stop':
+        task = context.bot_data.pop('profile_task', None)
+        if task is None or not metrics.profiler.running:
+            await update.message.reply_text("ℹ️ Профилировщик не запущен")
+            return
+        task.cancel()
+        await send_profile(context.bot, chat_id)
+        return
+    
+    try:
+        seconds = int(arg) if arg else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await update.message.reply_text("❌ Длительность должна быть числом секунд")
+        return
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    
+    if not metrics.profiler.start():
+        await update.message.reply_text("ℹ️ Профилировщик уже запущен: /profile stop")
+        return
+    context.bot_data['profile_task'] = context.application.create_task(
+        send_profile(context.bot, chat_id, delay=seconds, bot_data=context.bot_data)
+    )
+    await update.message.reply_text(f"🔬 Профилирую {seconds} с, потом пришлю результат")
+
+async def send_profile(bot, chat_id, delay=0, bot_data=None):
+    """Останавливаем профилировщик и шлём самые горячие функции и стеки файлом"""
+    if delay:
+        await asyncio.sleep(delay)
+        bot_data.pop('profile_task', None)
+    profiler = metrics.profiler
+    profiler.stop()
+    total = sum(profiler.stacks.values())
+    if not total:
+        await bot.send_message(chat_id, "🔬 Профиль пуст: бот всё это время ждал апдейтов")
+        return
+    
+    lines = [f"🔬 Профиль: {profiler.samples} сэмплов, {total} стеков потоков",
+             "", "% в функции / % с вызванными - функция"]
+    for name, own, cumulative in profiler.top():
+        lines.append(f"{own / total:6.1%} {cumulative / total:6.1%}  {name}")
+    await bot.send_message(chat_id, "\n".join(lines))
+    await bot.send_document(
+        chat_id, io.BytesIO(profiler.folded().encode()), filename="profile.folded",
+        caption="🔥 Стеки в формате folded: flamegraph.pl или speedscope.app",
+    )
+
 # ========== МЕНЮ КОМАНД ==========
 
 async def set_bot_commands(application: Application) -> None:
@@ -501,6 +839,7 @@ async def set_bot_commands(application: Application) -> None:
         ("start", "Начать работу с ботом"),
         ("help", "Помощь по командам"),
         ("promo", "Получить промокод"),
+        ("search", "Найти промокоды"),
         ("myid", "Узнать свой ID")
     ]
     
@@ -508,32 +847,69 @@ async def set_bot_commands(application: Application) -> None:
         [telegram.BotCommand(command, description) for command, description in commands]
     )
 
+async def sweep_expired_job(context) -> None:
+    """Снимаем с выдачи просроченные промокоды (задача JobQueue и при запуске)"""
+    try:
+        await run_db(expiry.sweep_expired)
+        # Заодно укорачиваем журнал изменений: клиенты с такой давней версией
+        # каталога получат полный снимок
+        await run_db(catalogue.prune_changes)
+    except Exception as e:
+        print(f"❌ Ошибка при снятии просроченных промокодов: {e}")
+
+async def on_startup(application: Application) -> None:
+    await set_bot_commands(application)
+    # Первая проверка до приёма апдейтов: бот мог быть выключен в полночь
+    await sweep_expired_job(application)
+    await broadcast.resume_broadcasts(application, ADMIN_ID)
+
 # ========== ЗАПУСК БОТА ==========
 
-def main() -> None:
-    """Основная функция для запуска бота"""
-    print("🔄 Запускаю бота...")
-    
-    # Проверяем подключение к базе
-    print("🔍 Проверяем базу данных...")
-    promocodes = get_active_promocodes()
-    channels = get_referral_channels()
-    
-    print(f"✅ Найдено промокодов: {len(promocodes)}")
-    print(f"✅ Найдено каналов: {len(channels)}")
-    print(f"👑 Админ ID: {ADMIN_ID}")
-    
-    # Создаем приложение бота
-    application = Application.builder().token(BOT_TOKEN).build()
-    
-    # Устанавливаем меню команд
-    application.post_init = lambda app: set_bot_commands(app)
+def handler_name(handler):
+    """Метка обработчика в метриках: /команда или имя функции"""
+    if isinstance(handler, CommandHandler):
+        return '/' + sorted(handler.commands)[0]
+    return handler.callback.__name__
+
+def build_application(token=BOT_TOKEN, base_url=None, webhook=False, limiter=None,
+                      processor=None) -> Application:
+    """Приложение бота со всеми обработчиками (processor - порядок апдейтов вебхука)"""
+    # Все отправки идут через общую очередь с лимитами Telegram,
+    # ответы админу - вне очереди
+    builder = Application.builder().token(token).rate_limiter(
+        limiter or OutboundLimiter(priority_chats={ADMIN_ID})
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if webhook:
+        # Апдейты разных пользователей - параллельно, одного - по порядку
+        # (bot.webhook); ответы параллельных обработчиков не должны ждать
+        # одно соединение к API. Принятых апдейтов не больше queue_size
+        processor = processor or OrderedUpdateProcessor()
+        builder = (builder.concurrent_updates(processor)
+                   .update_queue(BoundedUpdateQueue(processor.queue_size))
+                   .connection_pool_size(processor.workers))
+    application = builder.build()
+    
+    # Устанавливаем меню команд и продолжаем прерванные рассылки
+    application.post_init = on_startup
+    
+    # Флаг is_active просроченным снимает фоновая задача (выдача и сама их не отдаёт)
+    if application.job_queue is not None:
+        application.job_queue.run_repeating(
+            sweep_expired_job, interval=expiry.EXPIRY_SWEEP_INTERVAL, name="expiry_sweep"
+        )
+    else:
+        print("⚠️ JobQueue недоступна (нужен python-telegram-bot[job-queue]): "
+              "просроченные промокоды снимаются только через python -m database.expiry")
     
     # Добавляем обработчики команд для всех пользователей
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("promo", promo_command))
+    application.add_handler(CommandHandler("search", search_command))
     application.add_handler(CommandHandler("myid", myid_command))
+    application.add_handler(InlineQueryHandler(inline_query))
     
     # Админ-команды (доступны только админу)
     application.add_handler(CommandHandler("admin", admin_command))
@@ -542,15 +918,59 @@ def main() -> None:
     application.add_handler(CommandHandler("add_promo", add_promo_command))
     application.add_handler(CommandHandler("list_promos", list_promos_command))
     application.add_handler(CommandHandler("promo_stats", promo_stats_command))
+    application.add_handler(CommandHandler("promo_ctr", promo_ctr_command))
     application.add_handler(CommandHandler("delete_promo", delete_promo_command))
     application.add_handler(CommandHandler("add_channel", add_channel_command))
     application.add_handler(CommandHandler("delete_channel", delete_channel_command))
     application.add_handler(CommandHandler("list_channels", list_channels_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(MessageHandler(filters.Document.ALL & filters.User(ADMIN_ID), import_document))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("broadcast_stop", broadcast_stop_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    
+    # Время и исключения каждого обработчика - в метрики
+    for handler in application.handlers[0]:
+        handler.callback = metrics.timed(
+            metrics.handler_seconds, handler_name(handler), errors=metrics.handler_errors
+        )(handler.callback)
+    
+    # Аналитика: каждая команда считается до того, как её обработают
+    application.bot_data['commands'] = {
+        command for handler in application.handlers[0] if isinstance(handler, CommandHandler)
+        for command in handler.commands
+    }
+    application.add_handler(MessageHandler(filters.COMMAND, track_command), group=-1)
+    return application
+
+def main() -> None:
+    """Основная функция для запуска бота"""
+    print("🔄 Запускаю бота...")
+    
+    # Проверяем подключение к базе и применяем миграции
+    print("🔍 Проверяем базу данных...")
+    db.init_db()
+    promocodes = get_active_promocodes()
+    channels = get_referral_channels()
+    
+    print(f"✅ Найдено промокодов: {len(promocodes)}")
+    print(f"✅ Найдено каналов: {len(channels)}")
+    print(f"👑 Админ ID: {ADMIN_ID}")
     
-    # Запускаем бота
+    # Создаем приложение бота
+    application = build_application(webhook=bool(WEBHOOK_URL))
+    metrics.serve()
+    
+    # Запускаем бота: с WEBHOOK_URL - вебхук с параллельной обработкой,
+    # иначе опрос getUpdates (удобно для разработки)
     print("✅ Бот запущен! Проверяй в Telegram")
     print("📱 Меню команд должно появиться рядом с полем ввода")
-    application.run_polling()
+    if WEBHOOK_URL:
+        run_webhook(application)
+    else:
+        application.run_polling()
+    events.recorder.close()
+    shutdown_db()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,248 @@
+"""Общий планировщик исходящих сообщений с учётом лимитов Telegram.
+
+Все запросы бота к Bot API идут через OutboundLimiter (rate_limiter
+приложения PTB), поэтому лимиты соблюдаются для всех обработчиков сразу:
+
+* общий поток - не больше OUTBOUND_GLOBAL_RATE сообщений в секунду;
+* один чат - не больше OUTBOUND_CHAT_RATE в секунду (группы и каналы -
+  OUTBOUND_GROUP_RATE), у каждого чата своё ведро токенов;
+* ответ 429 (RetryAfter) ставит отправку на паузу на retry_after секунд,
+  сообщение повторяется;
+* очередь упорядочена по приоритету: ответы админу раньше ответов
+  пользователям, а рассылки - в последнюю очередь.
+
+Приоритет конкретного вызова можно задать явно:
+    await bot.send_message(chat_id, text, rate_limit_args={'priority': PRIORITY_LOW})
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+import metrics
+
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_GROUP_RATE = float(os.getenv('OUTBOUND_GROUP_RATE', str(20 / 60)))
+# Сколько сообщений подряд чат может получить без ожидания
+OUTBOUND_CHAT_BURST = float(os.getenv('OUTBOUND_CHAT_BURST', '1'))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+# Вёдер чатов, после которого полные (давно молчавшие) выбрасываются
+OUTBOUND_MAX_BUCKETS = 10000
+# Сколько последних задержек отправки хранить для перцентилей
+LATENCY_WINDOW = 1000
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Методы, которые отправляют что-то в чат и попадают под лимиты
+LIMITED_PREFIXES = ('send', 'copy', 'forward', 'edit')
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Сколько секунд ждать до следующего токена (0 - можно сейчас)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+def is_group(chat_id):
+    # У групп и каналов отрицательный id, каналы ещё адресуют через @username
+    return isinstance(chat_id, str) or int(chat_id) < 0
+
+
+class OutboundLimiter(BaseRateLimiter):
+    """Очередь отправок с вёдрами токенов, приоритетами и метриками"""
+
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, chat_rate=OUTBOUND_CHAT_RATE,
+                 group_rate=OUTBOUND_GROUP_RATE, chat_burst=OUTBOUND_CHAT_BURST,
+                 max_retries=OUTBOUND_MAX_RETRIES, priority_chats=()):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.priority_chats = {chat_id for chat_id in priority_chats if chat_id}
+        self._global = TokenBucket(global_rate, capacity=1.0)
+        self._chats = {}
+        # Готовые к отправке: (приоритет, порядковый номер, chat_id, future)
+        self._queue = []
+        # Ждут своего чата: (когда освободится, приоритет, номер, chat_id, future)
+        self._delayed = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._wakeup = None
+        self._dispatcher = None
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {
+            'sent': 0,
+            'retry_after': 0,
+            'failed': 0,
+            'max_queue_depth': 0,
+        }
+
+    async def initialize(self):
+        # PTB вызывает initialize и от приложения, и от updater с тем же ботом
+        if self._dispatcher is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for entry in self._queue + self._delayed:
+            if not entry[-1].done():
+                entry[-1].cancel()
+        self._queue, self._delayed = [], []
+
+    @property
+    def queue_depth(self):
+        return len(self._queue) + len(self._delayed)
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= OUTBOUND_MAX_BUCKETS:
+                # Полное ведро ничем не отличается от нового - его можно забыть
+                self._chats = {k: b for k, b in self._chats.items() if not b.is_full(now)}
+            rate = self.group_rate if is_group(chat_id) else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, capacity=self.chat_burst)
+        return bucket
+
+    async def _sleep(self, timeout):
+        """Спим до timeout или до появления нового сообщения в очереди"""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, priority, seq, chat_id, future = heapq.heappop(self._delayed)
+                heapq.heappush(self._queue, (priority, seq, chat_id, future))
+
+            if not self._queue:
+                await self._sleep(self._delayed[0][0] - now if self._delayed else None)
+                continue
+
+            # Пауза после 429 и общий лимит касаются всех чатов сразу
+            wait = max(self._paused_until - now, self._global.delay(now))
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            priority, seq, chat_id, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            bucket = self._chat_bucket(chat_id, now)
+            chat_wait = bucket.delay(now)
+            if chat_wait > 0:
+                # Чат ещё занят - пропускаем вперёд сообщения в другие чаты
+                heapq.heappush(self._delayed, (now + chat_wait, priority, seq, chat_id, future))
+                continue
+
+            bucket.take(now)
+            self._global.take(now)
+            future.set_result(None)
+
+    async def _acquire(self, chat_id, priority, seq):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, seq, chat_id, future))
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue_depth)
+        self._wakeup.set()
+        await future
+
+    def _priority(self, chat_id, rate_limit_args):
+        if isinstance(rate_limit_args, dict) and 'priority' in rate_limit_args:
+            return rate_limit_args['priority']
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+        return PRIORITY_HIGH if chat_id in self.priority_chats else PRIORITY_NORMAL
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None or not endpoint.startswith(LIMITED_PREFIXES):
+            return await self._call(callback, args, kwargs, endpoint)
+
+        priority = self._priority(chat_id, rate_limit_args)
+        # Повтор после 429 сохраняет место в очереди: порядок в чате не меняется
+        seq = next(self._seq)
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority, seq)
+            try:
+                result = await self._call(callback, args, kwargs, endpoint)
+            except RetryAfter as e:
+                self.stats['retry_after'] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                if attempt == self.max_retries:
+                    self.stats['failed'] += 1
+                    raise
+                continue
+            self.stats['sent'] += 1
+            self._latencies.append(time.monotonic() - started)
+            return result
+
+    async def _call(self, callback, args, kwargs, endpoint):
+        """Сам запрос к Bot API: его время и ошибки - в метрики по методу"""
+        if not metrics.METRICS_ENABLED:
+            return await callback(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception as e:
+            metrics.telegram_errors.inc(endpoint, type(e).__name__)
+            raise
+        finally:
+            metrics.telegram_seconds.observe(time.perf_counter() - started, endpoint)
+
+    def report(self):
+        """Метрики: глубина очереди и задержка от вызова до отправки"""
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+        return {
+            **self.stats,
+            'queue_depth': self.queue_depth,
+            'paused': max(0.0, self._paused_until - time.monotonic()),
+            'latency_p50_ms': percentile(50),
+            'latency_p99_ms': percentile(99),
+        }
@@ -0,0 +1,90 @@
+import copy
+import gzip
+import hashlib
+import json
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # есть в requirements.txt; без него (голое окружение) отдаём gzip
+    brotli = None
+
+# Меньше этого сжимать невыгодно
+MIN_COMPRESS_SIZE = 512
+# Уровни сжатия: общий ответ сжимается один раз и максимально, личная
+# копия (with_fields) - на каждый запрос, поэтому быстрее
+SHARED_LEVELS = {'gzip': 9, 'br': 11}
+PERSONAL_LEVELS = {'gzip': 6, 'br': 5}
+
+
+class PreparedResponse:
+    """JSON-ответ, сериализованный и сжатый один раз на версию каталога"""
+
+    def __init__(self, payload, cache_control='no-cache', expires_at=None):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.cache_control = cache_control
+        # Момент (time.time()), когда ответ устареет из-за сроков промокодов
+        self.expires_at = expires_at
+        self.encoded = {'identity': self.body}
+        self.levels = SHARED_LEVELS
+
+    def with_fields(self, fields):
+        """Копия ответа с дополнительными полями верхнего уровня.
+
+        Каталог заново не сериализуется: поля дописываются в конец готового
+        JSON-объекта, ETag выводится из ETag исходного ответа и этих полей.
+        """
+        if not fields:
+            return self
+        extra = json.dumps(fields, ensure_ascii=False, separators=(',', ':')).encode()
+        response = copy.copy(self)
+        response.body = self.body[:-1] + b',' + extra[1:]
+        response.etag = hashlib.blake2b(self.etag.encode() + extra, digest_size=12).hexdigest()
+        response.encoded = {'identity': response.body}
+        response.levels = PERSONAL_LEVELS
+        return response
+
+    def available_encodings(self):
+        if len(self.body) < MIN_COMPRESS_SIZE:
+            return ()
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def encode(self, encoding):
+        """Тело в нужной кодировке; сжимаем при первом запросе и запоминаем.
+
+        Снимок каталога живёт долго и сжимается один раз, а страницы с
+        фильтрами не тратят время на кодировки, которые никто не попросит.
+        """
+        body = self.encoded.get(encoding)
+        if body is None:
+            if encoding == 'br':
+                body = brotli.compress(self.body, quality=self.levels['br'])
+            else:
+                body = gzip.compress(self.body, compresslevel=self.levels['gzip'], mtime=0)
+            self.encoded[encoding] = body
+        return body
+
+    def choose_encoding(self, accept_encoding):
+        accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+        for encoding in self.available_encodings():
+            if encoding in accepted:
+                return encoding
+        return 'identity'
+
+    def to_response(self, request):
+        """Flask Response: 304 по If-None-Match, иначе сжатое тело"""
+        # Слабый ETag: у разных кодировок байты разные, а содержимое одно
+        headers = {
+            'ETag': f'W/"{self.etag}"',
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        if request.if_none_match.contains_weak(self.etag):
+            return Response(status=304, headers=headers)
+
+        encoding = self.choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(self.encode(encoding), headers=headers, mimetype='application/json')
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import threading
+import time
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden
+from telegram.request import HTTPXRequest
+
+import metrics
+
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+MEMBER_STATUSES = {'member', 'administrator', 'creator'}
+
+# Подписка живёт в кэше дольше, отказ - коротко: пользователь, который
+# только что подписался, не должен долго ждать доступа
+SUBSCRIPTION_TTL = float(os.getenv('SUBSCRIPTION_TTL', '300'))
+SUBSCRIPTION_NEGATIVE_TTL = float(os.getenv('SUBSCRIPTION_NEGATIVE_TTL', '15'))
+SUBSCRIPTION_CONCURRENCY = int(os.getenv('SUBSCRIPTION_CONCURRENCY', '20'))
+SUBSCRIPTION_CACHE_SIZE = 100000
+
+
+class SubscriptionChecker:
+    """Проверка подписок пользователя на обязательные каналы.
+
+    Один HTTP-клиент на всё время жизни, каналы проверяются параллельно
+    (не больше concurrency запросов к Telegram), результаты кэшируются
+    по (user_id, канал), а одинаковые проверки в полёте объединяются.
+
+    В кэш попадает только ответ Telegram: статус участника или отказ
+    BadRequest/Forbidden (нет такого пользователя, бот не админ канала).
+    Сеть, таймауты и 429 - ошибка проверки, она уходит вызывающему и не
+    запоминается как «не подписан».
+    """
+
+    def __init__(self, token, api_url=TELEGRAM_API_URL, ttl=SUBSCRIPTION_TTL,
+                 negative_ttl=SUBSCRIPTION_NEGATIVE_TTL, concurrency=SUBSCRIPTION_CONCURRENCY):
+        self.bot = Bot(
+            token=token,
+            base_url=f"{api_url}/bot",
+            request=HTTPXRequest(connection_pool_size=concurrency),
+        )
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.concurrency = concurrency
+        self._cache = {}
+        self._in_flight = {}
+        self._semaphore = None
+        self._start_lock = None
+        self._initialized = False
+        self.stats = {
+            'checks': 0,
+            'api_calls': 0,
+            'cache_hits': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'check_time': 0.0,
+        }
+
+    async def _ensure_started(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._start_lock = asyncio.Lock()
+        if not self._initialized:
+            # Первые проверки приходят пачкой: все ждут одну инициализацию
+            async with self._start_lock:
+                if not self._initialized:
+                    await self.bot.initialize()
+                    self._initialized = True
+
+    async def _fetch(self, user_id, username):
+        async with self._semaphore:
+            self.stats['api_calls'] += 1
+            started = time.perf_counter()
+            try:
+                member = await self.bot.get_chat_member(f"@{username}", user_id)
+                return member.status in MEMBER_STATUSES
+            except (BadRequest, Forbidden) as e:
+                # Ответ Telegram: проверить нельзя - считаем, что не подписан
+                self.stats['errors'] += 1
+                metrics.telegram_errors.inc('getChatMember', type(e).__name__)
+                print(f"Ошибка проверки подписки @{username}: {e}")
+                return False
+            except Exception as e:
+                self.stats['errors'] += 1
+                metrics.telegram_errors.inc('getChatMember', type(e).__name__)
+                raise
+            finally:
+                metrics.telegram_seconds.observe(time.perf_counter() - started, 'getChatMember')
+
+    async def is_subscribed(self, user_id, username):
+        key = (user_id, username)
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] > now:
+            self.stats['cache_hits'] += 1
+            return cached[0]
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            subscribed = await self._fetch(user_id, username)
+        except Exception as e:
+            # Временная ошибка: ждущие ту же проверку получают её же, в кэш - ничего
+            future.set_exception(e)
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._in_flight[key]
+
+        ttl = self.ttl if subscribed else self.negative_ttl
+        self._remember(key, subscribed, time.monotonic() + ttl)
+        future.set_result(subscribed)
+        return subscribed
+
+    def _remember(self, key, subscribed, deadline):
+        if len(self._cache) >= SUBSCRIPTION_CACHE_SIZE:
+            now = time.monotonic()
+            self._cache = {k: v for k, v in self._cache.items() if v[1] > now}
+            if len(self._cache) >= SUBSCRIPTION_CACHE_SIZE:
+                self._cache.clear()
+        self._cache[key] = (subscribed, deadline)
+
+    async def check(self, user_id, usernames):
+        """{username: подписан ли} по всем каналам сразу"""
+        await self._ensure_started()
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self.is_subscribed(user_id, u) for u in usernames))
+        self.stats['checks'] += 1
+        self.stats['check_time'] += time.perf_counter() - started
+        return dict(zip(usernames, results))
+
+    def forget(self, user_id):
+        """Сбрасываем кэш пользователя (например, после кнопки «Я подписался»)"""
+        for key in [k for k in self._cache if k[0] == user_id]:
+            del self._cache[key]
+
+    def report(self):
+        """Статистика: средняя задержка и сэкономленные вызовы Telegram API"""
+        stats = dict(self.stats)
+        lookups = stats['api_calls'] + stats['cache_hits'] + stats['coalesced']
+        stats['api_calls_saved'] = lookups - stats['api_calls']
+        stats['avg_check_ms'] = stats['check_time'] / stats['checks'] * 1000 if stats['checks'] else 0.0
+        return stats
+
+    async def close(self):
+        if self._initialized:
+            await self.bot.shutdown()
+            self._initialized = False
+
+
+class BackgroundLoop:
+    """Цикл событий в отдельном потоке для синхронного кода (Flask).
+
+    HTTP-клиент привязан к циклу событий, поэтому все проверки идут через
+    один долгоживущий цикл, а не через asyncio.run на каждый запрос.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+            return self._loop
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result(timeout)
@@ -0,0 +1,62 @@
+"""Проверка initData мини-аппы Telegram.
+
+Мини-аппа получает от Telegram строку initData (Telegram.WebApp.initData)
+с данными пользователя и подписью hash. Подпись - HMAC-SHA256 от строки
+«ключ=значение» по всем полям, кроме hash, отсортированным и через
+перевод строки; ключ HMAC - HMAC-SHA256 токена бота с ключом
+"WebAppData". Подделать её без токена нельзя, поэтому id пользователя API
+берёт только отсюда, а не из user_id в запросе.
+
+https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+"""
+import hashlib
+import hmac
+import json
+import os
+import time
+from urllib.parse import parse_qsl, urlencode
+
+# Сколько секунд initData действительна после выдачи (auth_date)
+INIT_DATA_MAX_AGE = int(os.getenv('INIT_DATA_MAX_AGE', '86400'))
+
+
+def _secret_key(token):
+    return hmac.new(b"WebAppData", token.encode(), hashlib.sha256).digest()
+
+
+def _signature(fields, token):
+    check_string = '\n'.join(f"{key}={value}" for key, value in sorted(fields.items()))
+    return hmac.new(_secret_key(token), check_string.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_init_data(init_data, token, max_age=INIT_DATA_MAX_AGE, now=None):
+    """Пользователь (dict из поля user) или None, если подпись неверна или устарела"""
+    if not init_data or not token:
+        return None
+    try:
+        fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+    except ValueError:
+        return None
+    received = fields.pop('hash', '')
+    if not hmac.compare_digest(_signature(fields, token), received):
+        return None
+    try:
+        auth_date = int(fields.get('auth_date', 0))
+        user = json.loads(fields.get('user', 'null'))
+    except ValueError:
+        return None
+    if max_age and (now or time.time()) - auth_date > max_age:
+        return None
+    if not isinstance(user, dict) or not isinstance(user.get('id'), int):
+        return None
+    return user
+
+
+def sign_init_data(user, token, auth_date=None, **fields):
+    """initData с подписью, как её выдаёт Telegram (для тестов и бенчмарков)"""
+    fields = {
+        **fields,
+        'auth_date': str(int(auth_date or time.time())),
+        'user': json.dumps(user, ensure_ascii=False, separators=(',', ':')),
+    }
+    return urlencode({**fields, 'hash': _signature(fields, token)})
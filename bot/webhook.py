@@ -0,0 +1,198 @@
+"""Режим вебхука: Telegram сам присылает апдейты на наш HTTP-адрес.
+
+HTTP-сервер - встроенный в python-telegram-bot (Application.run_webhook,
+tornado): таймауты соединений, chunked-тела и TLS (WEBHOOK_CERT и
+WEBHOOK_KEY, если Telegram ходит к боту напрямую) - его забота.
+
+Секрет X-Telegram-Bot-Api-Secret-Token обязателен: без него любой, кто
+достучится до порта, мог бы прислать апдейт от имени ADMIN_ID. Если
+WEBHOOK_SECRET не задан, секрет генерируется при запуске и уходит в
+set_webhook - запросы без него получают 403.
+
+Порядок и параллельность задаёт OrderedUpdateProcessor: апдейты разных
+пользователей обрабатываются параллельно (до WEBHOOK_WORKERS
+одновременно), апдейты одного пользователя - строго по очереди, в
+порядке прихода. При остановке бот перестаёт принимать апдейты и
+дорабатывает уже принятые.
+
+Приём ограничивает BoundedUpdateQueue: Application заводит задачу на
+каждый апдейт из очереди сразу, поэтому без ограничения на входе задачи
+копились бы без предела. Когда принятых и ещё не обработанных апдейтов
+WEBHOOK_QUEUE_SIZE, обработчик HTTP-запроса ждёт места и не отвечает
+Telegram - тот не шлёт больше WEBHOOK_MAX_CONNECTIONS апдейтов разом и
+замедляется сам, ничего не теряя.
+"""
+import asyncio
+import os
+import secrets
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+# Сертификат и ключ, если TLS не снимает прокси перед ботом
+WEBHOOK_CERT = os.getenv('WEBHOOK_CERT')
+WEBHOOK_KEY = os.getenv('WEBHOOK_KEY')
+# Одновременно обрабатываемых апдейтов
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '32'))
+# Принятых и ещё не обработанных апдейтов (в том числе ждущих своей
+# очереди) - следующий запрос Telegram ждёт места
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '5000'))
+# Параллельных соединений, которые Telegram откроет к вебхуку (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# Файл, куда дописываются апдейты (для benchmarks.bench_webhook)
+WEBHOOK_RECORD = os.getenv('WEBHOOK_RECORD')
+
+
+def ordering_key(update):
+    """Ключ, внутри которого сохраняется порядок апдейтов"""
+    if not isinstance(update, Update):
+        # Свои объекты в update_queue - порядок не важен
+        return ('object', id(update))
+    if update.effective_user is not None:
+        return ('user', update.effective_user.id)
+    if update.effective_chat is not None:
+        return ('chat', update.effective_chat.id)
+    # Апдейт ни к кому не привязан - порядок не важен
+    return ('update', update.update_id)
+
+
+class BoundedUpdateQueue(asyncio.Queue):
+    """update_queue приложения, в которой не больше limit незавершённых апдейтов.
+
+    Незавершённый - положен в очередь, а task_done() по нему ещё не было:
+    Application вызывает его, когда обработка апдейта закончилась. put()
+    апдейта ждёт, пока такой станет меньше limit; служебные объекты
+    приложения (сигнал остановки) кладутся без ожидания.
+    """
+
+    def __init__(self, limit=WEBHOOK_QUEUE_SIZE):
+        super().__init__()
+        self.limit = limit
+        self.accepted = 0
+        self._room = asyncio.Event()
+        self.stats = {'waited': 0, 'max_accepted': 0}
+
+    async def put(self, item):
+        if isinstance(item, Update) and self.accepted >= self.limit:
+            self.stats['waited'] += 1
+            while self.accepted >= self.limit:
+                self._room.clear()
+                await self._room.wait()
+        await super().put(item)
+
+    def put_nowait(self, item):
+        super().put_nowait(item)
+        self.accepted += 1
+        self.stats['max_accepted'] = max(self.stats['max_accepted'], self.accepted)
+
+    def task_done(self):
+        super().task_done()
+        self.accepted -= 1
+        if self.accepted < self.limit:
+            self._room.set()
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов с порядком по пользователю.
+
+    Семафор базового класса пропускает все принятые апдейты (их и так не
+    больше queue_size - см. BoundedUpdateQueue), свой ограничивает
+    одновременно обрабатываемые (workers). Апдейт сначала ждёт
+    предыдущие апдейты своего пользователя и только потом занимает
+    обработчик: пользователь с длинной очередью не держит обработчики,
+    пока ждёт сам себя, и остальные не стоят за ним.
+    """
+
+    def __init__(self, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE, record=WEBHOOK_RECORD):
+        super().__init__(max(workers, queue_size))
+        self.workers = workers
+        self.queue_size = queue_size
+        self.record_path = record
+        self._record = None
+        self._slots = asyncio.Semaphore(workers)
+        # ключ порядка: [блокировка, апдейтов с этим ключом в работе]
+        self._queues = {}
+        self._pending = 0
+        self.stats = {
+            'processed': 0,
+            'errors': 0,
+            'max_pending': 0,
+        }
+
+    @property
+    def pending(self):
+        return self._pending
+
+    async def initialize(self):
+        if self.record_path:
+            self._record = open(self.record_path, 'a', encoding='utf-8')
+
+    async def shutdown(self):
+        if self._record:
+            self._record.close()
+            self._record = None
+
+    async def do_process_update(self, update, coroutine):
+        key = ordering_key(update)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = [asyncio.Lock(), 0]
+        queue[1] += 1
+        self._pending += 1
+        self.stats['max_pending'] = max(self.stats['max_pending'], self._pending)
+        try:
+            # asyncio.Lock пропускает ждущих по порядку прихода
+            async with queue[0], self._slots:
+                if self._record and isinstance(update, Update):
+                    self._record.write(update.to_json() + '\n')
+                try:
+                    await coroutine
+                    self.stats['processed'] += 1
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    print(f"❌ Ошибка обработки апдейта: {e}")
+        finally:
+            self._pending -= 1
+            queue[1] -= 1
+            if not queue[1]:
+                del self._queues[key]
+
+
+def webhook_secret():
+    """WEBHOOK_SECRET или случайный секрет на время работы (A-Z, a-z, 0-9, _ и -)"""
+    if WEBHOOK_SECRET:
+        return WEBHOOK_SECRET
+    print("🔐 WEBHOOK_SECRET не задан: сгенерирован секрет на время работы")
+    return secrets.token_urlsafe(32)
+
+
+def run_webhook(application):
+    """Запускает бота в режиме вебхука до SIGINT/SIGTERM.
+
+    Вебхук при остановке не удаляется: пока бот перезапускается, Telegram
+    копит апдейты у себя.
+    """
+    processor = application.update_processor
+    print(f"✅ Вебхук слушает {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH} "
+          f"(обработчиков: {getattr(processor, 'workers', processor.max_concurrent_updates)}, "
+          f"очередь: {getattr(application.update_queue, 'limit', processor.max_concurrent_updates)})")
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH.lstrip('/'),
+        webhook_url=WEBHOOK_URL,
+        secret_token=webhook_secret(),
+        cert=WEBHOOK_CERT,
+        key=WEBHOOK_KEY,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES,
+    )
+    if isinstance(processor, OrderedUpdateProcessor):
+        print(f"📊 Апдейты: {processor.stats}")
+    if isinstance(application.update_queue, BoundedUpdateQueue):
+        print(f"📥 Приём: {application.update_queue.stats}")
@@ -0,0 +1,89 @@
+"""Стабильное закрепление промокода за пользователем.
+
+Консистентное хэширование: каждый активный промокод ставит на кольцо
+2^64 несколько виртуальных точек. Кольцо один раз разворачивается в
+таблицу из TABLE_SIZE ячеек: ячейка j принадлежит промокоду, чья точка
+первой идёт на кольце после j / TABLE_SIZE. Промокод пользователя -
+table[hash(user_id) % TABLE_SIZE], то есть поиск за O(1) без загрузки
+каталога.
+
+При добавлении промокода к нему переходят только ячейки, которые его
+точки отняли у соседей, при удалении - только его собственные: около
+1/N пользователей вместо почти всех при user_id % len(promocodes).
+"""
+import os
+from array import array
+from bisect import bisect_left
+
+# Размер таблицы поиска (8 байт на ячейку)
+TABLE_SIZE = int(os.getenv('PROMO_ASSIGNMENT_TABLE_SIZE', '65536'))
+# Виртуальных точек на промокод при маленьком каталоге - ровнее нагрузка
+MAX_VNODES = 160
+# Всего точек на кольце при большом каталоге - ограничивает время сборки
+RING_BUDGET = 200000
+
+_MASK = (1 << 64) - 1
+
+
+def mix64(value):
+    """splitmix64: быстрый детерминированный хэш целого числа"""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK
+    return value ^ (value >> 31)
+
+
+def vnodes_for(count):
+    """Число виртуальных точек - степень двойки.
+
+    Точки промокода с меньшим числом реплик - подмножество точек с большим,
+    а степени двойки меняются редко: перераспределение пользователей при
+    смене числа реплик происходит только на порогах count = RING_BUDGET / 2^k.
+    """
+    target = max(1, min(MAX_VNODES, RING_BUDGET // max(count, 1)))
+    return 1 << (target.bit_length() - 1)
+
+
+class PromoAssignment:
+    """Таблица поиска promo_id по user_id"""
+
+    def __init__(self, promo_ids, table_size=TABLE_SIZE, vnodes=None, expires_at=None):
+        self.promo_ids = sorted(set(promo_ids))
+        self.table_size = table_size
+        self.vnodes = vnodes or vnodes_for(len(self.promo_ids))
+        # Момент (time.time()), после которого таблицу надо перестроить
+        self.expires_at = expires_at
+        self.table = self._build(self.promo_ids, table_size, self.vnodes)
+
+    @staticmethod
+    def _build(promo_ids, size, vnodes):
+        table = array('q', [-1]) * size
+        if not promo_ids:
+            return table
+
+        ring = sorted(
+            (mix64((promo_id << 8) ^ replica), promo_id)
+            for promo_id in promo_ids
+            for replica in range(vnodes)
+        )
+        points = [point for point, _ in ring]
+        owners = [promo_id for _, promo_id in ring]
+
+        step = (1 << 64) // size
+        i = bisect_left(points, 0)
+        for j in range(size):
+            position = j * step
+            # Ячейки идут по кольцу по возрастанию - двигаемся вперёд без поиска
+            while i < len(points) and points[i] < position:
+                i += 1
+            table[j] = owners[i] if i < len(points) else owners[0]
+        return table
+
+    def __len__(self):
+        return len(self.promo_ids)
+
+    def lookup(self, user_id):
+        """promo_id для пользователя или None, если промокодов нет"""
+        if not self.promo_ids:
+            return None
+        return self.table[mix64(user_id) % self.table_size]
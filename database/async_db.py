@@ -0,0 +1,52 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from database.pool import POOL_SIZE
+
+# Потоков под запросы к базе: больше, чем соединений в пуле, смысла нет
+DB_WORKERS = int(os.getenv('DB_WORKERS', str(POOL_SIZE)))
+# Сколько запросов одновременно может ждать обработчиков бота
+DB_CONCURRENCY = int(os.getenv('DB_CONCURRENCY', str(DB_WORKERS * 4)))
+
+_executor = None
+_semaphore = None
+_semaphore_loop = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+    return _executor
+
+
+def _get_semaphore():
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(DB_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет синхронную функцию работы с базой в отдельном потоке.
+
+    Цикл событий бота не блокируется медленным запросом или
+    блокировкой записи, а семафор ограничивает число запросов в работе.
+    """
+    loop = asyncio.get_running_loop()
+    async with _get_semaphore():
+        return await loop.run_in_executor(
+            _get_executor(), functools.partial(func, *args, **kwargs)
+        )
+
+
+def shutdown():
+    """Останавливаем пул потоков (при завершении бота)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
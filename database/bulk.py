@@ -0,0 +1,251 @@
+"""Загрузка и выгрузка промокодов пачками (CSV и JSONL).
+
+Файл читается построчно и пишется в базу транзакциями по
+IMPORT_BATCH_SIZE строк, поэтому фид любого размера не загружается
+в память целиком. Ключ промокода - (store, code): строка с уже
+известным ключом обновляет промокод, а не создаёт дубль.
+
+Колонки: store, code, description, expires_at (ГГГГ-ММ-ДД или пусто),
+category (slug из CATEGORIES, по умолчанию - по магазину), is_active,
+channel (username канала без @, по умолчанию - первый обязательный).
+
+Запуск:
+    python -m database.bulk import partners.csv [--format csv] [--dry-run]
+    python -m database.bulk export promocodes.jsonl [--active]
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database import db
+from database.cache import catalogue_changed
+from database.categories import CATEGORIES, guess_category
+
+FORMATS = ('csv', 'jsonl')
+FIELDS = ('store', 'code', 'description', 'expires_at', 'category', 'is_active', 'channel')
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '5000'))
+EXPORT_BATCH_SIZE = 1000
+# Сколько ошибок валидации показывать в отчёте (считаются все)
+MAX_REPORTED_ERRORS = 20
+MAX_STORE_LENGTH = 100
+MAX_CODE_LENGTH = 64
+MAX_DESCRIPTION_LENGTH = 500
+# Ограничения Telegram на username
+CHANNEL_RE = re.compile(r'^[A-Za-z0-9_]{5,32}$')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'да', ''}
+FALSE_VALUES = {'0', 'false', 'no', 'нет'}
+
+UPSERT_PROMOCODE_SQL = '''
+    INSERT INTO promocodes (store, code, description, expires_at, category, is_active, channel)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (store, code) DO UPDATE SET
+        description = excluded.description,
+        expires_at = excluded.expires_at,
+        category = excluded.category,
+        is_active = excluded.is_active,
+        channel = excluded.channel
+'''
+EXPORT_SQL = 'SELECT {fields} FROM promocodes ORDER BY id'
+EXPORT_ACTIVE_SQL = f'''
+    SELECT {{fields}} FROM promocodes
+    WHERE is_active = 1 AND {db.NOT_EXPIRED_CONDITION}
+    ORDER BY created_at DESC, id DESC
+'''
+
+
+def detect_format(path, fmt=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'json':
+        fmt = 'jsonl'
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат {fmt!r}, нужен один из: {', '.join(FORMATS)}")
+    return fmt
+
+
+def read_rows(stream, fmt):
+    """(номер строки, словарь) по одной строке файла"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_no, None
+            continue
+        yield line_no, row if isinstance(row, dict) else None
+
+
+def validate(row):
+    """Кортеж для UPSERT_PROMOCODE_SQL; ValueError с причиной, если строка неверная"""
+    if row is None:
+        raise ValueError("не разобрать строку")
+
+    def text(name):
+        value = row.get(name)
+        return '' if value is None else str(value).strip()
+
+    store, code, description = text('store'), text('code'), text('description')
+    if not store or len(store) > MAX_STORE_LENGTH:
+        raise ValueError("пустой или слишком длинный store")
+    if not code or len(code) > MAX_CODE_LENGTH or any(ch.isspace() for ch in code):
+        raise ValueError("пустой, слишком длинный или с пробелами code")
+    if len(description) > MAX_DESCRIPTION_LENGTH:
+        raise ValueError("слишком длинный description")
+
+    expires_at = text('expires_at')[:10] or None
+    if expires_at:
+        try:
+            datetime.strptime(expires_at, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"дата {expires_at!r} не в формате ГГГГ-ММ-ДД") from None
+
+    category = text('category').lower() or guess_category(store)
+    if category not in CATEGORIES:
+        raise ValueError(f"неизвестная категория {category!r}")
+
+    is_active = text('is_active').lower()
+    if is_active not in TRUE_VALUES | FALSE_VALUES:
+        raise ValueError(f"is_active {is_active!r} не похоже на да/нет")
+
+    channel = text('channel').lstrip('@') or None
+    if channel and not CHANNEL_RE.match(channel):
+        raise ValueError(f"канал {channel!r} не похож на username")
+
+    return store, code, description, expires_at, category, int(is_active in TRUE_VALUES), channel
+
+
+def _count(conn):
+    return conn.execute(db.PROMO_TOTALS_SQL).fetchone()['total']
+
+
+def import_promocodes(stream, fmt, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """Загружаем промокоды из открытого текстового потока, возвращаем отчёт"""
+    report = {'read': 0, 'valid': 0, 'invalid': 0, 'inserted': 0, 'updated': 0, 'errors': []}
+    started = time.perf_counter()
+
+    def flush(batch):
+        if batch and not dry_run:
+            # Одна транзакция на пачку: fsync раз на batch_size строк, а не на каждую.
+            # Новые строки - прирост счётчика внутри неё: пока она открыта, другие
+            # писатели (сборщик просроченных, бот) ждут, и прирост весь наш.
+            # changes() тут не помогает: вставку и обновление UPSERT считает одинаково
+            with db.get_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                before = _count(conn)
+                conn.executemany(UPSERT_PROMOCODE_SQL, batch)
+                report['inserted'] += _count(conn) - before
+
+    batch = []
+    for line_no, row in read_rows(stream, fmt):
+        report['read'] += 1
+        try:
+            batch.append(validate(row))
+        except ValueError as e:
+            report['invalid'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append(f"строка {line_no}: {e}")
+            continue
+        report['valid'] += 1
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+
+    if not dry_run:
+        # Строки, совпавшие по (store, code) с уже существующими или друг с другом
+        report['updated'] = report['valid'] - report['inserted']
+        catalogue_changed.send('promocodes', reason='import', inserted=report['inserted'], updated=report['updated'])
+
+    report['elapsed'] = time.perf_counter() - started
+    report['rows_per_second'] = report['read'] / report['elapsed'] if report['elapsed'] else 0.0
+    return report
+
+
+def import_file(path, fmt=None, **options):
+    fmt = detect_format(path, fmt)
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        return import_promocodes(stream, fmt, **options)
+
+
+def export_promocodes(stream, fmt, active_only=False):
+    """Пишем промокоды в поток по мере чтения из базы, возвращаем число строк"""
+    sql = (EXPORT_ACTIVE_SQL if active_only else EXPORT_SQL).format(fields=', '.join(FIELDS))
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(FIELDS)
+
+    count = 0
+    with db.get_connection() as conn:
+        cursor = conn.execute(sql)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                if writer is not None:
+                    writer.writerow(['' if value is None else value for value in row])
+                else:
+                    stream.write(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n')
+            count += len(rows)
+    return count
+
+
+def export_file(path, fmt=None, active_only=False):
+    fmt = detect_format(path, fmt)
+    if path == '-':
+        return export_promocodes(sys.stdout, fmt, active_only)
+    with open(path, 'w', encoding='utf-8', newline='') as stream:
+        return export_promocodes(stream, fmt, active_only)
+
+
+def format_report(report):
+    """Отчёт о загрузке текстом (для консоли и бота)"""
+    lines = [
+        f"📥 Прочитано строк: {report['read']}",
+        f"✅ Новых: {report['inserted']}, обновлено: {report['updated']}",
+        f"⚠️ С ошибками: {report['invalid']}",
+        f"⚡️ {report['rows_per_second']:,.0f} строк/с ({report['elapsed']:.1f} с)",
+    ]
+    lines += [f"   {error}" for error in report['errors']]
+    if report['invalid'] > len(report['errors']):
+        lines.append(f"   ... и ещё {report['invalid'] - len(report['errors'])}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Загрузка и выгрузка промокодов")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    load = subparsers.add_parser('import', help="загрузить CSV/JSONL (повторы по store+code обновляются)")
+    load.add_argument('path')
+    load.add_argument('--format', choices=FORMATS)
+    load.add_argument('--dry-run', action='store_true', help="только проверить строки")
+    dump = subparsers.add_parser('export', help="выгрузить в CSV/JSONL ('-' - в stdout)")
+    dump.add_argument('path')
+    dump.add_argument('--format', choices=FORMATS)
+    dump.add_argument('--active', action='store_true', help="только активные")
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        db.init_db()
+        print(format_report(import_file(args.path, args.format, dry_run=args.dry_run)))
+    else:
+        count = export_file(args.path, args.format or ('jsonl' if args.path == '-' else None), args.active)
+        print(f"📤 Выгружено промокодов: {count}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import functools
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Максимальное время жизни снимка, даже если ничего не истекает. Записи
+# других процессов видит database.versions, TTL - последняя страховка
+CACHE_TTL = float(os.getenv('CACHE_TTL', '600'))
+
+
+def earliest_expiry(rows):
+    """Момент (time.time()), когда первый из промокодов перестанет быть активным.
+
+    Промокод активен, пока expires_at > DATE('now'), то есть до полуночи UTC
+    дня expires_at.
+    """
+    deadline = None
+    for row in rows:
+        expires_at = row['expires_at']
+        if not expires_at:
+            continue
+        try:
+            day = datetime.strptime(str(expires_at)[:10], '%Y-%m-%d')
+        except ValueError:
+            continue
+        ts = day.replace(tzinfo=timezone.utc).timestamp()
+        if deadline is None or ts < deadline:
+            deadline = ts
+    return deadline
+
+
+class SnapshotCache:
+    """Кэш снимков каталога внутри процесса.
+
+    Каждая запись помечена тегами ('promocodes', 'channels'); запись
+    в таблицу сбрасывает все снимки с её тегом. Снимок живёт не дольше
+    ttl и не дольше момента, который вернула функция expires.
+
+    before_read (функция без аргументов) вызывается перед каждым чтением:
+    через неё database.versions сбрасывает снимки, устаревшие из-за
+    записей других процессов.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, before_read=None):
+        self.ttl = ttl
+        self.before_read = before_read
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, tags, key, loader, expires=None):
+        if isinstance(tags, str):
+            tags = (tags,)
+        if self.before_read is not None:
+            self.before_read()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation(tags)
+
+        value = loader()
+        deadline = now + self.ttl
+        if expires is not None:
+            expiry = expires(value)
+            if expiry is not None:
+                deadline = min(deadline, expiry)
+
+        with self._lock:
+            # Пока грузили, таблицу могли изменить - такой снимок не сохраняем
+            if self._generation(tags) == generation:
+                self._entries[key] = (value, deadline, tags)
+        return value
+
+    def peek(self, key):
+        """Снимок, если он есть и не устарел, иначе None (без загрузки)"""
+        if self.before_read is not None:
+            self.before_read()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self.hits += 1
+                return entry[0]
+        return None
+
+    def _generation(self, tags):
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def invalidate(self, *tags):
+        """Сбрасываем снимки с указанными тегами (без тегов - все)"""
+        with self._lock:
+            self.invalidations += 1
+            if not tags:
+                tags = set(self._generations)
+                for _, _, entry_tags in self._entries.values():
+                    tags.update(entry_tags)
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [key for key, entry in self._entries.items() if set(entry[2]) & set(tags)]
+            for key in stale:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+            }
+
+
+class Signal:
+    """Событие с подписчиками: send() синхронно вызывает каждого
+    получателя в потоке отправителя как receiver(*tags, **info).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._receivers = []
+
+    def connect(self, receiver):
+        """Подписываем получателя (можно как декоратор)"""
+        with self._lock:
+            if receiver not in self._receivers:
+                self._receivers.append(receiver)
+        return receiver
+
+    def disconnect(self, receiver):
+        with self._lock:
+            if receiver in self._receivers:
+                self._receivers.remove(receiver)
+
+    def send(self, *tags, **info):
+        with self._lock:
+            receivers = list(self._receivers)
+        for receiver in receivers:
+            # Упавший подписчик не должен ломать запись в базу и других подписчиков
+            try:
+                receiver(*tags, **info)
+            except Exception as e:
+                print(f"⚠️ Ошибка подписчика {getattr(receiver, '__qualname__', receiver)}: {e}")
+
+
+catalogue_cache = SnapshotCache()
+
+# Каталог изменился: теги - затронутые таблицы ('promocodes', 'channels'),
+# в info - reason (add, delete, import, expire, ...) и подробности
+catalogue_changed = Signal()
+
+
+@catalogue_changed.connect
+def _invalidate_snapshots(*tags, **info):
+    catalogue_cache.invalidate(*tags)
+
+
+def cached(*tags, expires=None):
+    """Декоратор: результат функции без аргументов хранится в catalogue_cache.
+
+    func.peek() отдаёт готовый снимок или None, не вызывая функцию.
+    """
+    def decorator(func):
+        key = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper():
+            return catalogue_cache.get(tags, key, func, expires)
+        wrapper.peek = lambda: catalogue_cache.peek(key)
+        return wrapper
+    return decorator
@@ -0,0 +1,164 @@
+"""Снимок каталога для мини-аппы и синхронизация по версиям.
+
+Каждое изменение промокода дописывается в журнал catalogue_changes
+(триггеры миграции 10), номер последней записи - версия каталога.
+Клиент хранит снимок с его версией и дальше спрашивает только изменения
+с неё: промокоды, упомянутые в журнале позже, - активные приходят
+целиком, удалённые и снятые с выдачи - в removed. Если нужная часть
+журнала уже удалена, изменений слишком много или версия клиента из
+другой базы, отдаётся полный снимок.
+
+Строки снимка - списки значений в порядке FIELDS, чтобы не повторять
+имена полей в каждой строке. Кодов промокодов в снимке нет: он публичный
+(и лежит на GitHub Pages), а коды выдаёт API после проверки подписки.
+
+Статический снимок для GitHub Pages (промокоды - из database/catalogue.csv,
+см. .github/workflows/deploy.yml; сроки в нём нужно обновлять, иначе
+после последнего expires_at сборка падает):
+    python -m database.bulk import database/catalogue.csv
+    python -m database.catalogue build webapp
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database import db
+
+FIELDS = ('id', 'store', 'description', 'expires_at', 'category', 'channel')
+# На сколько версий назад хранить журнал: клиент, отставший сильнее,
+# получает полный снимок
+CATALOGUE_DELTA_VERSIONS = int(os.getenv('CATALOGUE_DELTA_VERSIONS', '100000'))
+# Больше изменённых промокодов - дешевле отдать полный снимок
+MAX_DELTA_PROMOCODES = int(os.getenv('MAX_DELTA_PROMOCODES', '2000'))
+STATIC_NAME = 'catalogue.json'
+
+# Первая и последняя запись журнала: два поиска по первичному ключу
+# (MIN и MAX в одном SELECT SQLite выполнил бы полным проходом)
+CATALOGUE_VERSIONS_SQL = '''
+    SELECT (SELECT MIN(version) FROM catalogue_changes) AS first,
+           (SELECT MAX(version) FROM catalogue_changes) AS last
+'''
+SNAPSHOT_SQL = f'''
+    SELECT {', '.join(FIELDS)} FROM promocodes
+    WHERE is_active = 1 AND {db.NOT_EXPIRED_CONDITION}
+    ORDER BY created_at DESC, id DESC
+'''
+CHANGED_IDS_SQL = 'SELECT promo_id FROM catalogue_changes WHERE version > ?'
+# Просроченный, но ещё не снятый сборщиком - уже не активный
+PROMOCODE_SQL = f'''
+    SELECT {', '.join(FIELDS)}, is_active AND {db.NOT_EXPIRED_CONDITION} AS is_active
+    FROM promocodes WHERE id = ?
+'''
+PRUNE_CHANGES_SQL = 'DELETE FROM catalogue_changes WHERE version <= ?'
+
+
+def _versions(conn):
+    """(первая, последняя) версии в журнале; пустой журнал - (0, 0)"""
+    row = conn.execute(CATALOGUE_VERSIONS_SQL).fetchone()
+    return row['first'] or 0, row['last'] or 0
+
+
+def _channels(conn):
+    return [row['username'] for row in conn.execute(db.REQUIRED_CHANNELS_SQL)]
+
+
+def _result(version, full, rows, removed, channels):
+    return {
+        'version': version,
+        'full': full,
+        'fields': FIELDS,
+        'promocodes': [list(row[:len(FIELDS)]) for row in rows],
+        'removed': removed,
+        'channels': channels,
+    }
+
+
+def current_version():
+    with db.get_connection() as conn:
+        return _versions(conn)[1]
+
+
+def snapshot():
+    """Полный снимок активных промокодов"""
+    with db.get_connection() as conn:
+        # Версия и строки из одного снимка базы (WAL): между запросами
+        # другой процесс может успеть записать
+        conn.execute("BEGIN")
+        version = _versions(conn)[1]
+        rows = conn.execute(SNAPSHOT_SQL).fetchall()
+        return _result(version, True, rows, [], _channels(conn))
+
+
+def changes(since_version):
+    """Изменения после since_version; None - клиенту нужен полный снимок"""
+    with db.get_connection() as conn:
+        conn.execute("BEGIN")
+        first, version = _versions(conn)
+        # Записи между since_version и first могли быть удалены
+        if since_version < first - 1 or since_version > version:
+            return None
+        promo_ids = {row['promo_id'] for row in conn.execute(CHANGED_IDS_SQL, (since_version,))}
+        if len(promo_ids) > MAX_DELTA_PROMOCODES:
+            return None
+        active, removed = [], []
+        for promo_id in sorted(promo_ids):
+            promo = conn.execute(PROMOCODE_SQL, (promo_id,)).fetchone()
+            if promo is not None and promo['is_active']:
+                active.append(promo)
+            else:
+                removed.append(promo_id)
+        return _result(version, False, active, removed, _channels(conn))
+
+
+def prune_changes(keep_versions=CATALOGUE_DELTA_VERSIONS):
+    """Удаляем из журнала записи старше keep_versions версий, возвращаем их число"""
+    with db.get_connection() as conn:
+        cutoff = _versions(conn)[1] - max(keep_versions, 1)
+        if cutoff <= 0:
+            return 0
+        return conn.execute(PRUNE_CHANGES_SQL, (cutoff,)).rowcount
+
+
+def build_static(out_dir):
+    """Пишем catalogue.json и catalogue.json.gz, возвращаем (снимок, размер, размер в gzip).
+
+    Пустой снимок - ValueError: мини-аппа на GitHub Pages показала бы пустой
+    каталог, а старый файл на месте лучше
+    """
+    data = snapshot()
+    if not data['promocodes']:
+        raise ValueError("В базе нет активных промокодов (все просрочены?), снимок не записан")
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+    packed = gzip.compress(body, compresslevel=9, mtime=0)
+    path = os.path.join(out_dir, STATIC_NAME)
+    # Через временный файл: сервер не отдаст наполовину записанный снимок
+    for target, content in ((path, body), (path + '.gz', packed)):
+        with open(target + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(target + '.tmp', target)
+    return data, len(body), len(packed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Снимок каталога для мини-аппы")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="статический снимок для GitHub Pages")
+    build.add_argument('out_dir', nargs='?', default=os.path.join(os.path.dirname(__file__), '..', 'webapp'))
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    try:
+        data, size, packed = build_static(args.out_dir)
+    except ValueError as e:
+        feed = os.path.relpath(db.CATALOGUE_FEED)
+        sys.exit(f"❌ {e}\n   Обнови сроки (expires_at) в {feed}: статический каталог собирается из него")
+    print(f"✅ {os.path.join(args.out_dir, STATIC_NAME)}: версия {data['version']}, "
+          f"промокодов {len(data['promocodes'])}, {size} Б (gzip {packed} Б)")
+
+
+if __name__ == '__main__':
+    main()
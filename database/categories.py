@@ -0,0 +1,36 @@
+# Категории мини-аппы (webapp/index.html, categoryNames)
+CATEGORIES = {
+    'yamarket': 'Яндекс.Маркет',
+    'ozon': 'OZON',
+    'wb': 'Wildberries',
+    'aliexpress': 'Aliexpress',
+    'food': 'Еда',
+    'auto': 'Авто',
+    'travel': 'Отдых',
+    'contests': 'Розыгрыши',
+    'other': 'Всякое',
+}
+
+DEFAULT_CATEGORY = 'other'
+
+# Категория по названию магазина (в нижнем регистре), если её не указали явно
+STORE_CATEGORIES = {
+    'яндекс.маркет': 'yamarket',
+    'ozon': 'ozon',
+    'wildberries': 'wb',
+    'aliexpress': 'aliexpress',
+    'kfc': 'food',
+    'burger king': 'food',
+    "mcdonald's": 'food',
+    'додо пицца': 'food',
+    'subway': 'food',
+    'starbucks': 'food',
+    'autoru': 'auto',
+    'booking.com': 'travel',
+    'aviasales': 'travel',
+    'ostrovok': 'travel',
+}
+
+
+def guess_category(store):
+    return STORE_CATEGORIES.get((store or '').strip().lower(), DEFAULT_CATEGORY)
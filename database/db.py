@@ -1,117 +1,389 @@
-import sqlite3
+import argparse
+import base64
+import csv
 import os
-from datetime import datetime
+import sys
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'promo_bot.db')
+# Для запуска как скрипта: python database/db.py seed
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database import migrations
+from database.assignment import PromoAssignment
+from database.categories import guess_category
+from database.cache import cached, catalogue_cache, catalogue_changed, earliest_expiry
+from database.pool import get_pool
+from database.versions import VersionWatcher
+
+DB_PATH = os.getenv('DB_PATH', os.path.join(os.path.dirname(__file__), 'promo_bot.db'))
+# Каталог мини-аппы в формате database.bulk: тестовые данные (seed) и
+# статический снимок для GitHub Pages
+CATALOGUE_FEED = os.path.join(os.path.dirname(__file__), 'catalogue.csv')
+# Снимки каталога сбрасываются и при записях из других процессов
+version_watcher = VersionWatcher(DB_PATH)
+catalogue_cache.before_read = version_watcher.check
+
+# Запросы держим константами: одинаковый текст SQL позволяет sqlite3
+# переиспользовать подготовленные выражения долгоживущего соединения.
+# Активность - флаг is_active, просроченные снимает database.expiry. Срок
+# проверяется и на чтении: до прохода сборщика (а без бота его может и не
+# быть) просроченный промокод не выдаётся, и срок снимка в кэше не в прошлом.
+# Условие проверяется по строкам, уже найденным по индексу is_active
+NOT_EXPIRED_CONDITION = "(expires_at IS NULL OR expires_at > DATE('now'))"
+ACTIVE_PROMOCODES_SQL = f'''
+    SELECT * FROM promocodes
+    WHERE is_active = TRUE AND {NOT_EXPIRED_CONDITION}
+    ORDER BY created_at DESC, id DESC
+'''
+REQUIRED_CHANNELS_SQL = 'SELECT * FROM channels WHERE is_required = TRUE'
+ACTIVE_PROMOCODE_IDS_SQL = f'''
+    SELECT id, expires_at FROM promocodes
+    WHERE is_active = TRUE AND {NOT_EXPIRED_CONDITION}
+'''
+PROMOCODE_BY_ID_SQL = 'SELECT * FROM promocodes WHERE id = ?'
+INSERT_PROMOCODE_SQL = '''
+    INSERT INTO promocodes (store, code, description, expires_at, is_active, category, channel)
+    VALUES (?, ?, ?, ?, 1, ?, ?)
+'''
+DELETE_PROMOCODE_SQL = 'DELETE FROM promocodes WHERE id = ?'
+INSERT_CHANNEL_SQL = '''
+    INSERT INTO channels (name, username, is_required)
+    VALUES (?, ?, 1)
+'''
+DELETE_CHANNEL_SQL = 'DELETE FROM channels WHERE id = ?'
+COUNT_CHANNELS_SQL = 'SELECT COUNT(*) FROM channels'
+# Статистика из счётчиков, которые ведут триггеры (миграция 7)
+PROMO_TOTALS_SQL = 'SELECT total, active FROM promo_totals WHERE id = 1'
+# Магазинов немного: сортируем в Python, а не временным B-деревом
+STORE_COUNTS_SQL = 'SELECT store, active AS count FROM promo_store_counts WHERE active > 0'
+PROMO_HISTORY_SQL = '''
+    SELECT * FROM promo_stats_history
+    WHERE day > DATE('now', ?)
+    ORDER BY day DESC
+'''
+
+# Постраничная выдача активных промокодов: условия добавляются к базовому
+# запросу, курсор - (created_at, id) последней строки предыдущей страницы
+PAGE_SQL = f'''
+    SELECT * FROM promocodes
+    WHERE is_active = 1 AND {NOT_EXPIRED_CONDITION}{{filters}}
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+'''
+PAGE_FILTERS = {
+    'category': 'category = ?',
+    'store': 'store = ?',
+    'cursor': '(created_at, id) < (?, ?)',
+}
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+UPSERT_USER_SQL = '''
+    INSERT INTO users (user_id, first_name, username) VALUES (?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        first_name = excluded.first_name,
+        username = excluded.username,
+        is_blocked = 0,
+        last_seen_at = CURRENT_TIMESTAMP
+'''
+COUNT_USERS_SQL = 'SELECT COUNT(*) FROM users WHERE is_blocked = 0'
+BLOCK_USER_SQL = 'UPDATE users SET is_blocked = 1 WHERE user_id = ?'
+BROADCAST_RECIPIENTS_SQL = '''
+    SELECT user_id FROM users
+    WHERE is_blocked = 0 AND user_id > ?
+    ORDER BY user_id
+    LIMIT ?
+'''
+INSERT_BROADCAST_SQL = '''
+    INSERT OR IGNORE INTO broadcasts (dedup_key, text, total) VALUES (?, ?, ?)
+'''
+BROADCAST_BY_KEY_SQL = 'SELECT * FROM broadcasts WHERE dedup_key = ?'
+BROADCAST_BY_ID_SQL = 'SELECT * FROM broadcasts WHERE id = ?'
+RUNNING_BROADCASTS_SQL = "SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id"
+ADVANCE_BROADCAST_SQL = 'UPDATE broadcasts SET last_user_id = ? WHERE id = ?'
+COUNT_BROADCAST_SQL = '''
+    UPDATE broadcasts SET sent = sent + ?, failed = failed + ?, blocked = blocked + ?
+    WHERE id = ?
+'''
+SET_BROADCAST_STATUS_SQL = '''
+    UPDATE broadcasts SET status = ?,
+        finished_at = CASE WHEN ? = 'running' THEN NULL ELSE CURRENT_TIMESTAMP END
+    WHERE id = ?
+'''
+
+def get_connection():
+    """Соединение из общего пула (использовать через with)"""
+    return get_pool(DB_PATH).connection()
 
 def init_db():
-    """Создаём таблицы в базе данных"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Таблица промокодов
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS promocodes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            store TEXT NOT NULL,
-            code TEXT NOT NULL,
-            description TEXT,
-            expires_at DATE,
-            is_active BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Таблица каналов для подписки
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS channels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            username TEXT NOT NULL UNIQUE,
-            is_required BOOLEAN DEFAULT TRUE
-        )
-    ''')
+    """Создаём или обновляем схему базы (миграции по PRAGMA user_version)"""
+    with get_connection() as conn:
+        applied = migrations.migrate(conn)
+        version = migrations.get_version(conn)
     
-    conn.commit()
-    conn.close()
-    print("✅ База данных инициализирована")
+    if applied:
+        print(f"✅ База данных обновлена до версии {version} (миграции: {applied})")
+    else:
+        print(f"✅ База данных актуальна (версия {version})")
+    return applied
 
 def add_sample_data():
-    """Добавляем тестовые данные (20 промокодов)"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    """Добавляем тестовые данные (каталог мини-аппы из CATALOGUE_FEED). Стирает текущие промокоды и каналы!"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
     
-    # Очищаем старые данные
-    cursor.execute("DELETE FROM promocodes")
-    cursor.execute("DELETE FROM channels")
+        # Очищаем старые данные
+        cursor.execute("DELETE FROM promocodes")
+        cursor.execute("DELETE FROM channels")
     
-    # Добавляем тестовые каналы
-    channels = [
-        ("Выгодные предложения", "promo_channel_1", True),
-        ("Промокоды дня", "promo_channel_2", True),
-        ("Скидки и акции", "promo_channel_3", True)
-    ]
+        # Добавляем тестовые каналы: первые три обязательны для всего каталога,
+        # остальные открывают промокоды своих категорий
+        channels = [
+            ("Выгодные предложения", "promo_channel_1", True),
+            ("Промокоды дня", "promo_channel_2", True),
+            ("Скидки и акции", "promo_channel_3", True),
+            ("Авто и мото", "promo_channel_4", False),
+            ("Путешествия", "promo_channel_5", False),
+            ("Розыгрыши", "promo_channel_6", False)
+        ]
     
-    cursor.executemany('''
-        INSERT INTO channels (name, username, is_required)
-        VALUES (?, ?, ?)
-    ''', channels)
+        cursor.executemany('''
+            INSERT INTO channels (name, username, is_required)
+            VALUES (?, ?, ?)
+        ''', channels)
     
-    # Добавляем 20 тестовых промокодов
-    promocodes = [
-        ("Wildberries", "WBNEW25", "Скидка 25% на первый заказ", "2026-01-31"),
-    ("Ozon", "OZONFRESH10", "10% на товары для дома", "2025-12-20"),
-    ("AliExpress", "ALIWOW5", "5% скидка на всё", "2026-02-15"),
-    ("Lamoda", "STYLE20", "20% на одежду и обувь", "2025-11-30"),
-    ("Яндекс.Маркет", "MARKET300", "−300₽ при заказе от 2000₽", "2025-12-31"),
-    ("СберМегаМаркет", "SBERFEST", "15% скидка на электронику", "2026-01-10"),
-    ("KFC", "CRISPY50", "50% на второе комбо", "2025-10-30"),
-    ("Burger King", "BKFREE", "Бесплатный напиток при заказе бургера", "2025-12-01"),
-    ("McDonald's", "MCBONUS", "Бесплатный десерт к завтраку", "2025-11-10"),
-    ("Пятёрочка", "PYATA5", "5% на продукты недели", "2025-10-25"),
-    ("Лента", "LENTA200", "200₽ при покупке от 1500₽", "2026-01-15"),
-    ("Магнит", "MAGNIT2025", "−10% на бакалею", "2025-12-05"),
-    ("Додо Пицца", "DODO2025", "−25% на большую пиццу", "2025-11-15"),
-    ("Subway", "EATFRESH", "2 по цене 1", "2025-12-31"),
-    ("Starbucks", "COFFEELOVE", "Бесплатный допинг к любому кофе", "2025-11-20"),
-    ("Adidas", "SPORT25", "25% скидка на новые коллекции", "2026-03-01"),
-    ("Nike", "JUSTDO10", "10% на всё", "2025-12-10"),
-    ("Reebok", "FITNESS15", "15% на спортивную обувь", "2025-12-25"),
-    ("Rive Gauche", "BEAUTY20", "20% на косметику", "2025-11-30"),
-    ("Л’Этуаль", "PARFUM25", "25% на ароматы", "2025-12-31")
-    ]
+        # Промокоды - из database/catalogue.csv, того же каталога, что
+        # публикуется на GitHub Pages
+        with open(CATALOGUE_FEED, encoding='utf-8', newline='') as f:
+            promocodes = [(row['store'], row['code'], row['description'], row['expires_at'],
+                           row['channel'], row['category']) for row in csv.DictReader(f)]
     
-    cursor.executemany('''
-        INSERT INTO promocodes (store, code, description, expires_at, is_active)
-        VALUES (?, ?, ?, ?, 1)
-    ''', promocodes)
+        cursor.executemany('''
+            INSERT INTO promocodes (store, code, description, expires_at, is_active, channel, category)
+            VALUES (?, ?, ?, ?, 1, ?, ?)
+        ''', promocodes)
     
-    conn.commit()
-    conn.close()
-    print("✅ Тестовые данные добавлены (20 промокодов)")
+    catalogue_changed.send('promocodes', 'channels', reason='seed')
+    print(f"✅ Тестовые данные добавлены ({len(promocodes)} промокода)")
 
+@cached('promocodes', expires=earliest_expiry)
 def get_active_promocodes():
-    """Получаем активные промокоды"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM promocodes 
-        WHERE is_active = TRUE AND (expires_at IS NULL OR expires_at > DATE('now'))
-        ORDER BY created_at DESC
-    ''')
-    promocodes = cursor.fetchall()
-    conn.close()
-    return promocodes
+    """Получаем активные промокоды (снимок из кэша, список не изменять)"""
+    with get_connection() as conn:
+        return conn.execute(ACTIVE_PROMOCODES_SQL).fetchall()
+
+@cached('promocodes', expires=lambda index: index.expires_at)
+def get_assignment_index():
+    """Таблица закрепления промокодов за пользователями (из кэша)"""
+    with get_connection() as conn:
+        rows = conn.execute(ACTIVE_PROMOCODE_IDS_SQL).fetchall()
+    return PromoAssignment([row['id'] for row in rows], expires_at=earliest_expiry(rows))
+
+def get_user_promocode(user_id):
+    """Персональный промокод пользователя: один запрос по первичному ключу"""
+    for _ in range(2):
+        promo_id = get_assignment_index().lookup(user_id)
+        if promo_id is None:
+            return None
+        with get_connection() as conn:
+            promo = conn.execute(PROMOCODE_BY_ID_SQL, (promo_id,)).fetchone()
+        if promo is not None:
+            return promo
+        # Промокод удалили в другом процессе - перестраиваем таблицу
+        catalogue_cache.invalidate('promocodes')
+    return None
 
+def encode_cursor(promo):
+    """Курсор следующей страницы по последней строке текущей"""
+    raw = f"{promo['created_at']}|{promo['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(created_at, id) из курсора; ValueError, если курсор испорчен"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, promo_id = raw.rsplit('|', 1)
+        return created_at, int(promo_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Неверный курсор: {cursor}") from e
+
+def build_page_query(category=None, store=None, cursor=None, limit=PAGE_SIZE):
+    """SQL и параметры для страницы активных промокодов"""
+    filters = []
+    params = []
+    if category:
+        filters.append(PAGE_FILTERS['category'])
+        params.append(category)
+    if store:
+        filters.append(PAGE_FILTERS['store'])
+        params.append(store)
+    if cursor:
+        filters.append(PAGE_FILTERS['cursor'])
+        params.extend(decode_cursor(cursor))
+    sql = PAGE_SQL.format(filters=''.join(f" AND {f}" for f in filters))
+    return sql, params + [limit]
+
+def get_promocodes_page(category=None, store=None, cursor=None, limit=PAGE_SIZE):
+    """Страница активных промокодов и курсор следующей (None - страниц больше нет)"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+    sql, params = build_page_query(category, store, cursor, limit + 1)
+    with get_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def audit_queries():
+    """Варианты динамических запросов для database.query_audit"""
+    return {
+        f"PAGE_SQL[{name}]": build_page_query(**kwargs)[0]
+        for name, kwargs in {
+            'all': {},
+            'category': {'category': 'food'},
+            'store': {'store': 'Ozon'},
+            'category+cursor': {'category': 'food', 'cursor': encode_cursor({'created_at': '2025-01-01', 'id': 1})},
+            'store+cursor': {'store': 'Ozon', 'cursor': encode_cursor({'created_at': '2025-01-01', 'id': 1})},
+        }.items()
+    }
+
+@cached('channels')
 def get_required_channels():
-    """Получаем обязательные каналы для подписки"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM channels WHERE is_required = TRUE')
-    channels = cursor.fetchall()
-    conn.close()
-    return channels
-
-# Инициализируем базу при импорте
-init_db()
-add_sample_data()
\ No newline at end of file
+    """Получаем обязательные каналы для подписки (снимок из кэша)"""
+    with get_connection() as conn:
+        return conn.execute(REQUIRED_CHANNELS_SQL).fetchall()
+
+def add_promocode(store, code, description, expires_at, category=None, channel=None):
+    """Добавляем промокод (категория по умолчанию - по названию магазина), возвращаем id"""
+    category = category or guess_category(store)
+    with get_connection() as conn:
+        promo_id = conn.execute(
+            INSERT_PROMOCODE_SQL, (store, code, description, expires_at, category, channel)
+        ).lastrowid
+    catalogue_changed.send('promocodes', reason='add', promo_id=promo_id)
+    return promo_id
+
+def delete_promocode(promo_id):
+    """Удаляем промокод, возвращаем число удалённых строк"""
+    with get_connection() as conn:
+        deleted = conn.execute(DELETE_PROMOCODE_SQL, (promo_id,)).rowcount
+    if deleted:
+        catalogue_changed.send('promocodes', reason='delete', promo_id=promo_id)
+    return deleted
+
+def add_channel(name, username):
+    """Добавляем канал"""
+    with get_connection() as conn:
+        conn.execute(INSERT_CHANNEL_SQL, (name, username))
+    catalogue_changed.send('channels', reason='add')
+
+def delete_channel(channel_id):
+    """Удаляем канал, возвращаем число удалённых строк"""
+    with get_connection() as conn:
+        deleted = conn.execute(DELETE_CHANNEL_SQL, (channel_id,)).rowcount
+    if deleted:
+        catalogue_changed.send('channels', reason='delete')
+    return deleted
+
+def upsert_user(user_id, first_name=None, username=None):
+    """Запоминаем пользователя (при каждом /start; вернувшийся снова получает рассылки)"""
+    with get_connection() as conn:
+        conn.execute(UPSERT_USER_SQL, (user_id, first_name, username))
+
+def count_users():
+    """Пользователей, которым можно писать"""
+    with get_connection() as conn:
+        return conn.execute(COUNT_USERS_SQL).fetchone()[0]
+
+def create_broadcast(dedup_key, text):
+    """Создаём рассылку; с тем же dedup_key возвращается уже существующая.
+
+    Возвращаем (строка рассылки, создана ли она сейчас).
+    """
+    with get_connection() as conn:
+        total = conn.execute(COUNT_USERS_SQL).fetchone()[0]
+        created = conn.execute(INSERT_BROADCAST_SQL, (dedup_key, text, total)).rowcount > 0
+        return conn.execute(BROADCAST_BY_KEY_SQL, (dedup_key,)).fetchone(), created
+
+def get_broadcast(broadcast_id):
+    with get_connection() as conn:
+        return conn.execute(BROADCAST_BY_ID_SQL, (broadcast_id,)).fetchone()
+
+def get_running_broadcasts():
+    """Незавершённые рассылки (для продолжения после перезапуска)"""
+    with get_connection() as conn:
+        return conn.execute(RUNNING_BROADCASTS_SQL).fetchall()
+
+def claim_broadcast_batch(broadcast_id, limit):
+    """Следующая пачка получателей; отметка прогресса сдвигается сразу.
+
+    Сдвиг до отправки означает «не больше одного раза»: если бот упадёт
+    посреди пачки, после перезапуска её получатели будут пропущены, а не
+    получат сообщение повторно.
+    """
+    with get_connection() as conn:
+        last_user_id = conn.execute(BROADCAST_BY_ID_SQL, (broadcast_id,)).fetchone()['last_user_id']
+        user_ids = [row[0] for row in conn.execute(BROADCAST_RECIPIENTS_SQL, (last_user_id, limit))]
+        if user_ids:
+            conn.execute(ADVANCE_BROADCAST_SQL, (user_ids[-1], broadcast_id))
+    return user_ids
+
+def record_broadcast_batch(broadcast_id, sent, failed, blocked_user_ids):
+    """Итоги пачки; заблокировавшие бота больше не получают рассылок"""
+    with get_connection() as conn:
+        conn.execute(COUNT_BROADCAST_SQL, (sent, failed, len(blocked_user_ids), broadcast_id))
+        conn.executemany(BLOCK_USER_SQL, [(user_id,) for user_id in blocked_user_ids])
+
+def set_broadcast_status(broadcast_id, status):
+    """running, done или cancelled"""
+    with get_connection() as conn:
+        return conn.execute(SET_BROADCAST_STATUS_SQL, (status, status, broadcast_id)).rowcount
+
+def get_promo_totals():
+    """(всего, активных) - одна строка счётчиков"""
+    with get_connection() as conn:
+        row = conn.execute(PROMO_TOTALS_SQL).fetchone()
+    return (row['total'], row['active']) if row else (0, 0)
+
+def count_channels():
+    with get_connection() as conn:
+        return conn.execute(COUNT_CHANNELS_SQL).fetchone()[0]
+
+def get_promo_stats():
+    """Статистика промокодов: всего, активных, снятых с выдачи и по магазинам"""
+    total, active = get_promo_totals()
+    with get_connection() as conn:
+        by_store = conn.execute(STORE_COUNTS_SQL).fetchall()
+    by_store.sort(key=lambda row: (-row['count'], row['store']))
+    return total, active, total - active, by_store
+
+def get_promo_history(days=7):
+    """Строки истории за последние days дней, новые первыми"""
+    with get_connection() as conn:
+        return conn.execute(PROMO_HISTORY_SQL, (f'-{int(days)} days',)).fetchall()
+
+def show_status():
+    """Печатаем версию схемы и число строк"""
+    with get_connection() as conn:
+        version = migrations.get_version(conn)
+        print(f"📁 База: {DB_PATH}")
+        print(f"🔢 Версия схемы: {version} (последняя: {migrations.LATEST_VERSION})")
+        if version:
+            promocodes = conn.execute("SELECT COUNT(*) FROM promocodes").fetchone()[0]
+            channels = conn.execute("SELECT COUNT(*) FROM channels").fetchone()[0]
+            print(f"🎁 Промокодов: {promocodes}, 📢 каналов: {channels}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Управление базой промокодов")
+    parser.add_argument('command', choices=['migrate', 'seed', 'status'],
+                        help="migrate - обновить схему, seed - схема + тестовые данные, status - версия схемы")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'status':
+        show_status()
+        return
+    
+    init_db()
+    if args.command == 'seed':
+        add_sample_data()
+
+if __name__ == '__main__':
+    main()
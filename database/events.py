@@ -0,0 +1,238 @@
+"""События использования: показы, открытия и копирования промокодов, команды бота.
+
+record() только кладёт событие в кольцевой буфер в памяти и базу не
+ждёт, поэтому запрос API или обработчик бота не замедляется. Фоновый
+поток раз в EVENTS_FLUSH_INTERVAL секунд (или сразу, как набралась
+пачка) забирает до EVENTS_BATCH_SIZE событий и одной транзакцией пишет
+их в журнал events и суточные итоги event_daily. Если запись не
+успевает и буфер заполнен, вытесняются самые старые события - их число
+видно в stats()['dropped'].
+
+Отчёт по промокодам: python -m database.events [дней]
+"""
+import argparse
+import atexit
+import collections
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database import db
+
+# view - карточка показана, visit - переход в канал, reveal - код открыт,
+# copy - код скопирован, command - команда бота (detail - какая)
+EVENT_TYPES = ('view', 'visit', 'reveal', 'copy', 'command')
+PROMO_EVENT_TYPES = ('view', 'visit', 'reveal', 'copy')
+EVENTS_BUFFER_SIZE = int(os.getenv('EVENTS_BUFFER_SIZE', '100000'))
+EVENTS_BATCH_SIZE = int(os.getenv('EVENTS_BATCH_SIZE', '2000'))
+EVENTS_FLUSH_INTERVAL = float(os.getenv('EVENTS_FLUSH_INTERVAL', '1'))
+MAX_DETAIL_LENGTH = 64
+REPORT_DAYS = 7
+
+INSERT_EVENT_SQL = 'INSERT INTO events (ts, type, user_id, promo_id, detail) VALUES (?, ?, ?, ?, ?)'
+ADD_EVENT_DAILY_SQL = '''
+    INSERT INTO event_daily (day, type, promo_id, detail, count) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (day, type, promo_id, detail) DO UPDATE SET count = count + excluded.count
+'''
+EVENT_DAILY_SQL = '''
+    SELECT type, promo_id, detail, count FROM event_daily
+    WHERE day > DATE('now', ?)
+'''
+
+
+def _day(ts):
+    return time.strftime('%Y-%m-%d', time.gmtime(ts))
+
+
+def write_batch(batch):
+    """Пишем пачку событий (ts, type, user_id, promo_id, detail) одной транзакцией"""
+    daily = collections.Counter(
+        (_day(ts), event_type, promo_id or 0, detail or '')
+        for ts, event_type, _, promo_id, detail in batch
+    )
+    with db.get_connection() as conn:
+        conn.executemany(INSERT_EVENT_SQL, batch)
+        conn.executemany(ADD_EVENT_DAILY_SQL, [key + (count,) for key, count in daily.items()])
+
+
+class EventRecorder:
+    """Кольцевой буфер событий и поток, который сбрасывает его в базу"""
+
+    def __init__(self, capacity=EVENTS_BUFFER_SIZE, batch_size=EVENTS_BATCH_SIZE,
+                 flush_interval=EVENTS_FLUSH_INTERVAL, writer=write_batch):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.writer = writer
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._buffer = collections.deque()
+        self._thread = None
+        self._closed = False
+
+    def record(self, event_type, user_id=None, promo_id=None, detail=None, ts=None):
+        """Кладём событие в буфер (без ввода-вывода)"""
+        if self._pid != os.getpid():
+            # События и поток родительского процесса нам не принадлежат
+            self._reset()
+        event = (ts or time.time(), event_type, user_id, promo_id, detail)
+        with self._lock:
+            if len(self._buffer) >= self.capacity:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(event)
+            self.recorded += 1
+            depth = len(self._buffer)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='events', daemon=True)
+                self._thread.start()
+        if depth >= self.batch_size:
+            self._wakeup.set()
+
+    def _take(self):
+        with self._lock:
+            count = min(len(self._buffer), self.batch_size)
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def flush(self):
+        """Пишем всё, что накопилось; возвращаем число записанных событий"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return written
+                started = time.perf_counter()
+                try:
+                    self.writer(batch)
+                except Exception as e:
+                    # Пачку не возвращаем: повторная запись могла бы задвоить итоги
+                    self.errors += 1
+                    self.dropped += len(batch)
+                    print(f"❌ Не удалось записать события ({len(batch)} шт.): {e}")
+                    return written
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+                self.batches += 1
+                self.written += len(batch)
+                written += len(batch)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Останавливаем поток и дописываем остаток (при завершении процесса)"""
+        if self._pid != os.getpid():
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        return {
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'written': self.written,
+            'batches': self.batches,
+            'errors': self.errors,
+            'pending': len(self._buffer),
+            'last_flush_ms': self.last_flush_ms,
+        }
+
+
+recorder = EventRecorder()
+atexit.register(recorder.close)
+
+
+def record(event_type, user_id=None, promo_id=None, detail=None):
+    """Записать событие; неизвестный тип - ValueError"""
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Неизвестный тип события {event_type!r}")
+    if event_type in PROMO_EVENT_TYPES and not promo_id:
+        raise ValueError(f"Для события {event_type!r} нужен promo_id")
+    if detail is not None:
+        detail = str(detail)[:MAX_DETAIL_LENGTH]
+    recorder.record(event_type, user_id, promo_id, detail)
+
+
+def stats():
+    return recorder.stats()
+
+
+def _daily_rows(days):
+    with db.get_connection() as conn:
+        return conn.execute(EVENT_DAILY_SQL, (f'-{int(days)} days',)).fetchall()
+
+
+def promo_click_through(days=REPORT_DAYS, limit=None):
+    """Воронка по промокодам за days дней, по убыванию показов.
+
+    Строки: promo_id, store, code, view, visit, reveal, copy,
+    reveal_rate (открыли / показали), copy_rate (скопировали / открыли).
+    """
+    funnel = collections.defaultdict(lambda: dict.fromkeys(PROMO_EVENT_TYPES, 0))
+    for row in _daily_rows(days):
+        if row['promo_id'] and row['type'] in PROMO_EVENT_TYPES:
+            funnel[row['promo_id']][row['type']] += row['count']
+
+    ranked = sorted(funnel.items(), key=lambda item: (-item[1]['view'], item[0]))[:limit]
+    result = []
+    with db.get_connection() as conn:
+        for promo_id, counts in ranked:
+            promo = conn.execute(db.PROMOCODE_BY_ID_SQL, (promo_id,)).fetchone()
+            result.append({
+                'promo_id': promo_id,
+                'store': promo['store'] if promo else None,
+                'code': promo['code'] if promo else None,
+                **counts,
+                'reveal_rate': counts['reveal'] / counts['view'] if counts['view'] else 0.0,
+                'copy_rate': counts['copy'] / counts['reveal'] if counts['reveal'] else 0.0,
+            })
+    return result
+
+
+def command_counts(days=REPORT_DAYS):
+    """{команда: сколько раз} за days дней"""
+    counts = collections.Counter()
+    for row in _daily_rows(days):
+        if row['type'] == 'command':
+            counts[row['detail']] += row['count']
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отчёт по событиям")
+    parser.add_argument('days', nargs='?', type=int, default=REPORT_DAYS)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"📈 Промокоды за {args.days} дн.: показы / переходы / открытия / копирования")
+    for row in promo_click_through(args.days, args.limit):
+        print(f"   #{row['promo_id']} {row['store'] or '?'} {row['code'] or ''}: "
+              f"{row['view']} / {row['visit']} / {row['reveal']} / {row['copy']} "
+              f"(открыли {row['reveal_rate']:.0%}, скопировали {row['copy_rate']:.0%})")
+    print("🤖 Команды:")
+    for command, count in command_counts(args.days).most_common():
+        print(f"   {command}: {count}")
+
+
+if __name__ == '__main__':
+    main()
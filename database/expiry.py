@@ -0,0 +1,90 @@
+"""Снятие просроченных промокодов с выдачи.
+
+Активный промокод - это is_active = 1 и срок не истёк: чтение проверяет
+срок само, а сборщик держит в порядке флаг (по нему ведутся счётчики и
+журнал каталога). sweep_expired() снимает флаг у промокодов, чей срок
+истёк, пачками по EXPIRY_SWEEP_BATCH_SIZE строк, каждая пачка - отдельная
+короткая транзакция, чтобы не держать блокировку записи. Если что-то снято,
+посылается сигнал catalogue_changed (reason='expire').
+
+В боте sweep_expired запускается из JobQueue раз в EXPIRY_SWEEP_INTERVAL
+секунд. Без бота (например, только API) - по cron:
+    python -m database.expiry
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database import db
+from database.cache import catalogue_changed
+
+EXPIRY_SWEEP_INTERVAL = float(os.getenv('EXPIRY_SWEEP_INTERVAL', '60'))
+EXPIRY_SWEEP_BATCH_SIZE = int(os.getenv('EXPIRY_SWEEP_BATCH_SIZE', '500'))
+
+# Промокод действует по день expires_at включительно (до полуночи UTC).
+# Индекс указан явно: без статистики планировщик выбирает
+# idx_promocodes_active_created и перебирает все активные промокоды
+EXPIRE_PROMOCODES_BATCH_SQL = '''
+    UPDATE promocodes SET is_active = 0
+    WHERE id IN (
+        SELECT id FROM promocodes INDEXED BY idx_promocodes_active_expires
+        WHERE is_active = 1 AND expires_at <= DATE('now')
+        LIMIT ?
+    )
+'''
+
+sweep_stats = {
+    'sweeps': 0,
+    'rows_moved': 0,
+    'last_rows': 0,
+    'last_duration_ms': 0.0,
+    'max_duration_ms': 0.0,
+    'last_run': None,
+}
+
+
+def expire_batch(batch_size=EXPIRY_SWEEP_BATCH_SIZE):
+    """Снимаем с выдачи до batch_size просроченных, возвращаем сколько сняли"""
+    with db.get_connection() as conn:
+        return conn.execute(EXPIRE_PROMOCODES_BATCH_SQL, (batch_size,)).rowcount
+
+
+def sweep_expired(batch_size=EXPIRY_SWEEP_BATCH_SIZE):
+    """Снимаем с выдачи все просроченные промокоды, возвращаем их число"""
+    started = time.perf_counter()
+    moved = 0
+    while True:
+        count = expire_batch(batch_size)
+        moved += count
+        if count < batch_size:
+            break
+    duration_ms = (time.perf_counter() - started) * 1000
+
+    sweep_stats['sweeps'] += 1
+    sweep_stats['rows_moved'] += moved
+    sweep_stats['last_rows'] = moved
+    sweep_stats['last_duration_ms'] = duration_ms
+    sweep_stats['max_duration_ms'] = max(sweep_stats['max_duration_ms'], duration_ms)
+    sweep_stats['last_run'] = time.time()
+
+    if moved:
+        print(f"🧹 Сняты с выдачи просроченные промокоды: {moved} ({duration_ms:.0f} мс)")
+        catalogue_changed.send('promocodes', reason='expire', count=moved)
+    return moved
+
+
+def report():
+    """Метрики сборщика для /stats"""
+    return dict(sweep_stats)
+
+
+def main():
+    db.init_db()
+    moved = sweep_expired()
+    print(f"✅ Просроченных снято: {moved} ({sweep_stats['last_duration_ms']:.0f} мс)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Индекс префиксов для инлайн-режима (@бот запрос).
+
+Telegram присылает инлайн-запрос на каждое нажатие клавиши и ждёт ответ
+за несколько сотен миллисекунд, поэтому ответ не ходит в базу. Из
+активного каталога один раз строится отсортированный массив ключей -
+название магазина целиком, каждое его слово и код, в нижнем регистре и
+с «ё» → «е», - и параллельный массив id промокодов. Все ключи с
+префиксом лежат подряд: их диапазон находится двумя bisect.
+
+Индекс живёт в catalogue_cache (тег promocodes) и пересобирается при
+изменении каталога; при пересборке пропадает и LRU последних ответов,
+который хранится в самом индексе.
+"""
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from database import db
+from database.cache import cached, earliest_expiry
+
+# Больше Telegram в один ответ не примет
+INLINE_RESULTS_LIMIT = 50
+# Сколько последних запросов помнить: набор «w», «wi», «wil»... у многих
+# пользователей одинаковый
+INLINE_CACHE_SIZE = int(os.getenv('INLINE_CACHE_SIZE', '10000'))
+# Сколько ключей диапазона просматривать для запроса из нескольких слов,
+# прежде чем сдаться: короткий первый префикс может покрыть весь каталог
+MAX_INLINE_SCAN = 5000
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    return (text or '').lower().replace('ё', 'е')
+
+
+def promo_keys(promo):
+    """Ключи промокода: магазин целиком, слова магазина и код"""
+    store = normalize(promo['store'])
+    keys = {store, normalize(promo['code'])}
+    keys.update(WORD_RE.findall(store))
+    return keys
+
+
+class InlineIndex:
+    """Поиск активных промокодов по началу названия магазина или кода"""
+
+    def __init__(self, promocodes, cache_size=INLINE_CACHE_SIZE, expires_at=None):
+        # Промокоды уже по created_at DESC: при равных ключах новые первыми
+        self.promocodes = {promo['id']: promo for promo in promocodes}
+        self.recent = [promo['id'] for promo in promocodes[:INLINE_RESULTS_LIMIT]]
+        self.keys_by_id = {promo['id']: promo_keys(promo) for promo in promocodes}
+        order = {promo['id']: position for position, promo in enumerate(promocodes)}
+        pairs = sorted(
+            (key, order[promo_id], promo_id)
+            for promo_id, keys in self.keys_by_id.items() for key in keys
+        )
+        self.keys = [key for key, _, _ in pairs]
+        self.ids = [promo_id for _, _, promo_id in pairs]
+        # Момент (time.time()), после которого индекс надо перестроить
+        self.expires_at = expires_at
+        self.cache_size = cache_size
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.promocodes)
+
+    def _lookup(self, query, limit):
+        words = WORD_RE.findall(query)
+        if not words and not query:
+            return self.recent[:limit]
+        # Запрос целиком - префикс названия из нескольких слов («burger k»),
+        # иначе ищем по самому длинному слову, остальные проверяем по ключам
+        found = self._prefix_range(query, limit, ())
+        if found or not words:
+            return found
+        words.sort(key=len, reverse=True)
+        return self._prefix_range(words[0], limit, words[1:])
+
+    def _prefix_range(self, prefix, limit, other_words):
+        start = bisect_left(self.keys, prefix)
+        found = []
+        seen = set()
+        for position in range(start, min(len(self.keys), start + MAX_INLINE_SCAN)):
+            if not self.keys[position].startswith(prefix):
+                break
+            promo_id = self.ids[position]
+            if promo_id in seen:
+                continue
+            seen.add(promo_id)
+            keys = self.keys_by_id[promo_id]
+            if all(any(key.startswith(word) for key in keys) for word in other_words):
+                found.append(promo_id)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def search(self, query, limit=INLINE_RESULTS_LIMIT):
+        """Промокоды, у которых магазин, его слово или код начинаются с query.
+
+        Сначала точные и короткие совпадения (ключи по алфавиту), при равных -
+        новые. Пустой запрос - самые новые промокоды.
+        """
+        query = normalize(query).strip()
+        key = (query, limit)
+        with self._lock:
+            promo_ids = self._results.get(key)
+            if promo_ids is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+        if promo_ids is None:
+            promo_ids = self._lookup(query, limit)
+            with self._lock:
+                self.misses += 1
+                self._results[key] = promo_ids
+                if len(self._results) > self.cache_size:
+                    self._results.popitem(last=False)
+        return [self.promocodes[promo_id] for promo_id in promo_ids]
+
+
+@cached('promocodes', expires=lambda index: index.expires_at)
+def get_inline_index():
+    """Индекс активного каталога (из кэша, пересобирается при изменениях)"""
+    promocodes = db.get_active_promocodes()
+    return InlineIndex(promocodes, expires_at=earliest_expiry(promocodes))
+
+
+def search_inline(query, limit=INLINE_RESULTS_LIMIT):
+    return get_inline_index().search(query, limit)
@@ -0,0 +1,463 @@
+"""Версионированная схема базы.
+
+Номер применённой миграции хранится в PRAGMA user_version. Каждая
+миграция выполняется в своей транзакции вместе с обновлением версии,
+поэтому повторный запуск migrate() ничего не делает.
+"""
+from database.categories import DEFAULT_CATEGORY, guess_category
+
+
+def _create_tables(conn):
+    # Таблица промокодов
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS promocodes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            store TEXT NOT NULL,
+            code TEXT NOT NULL,
+            description TEXT,
+            expires_at DATE,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Таблица каналов для подписки
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS channels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            username TEXT NOT NULL UNIQUE,
+            is_required BOOLEAN DEFAULT TRUE
+        )
+    ''')
+
+
+def _add_promocode_indexes(conn):
+    # Активные промокоды по дате создания: фильтр по expires_at
+    # проверяется прямо в индексе, в таблицу ходим только за нужными строками
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_promocodes_active_created
+        ON promocodes (is_active, created_at, expires_at)
+    ''')
+    # Покрывающий индекс для подсчёта активных по магазинам
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_promocodes_active_store
+        ON promocodes (is_active, store)
+    ''')
+    # Просроченные промокоды
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_promocodes_expires
+        ON promocodes (expires_at)
+    ''')
+
+
+def _add_category(conn):
+    conn.execute(f"""
+        ALTER TABLE promocodes ADD COLUMN category TEXT NOT NULL DEFAULT '{DEFAULT_CATEGORY}'
+    """)
+    # lower() в SQLite не знает кириллицы - категории подбираем в Python
+    stores = [row[0] for row in conn.execute("SELECT DISTINCT store FROM promocodes")]
+    conn.executemany(
+        "UPDATE promocodes SET category = ? WHERE store = ?",
+        [(guess_category(store), store) for store in stores
+         if guess_category(store) != DEFAULT_CATEGORY],
+    )
+    # Постраничная выдача: ORDER BY created_at DESC, id DESC без сортировки,
+    # expires_at в индексе, чтобы фильтр сроков не ходил в таблицу
+    conn.execute("DROP INDEX IF EXISTS idx_promocodes_active_created")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_promocodes_active_created
+        ON promocodes (is_active, created_at, id, expires_at)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_promocodes_active_category
+        ON promocodes (is_active, category, created_at)
+    ''')
+    # Заменяет (is_active, store): годится и для подсчёта по магазинам
+    conn.execute("DROP INDEX IF EXISTS idx_promocodes_active_store")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_promocodes_active_store
+        ON promocodes (is_active, store, created_at)
+    ''')
+
+
+def _add_users_and_broadcasts(conn):
+    # Пользователи бота (заполняются из /start) для рассылок
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            username TEXT,
+            is_blocked BOOLEAN NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Получатели рассылок по порядку user_id без заблокировавших бота
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_blocked
+        ON users (is_blocked, user_id)
+    ''')
+    # Рассылки: last_user_id - докуда дошли (пользователи идут по user_id),
+    # dedup_key не даёт отправить одно и то же дважды
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dedup_key TEXT NOT NULL UNIQUE,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_broadcasts_status
+        ON broadcasts (status)
+    ''')
+
+
+def _add_promocode_unique_code(conn):
+    # Из повторов (магазин, код) остаётся один: активный раньше снятого,
+    # из них - добавленный последним
+    removed = conn.execute('''
+        DELETE FROM promocodes WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY store, code
+                    ORDER BY is_active DESC, created_at DESC, id DESC
+                ) AS position
+                FROM promocodes
+            ) WHERE position > 1
+        )
+    ''').rowcount
+    if removed:
+        print(f"🧹 Удалены повторы промокодов (магазин, код): {removed}")
+    # Ключ для загрузки фидов: повторная строка обновляет промокод, а не дублирует
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_promocodes_store_code
+        ON promocodes (store, code)
+    ''')
+
+
+def _add_expiry_index(conn):
+    # Сборщик просроченных ищет активные с истёкшим сроком: частичный индекс
+    # хранит только активные промокоды и не растёт с архивом
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_promocodes_active_expires
+        ON promocodes (expires_at) WHERE is_active = 1
+    ''')
+    # С этой версии активность - только флаг is_active: снимаем его
+    # у уже просроченных, чтобы чтение без проверки сроков сразу было верным
+    conn.execute('''
+        UPDATE promocodes SET is_active = 0
+        WHERE is_active = 1 AND expires_at <= DATE('now')
+    ''')
+
+
+def _add_promo_stats(conn):
+    # Счётчики вместо COUNT(*) по таблице: всего и активных - одна строка,
+    # по магазинам - строка на магазин, история - строка на день (UTC)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS promo_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total INTEGER NOT NULL DEFAULT 0,
+            active INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS promo_store_counts (
+            store TEXT PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            active INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    # added/deactivated/deleted - события за день, total/active - значения
+    # на момент последнего изменения в этот день
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS promo_stats_history (
+            day TEXT PRIMARY KEY,
+            added INTEGER NOT NULL DEFAULT 0,
+            deactivated INTEGER NOT NULL DEFAULT 0,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            active INTEGER
+        ) WITHOUT ROWID
+    ''')
+
+    # Начальные значения - один проход по таблице при обновлении схемы
+    conn.execute('''
+        INSERT INTO promo_totals (id, total, active)
+        SELECT 1, COUNT(*), COALESCE(SUM(is_active IS 1), 0) FROM promocodes
+    ''')
+    conn.execute('''
+        INSERT INTO promo_store_counts (store, total, active)
+        SELECT store, COUNT(*), SUM(is_active IS 1) FROM promocodes GROUP BY store
+    ''')
+    conn.execute('''
+        INSERT INTO promo_stats_history (day, added)
+        SELECT DATE(created_at), COUNT(*) FROM promocodes
+        WHERE created_at IS NOT NULL GROUP BY DATE(created_at)
+    ''')
+    conn.execute('''
+        INSERT INTO promo_stats_history (day, total, active)
+        SELECT DATE('now'), total, active FROM promo_totals WHERE true
+        ON CONFLICT (day) DO UPDATE SET total = excluded.total, active = excluded.active
+    ''')
+
+    # Счётчики ведут триггеры: их видят все пути записи - бот, загрузка
+    # фидов, сборщик просроченных и правки базы руками
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS promocodes_stats_insert
+        AFTER INSERT ON promocodes
+        BEGIN
+            UPDATE promo_totals SET total = total + 1, active = active + (NEW.is_active IS 1);
+            INSERT INTO promo_store_counts (store, total, active) VALUES (NEW.store, 1, NEW.is_active IS 1)
+            ON CONFLICT (store) DO UPDATE SET total = total + 1, active = active + excluded.active;
+            INSERT INTO promo_stats_history (day, added, total, active)
+            SELECT DATE('now'), 1, total, active FROM promo_totals WHERE true
+            ON CONFLICT (day) DO UPDATE SET
+                added = added + 1, total = excluded.total, active = excluded.active;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS promocodes_stats_delete
+        AFTER DELETE ON promocodes
+        BEGIN
+            UPDATE promo_totals SET total = total - 1, active = active - (OLD.is_active IS 1);
+            UPDATE promo_store_counts SET total = total - 1, active = active - (OLD.is_active IS 1)
+            WHERE store = OLD.store;
+            INSERT INTO promo_stats_history (day, deleted, total, active)
+            SELECT DATE('now'), 1, total, active FROM promo_totals WHERE true
+            ON CONFLICT (day) DO UPDATE SET
+                deleted = deleted + 1, total = excluded.total, active = excluded.active;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS promocodes_stats_update
+        AFTER UPDATE OF store, is_active ON promocodes
+        WHEN OLD.store IS NOT NEW.store OR (OLD.is_active IS 1) != (NEW.is_active IS 1)
+        BEGIN
+            UPDATE promo_totals SET active = active - (OLD.is_active IS 1) + (NEW.is_active IS 1);
+            UPDATE promo_store_counts SET total = total - 1, active = active - (OLD.is_active IS 1)
+            WHERE store = OLD.store;
+            INSERT INTO promo_store_counts (store, total, active) VALUES (NEW.store, 1, NEW.is_active IS 1)
+            ON CONFLICT (store) DO UPDATE SET total = total + 1, active = active + excluded.active;
+            INSERT INTO promo_stats_history (day, deactivated, total, active)
+            SELECT DATE('now'), (OLD.is_active IS 1) AND (NEW.is_active IS NOT 1), total, active
+            FROM promo_totals WHERE true
+            ON CONFLICT (day) DO UPDATE SET
+                deactivated = deactivated + excluded.deactivated,
+                total = excluded.total, active = excluded.active;
+        END
+    ''')
+
+
+def _add_events(conn):
+    # Журнал событий: только дописывается, пачками из буфера database.events
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            ts REAL NOT NULL,
+            type TEXT NOT NULL,
+            user_id INTEGER,
+            promo_id INTEGER,
+            detail TEXT
+        )
+    ''')
+    # Суточные итоги для отчётов: promo_id 0 и detail '' - «не относится»
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS event_daily (
+            day TEXT NOT NULL,
+            type TEXT NOT NULL,
+            promo_id INTEGER NOT NULL DEFAULT 0,
+            detail TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, type, promo_id, detail)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _add_user_unlocks(conn):
+    # Открытые и посещённые промокоды: по строке на пользователя, множества
+    # id в компактном виде (см. database.unlocks)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_unlocks (
+            user_id INTEGER PRIMARY KEY,
+            unlocked BLOB NOT NULL DEFAULT x'',
+            visited BLOB NOT NULL DEFAULT x'',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _add_catalogue_versions(conn):
+    # Канал, за подписку на который мини-аппа открывает промокод
+    # (username без @; NULL - первый обязательный канал)
+    conn.execute("ALTER TABLE promocodes ADD COLUMN channel TEXT")
+    # Журнал изменений каталога: строка на каждую вставку, изменение или
+    # удаление промокода, version - номер изменения (он же версия каталога).
+    # Старые строки удаляет database.catalogue.prune_changes, последняя
+    # остаётся всегда, поэтому номера не начинаются заново
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalogue_changes (
+            version INTEGER PRIMARY KEY,
+            promo_id INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT INTO catalogue_changes (promo_id) SELECT id FROM promocodes ORDER BY id")
+
+    # Журнал ведут триггеры, как и счётчики статистики
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS promocodes_changes_insert
+        AFTER INSERT ON promocodes
+        BEGIN
+            INSERT INTO catalogue_changes (promo_id) VALUES (NEW.id);
+        END
+    ''')
+    # Повторная загрузка фида с теми же данными версию не двигает
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS promocodes_changes_update
+        AFTER UPDATE OF store, code, description, expires_at, is_active, category, channel ON promocodes
+        WHEN OLD.store IS NOT NEW.store OR OLD.code IS NOT NEW.code
+            OR OLD.description IS NOT NEW.description OR OLD.expires_at IS NOT NEW.expires_at
+            OR OLD.is_active IS NOT NEW.is_active OR OLD.category IS NOT NEW.category
+            OR OLD.channel IS NOT NEW.channel
+        BEGIN
+            INSERT INTO catalogue_changes (promo_id) VALUES (NEW.id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS promocodes_changes_delete
+        AFTER DELETE ON promocodes
+        BEGIN
+            INSERT INTO catalogue_changes (promo_id) VALUES (OLD.id);
+        END
+    ''')
+
+
+def _fold(column):
+    # unicode61 приводит кириллицу к нижнему регистру, но «ё» от «е» не
+    # отличает только после замены: её делают триггеры, а запрос - database.search
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _add_promo_search(conn):
+    # Полнотекстовый поиск по магазину, коду и описанию. Текст хранит сама
+    # promocodes (content=), в FTS только индекс. Префиксы из 2-3 букв
+    # индексируются отдельно: поиск по мере набора не перебирает все термины
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS promocodes_fts USING fts5(
+            store, code, description,
+            content='promocodes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    # Совпадение в магазине весит больше, чем в коде, в коде - больше,
+    # чем в описании; ORDER BY rank использует эти веса
+    conn.execute("INSERT INTO promocodes_fts (promocodes_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')")
+    # Не 'rebuild': он проиндексировал бы текст без замены «ё»
+    conn.execute(f'''
+        INSERT INTO promocodes_fts (rowid, store, code, description)
+        SELECT id, {_fold('store')}, {_fold('code')}, {_fold('description')} FROM promocodes
+    ''')
+
+    # Индекс ведут триггеры, как журнал каталога. Из индекса external
+    # content удаляют, передавая прежний текст: он должен совпасть с
+    # проиндексированным, поэтому замена та же
+    new_values = f"NEW.id, {_fold('NEW.store')}, {_fold('NEW.code')}, {_fold('NEW.description')}"
+    old_values = f"OLD.id, {_fold('OLD.store')}, {_fold('OLD.code')}, {_fold('OLD.description')}"
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS promocodes_fts_insert
+        AFTER INSERT ON promocodes
+        BEGIN
+            INSERT INTO promocodes_fts (rowid, store, code, description) VALUES ({new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS promocodes_fts_delete
+        AFTER DELETE ON promocodes
+        BEGIN
+            INSERT INTO promocodes_fts (promocodes_fts, rowid, store, code, description)
+            VALUES ('delete', {old_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS promocodes_fts_update
+        AFTER UPDATE OF store, code, description ON promocodes
+        WHEN OLD.store IS NOT NEW.store OR OLD.code IS NOT NEW.code
+            OR OLD.description IS NOT NEW.description
+        BEGIN
+            INSERT INTO promocodes_fts (promocodes_fts, rowid, store, code, description)
+            VALUES ('delete', {old_values});
+            INSERT INTO promocodes_fts (rowid, store, code, description) VALUES ({new_values});
+        END
+    ''')
+
+
+def _add_table_versions(conn):
+    # Версия таблицы для кэшей других процессов (database.versions): её
+    # двигают триггеры при любом изменении. У промокодов версия уже есть -
+    # последняя запись catalogue_changes, здесь - остальные кэшируемые таблицы
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("INSERT OR IGNORE INTO table_versions (name) VALUES ('channels')")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS channels_version_{event.lower()}
+            AFTER {event} ON channels
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE name = 'channels';
+            END
+        ''')
+
+
+# (версия, описание, функция) - только добавлять в конец, не менять старые
+MIGRATIONS = [
+    (1, "таблицы promocodes и channels", _create_tables),
+    (2, "индексы promocodes для активных, магазинов и сроков", _add_promocode_indexes),
+    (3, "категория промокода и индексы для постраничной выдачи", _add_category),
+    (4, "пользователи и рассылки", _add_users_and_broadcasts),
+    (5, "уникальность промокода в магазине", _add_promocode_unique_code),
+    (6, "просроченные промокоды снимаются с выдачи", _add_expiry_index),
+    (7, "счётчики и история статистики промокодов", _add_promo_stats),
+    (8, "журнал событий и суточные итоги", _add_events),
+    (9, "открытые промокоды пользователей", _add_user_unlocks),
+    (10, "каналы промокодов и версии каталога", _add_catalogue_versions),
+    (11, "полнотекстовый поиск промокодов", _add_promo_search),
+    (12, "версии таблиц для кэшей других процессов", _add_table_versions),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Применяем недостающие миграции, возвращаем список применённых версий"""
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version <= get_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Другой процесс мог успеть применить миграцию, пока ждали блокировку
+            if version > get_version(conn):
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return applied
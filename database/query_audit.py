@@ -0,0 +1,107 @@
+"""Проверка планов запросов (EXPLAIN QUERY PLAN).
+
+Собирает все SQL-константы (*_SQL) из модулей AUDITED_MODULES, строит
+для каждой план на пустой базе актуальной схемы и завершается с кодом 1,
+если какой-то запрос читает таблицу полным сканированием (в том числе
+по индексу) и таблицы нет в ALLOWED_SCANS. Та же проверка идёт в
+tests/test_query_audit.py.
+
+Запуск: python -m database.query_audit
+"""
+import importlib
+import os
+import re
+import sqlite3
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database import migrations
+
+AUDITED_MODULES = ['database.db', 'database.bulk', 'database.expiry', 'database.events',
+                   'database.unlocks', 'database.catalogue', 'database.search',
+                   'database.versions']
+
+# Таблицы, которые можно читать целиком. Любой другой SCAN - ошибка,
+# в том числе по индексу: SCAN ... USING COVERING INDEX всё равно
+# проходит все строки
+ALLOWED_SCANS = {
+    'channels': "справочник из нескольких строк",
+    'promo_store_counts': "строка на магазин",
+    'matches': "подзапрос database.search, ограничен LIMIT",
+    'promocodes_fts': "поиск по MATCH, FTS5 показывает его как SCAN VIRTUAL TABLE",
+}
+
+# SCAN CONSTANT ROW (SELECT без FROM) таблицу не читает и сюда не попадает
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?(?: USING .+| VIRTUAL TABLE .+)?$')
+
+
+def collect_queries():
+    """{'модуль.ИМЯ_SQL': текст запроса}
+
+    Шаблоны с {подстановками} пропускаются: их варианты модуль отдаёт
+    через функцию audit_queries().
+    """
+    queries = {}
+    for module_name in AUDITED_MODULES:
+        module = importlib.import_module(module_name)
+        for name, value in vars(module).items():
+            if name.endswith('_SQL') and isinstance(value, str) and '{' not in value:
+                queries[f"{module_name}.{name}"] = value
+        if hasattr(module, 'audit_queries'):
+            for name, sql in module.audit_queries().items():
+                queries[f"{module_name}.{name}"] = sql
+    return queries
+
+
+def explain(conn, sql):
+    params = [None] * sql.count('?')
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def find_problems(plan):
+    """Полные сканы больших таблиц и сортировки во временном B-дереве"""
+    scans, warnings = [], []
+    for step in plan:
+        match = FULL_SCAN.match(step)
+        if match and match.group(1) not in ALLOWED_SCANS:
+            scans.append(step)
+        elif step.startswith('USE TEMP B-TREE'):
+            warnings.append(step)
+    return scans, warnings
+
+
+def audit(conn=None, queries=None):
+    """Возвращает {имя: (план, сканы, предупреждения)}"""
+    if conn is None:
+        conn = sqlite3.connect(':memory:')
+        migrations.migrate(conn)
+    if queries is None:
+        queries = collect_queries()
+    results = {}
+    for name, sql in queries.items():
+        plan = explain(conn, sql)
+        results[name] = (plan, *find_problems(plan))
+    return results
+
+
+def main():
+    results = audit()
+    failed = 0
+    for name, (plan, scans, warnings) in sorted(results.items()):
+        if scans:
+            failed += 1
+            print(f"❌ {name}")
+        elif warnings:
+            print(f"⚠️  {name}")
+        else:
+            print(f"✅ {name}")
+        for step in plan:
+            print(f"      {step}")
+
+    print(f"\n📋 Запросов: {len(results)}, с полным сканированием: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
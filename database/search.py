@@ -0,0 +1,132 @@
+"""Полнотекстовый поиск промокодов (FTS5, миграция 11).
+
+Индекс promocodes_fts по магазину, коду и описанию ведут триггеры.
+Запрос пользователя разбивается на слова, у русских слов отрезается
+окончание («скидки», «скидкой» → «скидк»), и каждое ищется как префикс:
+«пиц» найдёт «Додо Пицца», «достав» - «доставка». Все слова должны
+найтись (И). Результаты идут по bm25: совпадение в магазине важнее, чем
+в коде, в коде - важнее, чем в описании.
+
+Проверка из консоли: python -m database.search скидка пицца
+"""
+import os
+import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database import db
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# Больше слов в запросе не бывает по делу, а каждое - отдельный проход по индексу
+MAX_SEARCH_TERMS = 8
+MAX_SEARCH_CANDIDATES = int(os.getenv('MAX_SEARCH_CANDIDATES', '5000'))
+# Короче основа не становится: «акция» → «акци», но «кэшбэк» не трогаем
+MIN_STEM_LENGTH = 4
+# Частые окончания существительных и прилагательных, длинные проверяются первыми
+RUSSIAN_ENDINGS = tuple(sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей', 'ий', 'ый', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ов', 'ев', 'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True))
+
+# Подчёркивание unicode61 считает разделителем: FREE_COFFEE - два слова
+TERM_RE = re.compile(r'[^\W_]+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+# Активные промокоды по релевантности (rank с весами из миграции 11).
+# bm25 считается для каждого совпадения, а частое слово есть в каждой
+# пятой строке: ранжируются только MAX_SEARCH_CANDIDATES самых новых
+# совпадений - их FTS5 отдаёт по rowid, не перебирая остальные.
+# CROSS JOIN закрепляет порядок: иначе планировщик может пойти по
+# индексу promocodes и выполнять MATCH для каждой строки
+SEARCH_SQL = f'''
+    WITH matches AS (
+        SELECT rowid, rank FROM promocodes_fts
+        WHERE promocodes_fts MATCH ?
+        ORDER BY rowid DESC
+        LIMIT ?
+    )
+    SELECT promocodes.* FROM matches
+    CROSS JOIN promocodes ON promocodes.id = matches.rowid
+    WHERE promocodes.is_active = 1 AND {db.NOT_EXPIRED_CONDITION}{{filters}}
+    ORDER BY matches.rank
+    LIMIT ?
+'''
+SEARCH_FILTERS = {
+    'category': 'promocodes.category = ?',
+    'store': 'promocodes.store = ?',
+}
+
+
+def stem(term):
+    """Отрезаем окончание русского слова, если основа остаётся не короче MIN_STEM_LENGTH"""
+    if not CYRILLIC_RE.search(term):
+        return term
+    for ending in RUSSIAN_ENDINGS:
+        if term.endswith(ending) and len(term) - len(ending) >= MIN_STEM_LENGTH:
+            return term[:-len(ending)]
+    return term
+
+
+def match_query(text):
+    """Строка MATCH для FTS5 или None, если в тексте нет ни одного слова.
+
+    Слова берутся в кавычки: операторы FTS5 (AND, NEAR, -, ^) из текста
+    пользователя не срабатывают.
+    """
+    text = text.lower().replace('ё', 'е')
+    terms = [stem(term) for term in TERM_RE.findall(text)[:MAX_SEARCH_TERMS]]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def build_search_query(category=None, store=None):
+    """SQL и параметры фильтров для поиска"""
+    filters = []
+    params = []
+    if category:
+        filters.append(SEARCH_FILTERS['category'])
+        params.append(category)
+    if store:
+        filters.append(SEARCH_FILTERS['store'])
+        params.append(store)
+    sql = SEARCH_SQL.format(filters=''.join(f" AND {f}" for f in filters))
+    return sql, params
+
+
+def search_promocodes(text, category=None, store=None, limit=SEARCH_LIMIT):
+    """Активные промокоды по запросу, самые подходящие первыми"""
+    query = match_query(text or '')
+    if query is None:
+        return []
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    sql, params = build_search_query(category, store)
+    with db.get_connection() as conn:
+        return conn.execute(sql, [query, MAX_SEARCH_CANDIDATES, *params, limit]).fetchall()
+
+
+def audit_queries():
+    """Варианты динамических запросов для database.query_audit"""
+    return {
+        f"SEARCH_SQL[{name}]": build_search_query(**kwargs)[0]
+        for name, kwargs in {
+            'all': {},
+            'category': {'category': 'food'},
+            'store': {'store': 'Ozon'},
+        }.items()
+    }
+
+
+def main():
+    db.init_db()
+    text = ' '.join(sys.argv[1:])
+    print(f"🔍 {text!r} → {match_query(text)}")
+    for promo in search_promocodes(text):
+        print(f"   {promo['id']}: {promo['store']} {promo['code']} - {promo['description']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Открытые промокоды пользователей на сервере.
+
+Состояние пользователя - два множества id промокодов: открытые (нажал
+«Я подписался») и посещённые (переходил в канал). В памяти множество -
+целое число-битсет (бит N - промокод N), в базе - одна строка на
+пользователя с двумя BLOB в компактном виде, как контейнеры roaring
+bitmap: несколько id хранятся списком разностей (varint), много -
+битовой картой, выбирается что короче. id промокодов не переиспользуются
+(AUTOINCREMENT), поэтому биты удалённых промокодов ничему не мешают.
+
+id приходят от клиента, а битовая карта растёт до самого большого из
+них, поэтому update_unlocks отбрасывает id больше последнего промокода в
+базе: память на пользователя ограничена размером каталога.
+"""
+from itertools import compress
+
+from database import db
+from database.cache import cached
+
+# Формат BLOB: первый байт - вид контейнера
+LIST_CONTAINER = 0
+BITMAP_CONTAINER = 1
+# Верхняя граница id для from_ids; на входе API граница - max_promo_id()
+MAX_PROMO_ID = 2 ** 31 - 1
+# Номера единичных битов для каждого значения байта
+BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+MAX_PROMO_ID_SQL = 'SELECT MAX(id) FROM promocodes'
+
+UNLOCKS_BY_USER_SQL = 'SELECT unlocked, visited FROM user_unlocks WHERE user_id = ?'
+SAVE_UNLOCKS_SQL = '''
+    INSERT INTO user_unlocks (user_id, unlocked, visited) VALUES (?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        unlocked = excluded.unlocked,
+        visited = excluded.visited,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+
+@cached('promocodes')
+def max_promo_id():
+    """Самый большой id промокода в базе (0, если промокодов нет)"""
+    with db.get_connection() as conn:
+        return conn.execute(MAX_PROMO_ID_SQL).fetchone()[0] or 0
+
+
+def from_ids(ids, max_id=MAX_PROMO_ID):
+    """Битсет из id промокодов (ValueError на id вне 1..max_id)"""
+    ids = [int(promo_id) for promo_id in ids]
+    if not ids:
+        return 0
+    if min(ids) < 1 or max(ids) > max_id:
+        raise ValueError(f"id промокода должен быть от 1 до {max_id}")
+    data = bytearray(max(ids) // 8 + 1)
+    for promo_id in ids:
+        data[promo_id >> 3] |= 1 << (promo_id & 7)
+    return int.from_bytes(data, 'little')
+
+
+def to_ids(bits):
+    """Отсортированный список id из битсета"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    ids = []
+    # Нулевые байты пропускает compress на C, а памяти нужно как на сам
+    # битсет - без строки из его битов, как у bin()
+    for index in compress(range(len(data)), data):
+        base = index << 3
+        for bit in BYTE_BITS[data[index]]:
+            ids.append(base + bit)
+    return ids
+
+
+def _varint(value, out):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode(bits):
+    """Битсет в BLOB: список разностей или битовая карта, что короче"""
+    if not bits:
+        return b''
+    bitmap_size = (bits.bit_length() + 7) // 8
+    # Разность занимает от байта: при плотном множестве список заведомо длиннее
+    if bits.bit_count() < bitmap_size:
+        out = bytearray([LIST_CONTAINER])
+        previous = 0
+        for promo_id in to_ids(bits):
+            _varint(promo_id - previous, out)
+            previous = promo_id
+        if len(out) <= bitmap_size:
+            return bytes(out)
+    return bytes([BITMAP_CONTAINER]) + bits.to_bytes(bitmap_size, 'little')
+
+
+def decode(blob):
+    """BLOB из encode() обратно в битсет"""
+    if not blob:
+        return 0
+    if blob[0] == BITMAP_CONTAINER:
+        return int.from_bytes(blob[1:], 'little')
+    promo_id = shift = value = 0
+    ids = []
+    for byte in blob[1:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        promo_id += value
+        ids.append(promo_id)
+        value = shift = 0
+    return from_ids(ids)
+
+
+def get_unlocks(user_id):
+    """(открытые, посещённые) битсеты пользователя"""
+    with db.get_connection() as conn:
+        row = conn.execute(UNLOCKS_BY_USER_SQL, (user_id,)).fetchone()
+    if row is None:
+        return 0, 0
+    return decode(row['unlocked']), decode(row['visited'])
+
+
+def known_ids(ids):
+    """id без тех, что больше последнего промокода в базе (таких промокодов нет)"""
+    limit = max_promo_id()
+    return [promo_id for promo_id in map(int, ids) if promo_id <= limit]
+
+
+def update_unlocks(user_id, unlock=(), visit=()):
+    """Добавляем промокоды в открытые и посещённые, возвращаем новое состояние.
+
+    Неизвестные id отбрасываются (known_ids), id меньше 1 - ValueError
+    """
+    unlock_bits, visit_bits = from_ids(known_ids(unlock)), from_ids(known_ids(visit))
+    with db.get_connection() as conn:
+        # Чтение и запись в одной транзакции с блокировкой записи сразу:
+        # два устройства пользователя не затрут изменения друг друга
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(UNLOCKS_BY_USER_SQL, (user_id,)).fetchone()
+        unlocked, visited = (decode(row['unlocked']), decode(row['visited'])) if row else (0, 0)
+        new_unlocked, new_visited = unlocked | unlock_bits, visited | visit_bits
+        if row is None or (new_unlocked, new_visited) != (unlocked, visited):
+            conn.execute(SAVE_UNLOCKS_SQL, (user_id, encode(new_unlocked), encode(new_visited)))
+    return new_unlocked, new_visited
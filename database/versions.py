@@ -0,0 +1,120 @@
+"""Изменения каталога, сделанные другими процессами.
+
+Бот и воркеры API держат снимки каталога в catalogue_cache своего
+процесса, а пишут в одну базу. Запись в своём процессе сбрасывает
+снимки сигналом catalogue_changed, чужую видит VersionWatcher:
+
+1. PRAGMA data_version на отдельном соединении: число меняется, только
+   если другое соединение что-то закоммитило. Это проверка без чтения
+   таблиц, единицы микросекунд.
+2. Если оно изменилось, один запрос читает версии таблиц: последнюю
+   запись журнала catalogue_changes (промокоды) и table_versions
+   (каналы, миграция 12). Их двигают триггеры, поэтому запись события
+   или пользователя каталог не сбрасывает.
+3. Сдвинувшиеся версии уходят в catalogue_changed с reason='external',
+   снимки перестраиваются лениво - при следующем чтении.
+
+Свои записи процесс тоже видит так (они сделаны другим соединением из
+пула) и перестраивает снимки ещё раз - записи каталога редки, а
+«запомнить свою версию» могло бы скрыть чужую запись, пришедшую следом.
+
+Проверка идёт перед чтением снимка, не чаще раза в VERSION_CHECK_INTERVAL:
+чужая запись видна не позже чем через столько секунд.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from database.cache import catalogue_changed
+
+VERSION_CHECK_INTERVAL = float(os.getenv('CACHE_VERSION_CHECK_INTERVAL', '0.1'))
+BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '5'))
+
+# Поиски по первичным ключам: MAX(version) - последняя запись журнала
+TABLE_VERSIONS_SQL = '''
+    SELECT (SELECT MAX(version) FROM catalogue_changes) AS promocodes,
+           (SELECT version FROM table_versions WHERE name = 'channels') AS channels
+'''
+DATA_VERSION_SQL = 'PRAGMA data_version'
+
+
+class VersionWatcher:
+    """Следит за версиями таблиц в базе и сбрасывает снимки при чужих записях"""
+
+    def __init__(self, db_path, interval=VERSION_CHECK_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._next_check = 0.0
+        self._data_version = None
+        self._versions = None
+        # Версии не прочитались (схема старая): снимки могли устареть незаметно
+        self._missed = False
+        self.checks = 0
+        self.reads = 0
+        self.external = 0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """Воркер gunicorn (preload_app): соединение и блокировку родителя не
+        используем, а его снимки считаем устаревшими - что менялось до fork,
+        уже не узнать
+        """
+        self._lock = threading.Lock()
+        self._conn = None
+        self._next_check = 0.0
+        self._data_version = None
+        self._missed = self._versions is not None or self._missed
+        self._versions = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            self._conn.execute("PRAGMA query_only = ON")
+        return self._conn
+
+    def _read_versions(self, conn):
+        self.reads += 1
+        try:
+            row = conn.execute(TABLE_VERSIONS_SQL).fetchone()
+        except sqlite3.OperationalError:
+            # Схема ещё не обновлена (до init_db): проверим в следующий раз
+            self._missed = True
+            return None
+        return {'promocodes': row[0] or 0, 'channels': row[1] or 0}
+
+    def check(self):
+        """Сбрасываем снимки таблиц, которые изменил другой процесс"""
+        if time.monotonic() < self._next_check:
+            return
+        # Проверяет один поток, остальные не ждут и читают снимки как есть
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.interval
+            self.checks += 1
+            conn = self._connection()
+            data_version = conn.execute(DATA_VERSION_SQL).fetchone()[0]
+            if data_version == self._data_version:
+                return
+            versions = self._read_versions(conn)
+            if versions is None:
+                return
+            self._data_version = data_version
+            if self._versions is None:
+                changed = list(versions) if self._missed else []
+            else:
+                changed = [tag for tag, version in versions.items() if self._versions.get(tag) != version]
+            self._versions = versions
+            self._missed = False
+        finally:
+            self._lock.release()
+
+        if changed:
+            self.external += 1
+            catalogue_changed.send(*changed, reason='external')
+
+    def stats(self):
+        return {'checks': self.checks, 'reads': self.reads, 'external': self.external}
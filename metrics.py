@@ -0,0 +1,352 @@
+"""Метрики бота и API в текстовом формате Prometheus и профилировщик.
+
+Гистограммы и счётчики живут в памяти процесса:
+  - promo_handler_seconds - обработчики команд бота (bot.main_bot);
+  - promo_http_request_seconds - маршруты Flask (bot.api);
+  - promo_sql_seconds - каждый SQL-запрос через пул соединений,
+    по имени константы (database.db.ACTIVE_PROMOCODES_SQL); время -
+    execute() с первым шагом запроса, выборка fetchall() не входит;
+  - promo_telegram_api_seconds - вызовы Bot API по методам.
+render() отдаёт всё это для Prometheus: API - на /metrics с токеном
+METRICS_TOKEN, бот - на METRICS_PORT (адрес METRICS_LISTEN), если он задан. Метрики у каждого
+процесса свои: у gunicorn с несколькими воркерами каждый скрейп видит
+один из них.
+
+Замер - два perf_counter() и обновление гистограммы под блокировкой,
+единицы микросекунд (см. benchmarks.bench_metrics). METRICS_ENABLED=0
+отключает обёртки совсем.
+
+SamplingProfiler раз в PROFILE_INTERVAL снимает стеки всех потоков
+(sys._current_frames) и копит их в формате folded stacks - его
+понимают flamegraph.pl и speedscope. Включается админ-командой /profile.
+"""
+import asyncio
+import functools
+import hmac
+import os
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as StackCounter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+# Порт /metrics процесса бота (у API свой маршрут); пусто - не слушать.
+# Метрики раскрывают тексты SQL и имена обработчиков: по умолчанию
+# только локально, для Prometheus с другой машины - METRICS_LISTEN=0.0.0.0
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+# Токен для /metrics (Authorization: Bearer ...): API слушает все
+# интерфейсы, и без токена его /metrics выключен. Листенер бота с
+# токеном тоже его требует
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# Границы корзин гистограмм, секунды: от 100 мкс (SQL) до 10 с (Telegram)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Разных SQL-текстов в метриках не больше этого, остальные - в 'other'
+# (запросы собираются из фильтров, но вариантов у них немного)
+MAX_SQL_STATEMENTS = 500
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.01'))
+# Глубже стеки обрезаются: хватает, чтобы узнать путь от обработчика
+PROFILE_MAX_DEPTH = 64
+# Поток ждёт работы, а не работает: такие сэмплы не считаем
+IDLE_FILES = ('selectors.py', 'threading.py', 'queue.py')
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Счётчик событий с метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    """Гистограмма длительностей с метками (корзины как у Prometheus)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS, max_series=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # Сверх max_series разных меток всё идёт в метки ('other', ...)
+        self.max_series = max_series
+        # метки: [счётчики корзин (последняя - больше всех границ), сумма, число]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                if self.max_series is not None and len(self._values) >= self.max_series:
+                    labels = ('other',) * len(self.labels)
+                    entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        """{метки: (счётчики корзин, сумма, число)}"""
+        with self._lock:
+            return {labels: (list(entry[0]), entry[1], entry[2]) for labels, entry in self._values.items()}
+
+    def samples(self, rename=None):
+        values = self.snapshot()
+        if rename is not None:
+            values = rename(values)
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{format_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {total}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {count}"
+
+
+handler_seconds = Histogram('promo_handler_seconds', "Время обработчиков бота", ('handler',))
+handler_errors = Counter('promo_handler_errors_total', "Исключения в обработчиках бота", ('handler',))
+http_seconds = Histogram('promo_http_request_seconds', "Время запросов к API", ('route', 'method', 'status'))
+sql_seconds = Histogram('promo_sql_seconds', "Время SQL-запросов (execute)", ('statement',),
+                        max_series=MAX_SQL_STATEMENTS)
+telegram_seconds = Histogram('promo_telegram_api_seconds', "Время вызовов Bot API", ('method',))
+telegram_errors = Counter('promo_telegram_api_errors_total', "Ошибки вызовов Bot API", ('method', 'error'))
+
+METRICS = [handler_seconds, handler_errors, http_seconds, sql_seconds, telegram_seconds, telegram_errors]
+
+
+def timed(histogram, *labels, errors=None):
+    """Декоратор: время вызова (и исключения в errors) с метками labels"""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(*labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, *labels)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(*labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, *labels)
+        return wrapper
+    return decorator
+
+
+# ========== SQL ==========
+
+class TimedConnection(sqlite3.Connection):
+    """Соединение, которое меряет execute/executemany (фабрика для sqlite3.connect)"""
+
+    def execute(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            sql_seconds.observe(time.perf_counter() - started, sql)
+
+    def executemany(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            sql_seconds.observe(time.perf_counter() - started, sql)
+
+
+def connection_factory():
+    return TimedConnection if METRICS_ENABLED else sqlite3.Connection
+
+
+@functools.lru_cache(maxsize=1)
+def statement_names():
+    """{текст SQL: 'модуль.ИМЯ_SQL'} по константам из database.query_audit"""
+    from database import query_audit
+    return {sql: name for name, sql in query_audit.collect_queries().items()}
+
+
+def _name_statements(values):
+    """Тексты SQL в метках - имена констант; одинаковые имена складываются"""
+    names = statement_names()
+    merged = {}
+    for (sql,), (counts, total, count) in values.items():
+        name = names.get(sql) or ' '.join(sql.split())[:80]
+        if (name,) in merged:
+            old = merged[(name,)]
+            counts = [a + b for a, b in zip(old[0], counts)]
+            total, count = old[1] + total, old[2] + count
+        merged[(name,)] = (counts, total, count)
+    return merged
+
+
+# ========== ВЫДАЧА ==========
+
+def render(metrics=None):
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in metrics or METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if metric is sql_seconds:
+            lines.extend(metric.samples(rename=_name_statements))
+        else:
+            lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(authorization, token=None):
+    """Заголовок Authorization совпадает с Bearer-токеном (без токена - нет)"""
+    token = token or METRICS_TOKEN
+    if not token:
+        return False
+    return hmac.compare_digest((authorization or '').encode(), f"Bearer {token}".encode())
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        if METRICS_TOKEN and not authorized(self.headers.get('Authorization')):
+            self.send_error(401)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port=METRICS_PORT, host=METRICS_LISTEN):
+    """/metrics в фоновом потоке (для процесса бота); None, если порт не задан"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    print(f"📈 Метрики: http://{host}:{server.server_port}/metrics")
+    return server
+
+
+# ========== ПРОФИЛИРОВЩИК ==========
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик всех потоков процесса"""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = StackCounter()
+        self.samples = 0
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Начинаем с чистого листа; False - уже запущен"""
+        if self.running:
+            return False
+        self.stacks = StackCounter()
+        self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Стеки в формате folded: «a;b;c число» на строку"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+    def top(self, limit=15):
+        """[(функция, сэмплов в самой функции, сэмплов вместе с вызванными)]"""
+        own, total = StackCounter(), StackCounter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [(name, count, total[name]) for name, count in own.most_common(limit)]
+
+
+profiler = SamplingProfiler()
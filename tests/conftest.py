@@ -0,0 +1,30 @@
+"""Общие настройки тестов: временная база вместо database/promo_bot.db.
+
+DB_PATH читается при импорте database.db, поэтому задаётся здесь, до
+импорта модулей проекта.
+
+Запуск из корня проекта: python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+TMP_DIR = tempfile.mkdtemp(prefix='promo_test_')
+os.environ['DB_PATH'] = os.path.join(TMP_DIR, 'promo_bot.db')
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def database():
+    """Схема на временной базе (один раз за прогон); возвращает database.db"""
+    from database import db
+    db.init_db()
+    return db
@@ -0,0 +1,57 @@
+"""Закрепление промокодов при добавлении и удалении (консистентное хэширование)"""
+import random
+
+from database.assignment import PromoAssignment
+
+USERS = random.Random(1).sample(range(1, 10 ** 10), 20000)
+
+
+def test_same_catalogue_same_table():
+    ids = list(range(1, 301))
+    assert PromoAssignment(ids).table == PromoAssignment(reversed(ids)).table
+
+
+def test_empty_catalogue():
+    assert PromoAssignment([]).lookup(42) is None
+
+
+def test_ring_is_stable_under_churn():
+    """Пользователи переходят только к новому промокоду или от удалённого,
+    и их не больше 2/N
+    """
+    rnd = random.Random(7)
+    ids = set(range(1, 201))
+    next_id = 201
+    current = PromoAssignment(ids)
+    for _ in range(20):
+        if rnd.random() < 0.5:
+            added, removed = next_id, None
+            ids.add(next_id)
+            next_id += 1
+        else:
+            added, removed = None, rnd.choice(sorted(ids))
+            ids.remove(removed)
+        after = PromoAssignment(ids)
+        moved = 0
+        for user_id in USERS:
+            before_id, after_id = current.lookup(user_id), after.lookup(user_id)
+            assert after_id in ids
+            if before_id != after_id:
+                moved += 1
+                assert after_id == added if added else before_id == removed
+        assert moved / len(USERS) <= 2 / len(ids)
+        current = after
+
+
+def test_user_promocode_survives_catalogue_changes(database):
+    for i in range(30):
+        database.add_promocode('Churn', f"CHURN{i}", 'тест', '2099-12-31')
+    users = USERS[:500]
+    before = {user_id: database.get_user_promocode(user_id)['id'] for user_id in users}
+
+    new_id = database.add_promocode('Churn', 'CHURN_NEW', 'тест', '2099-12-31')
+    after = {user_id: database.get_user_promocode(user_id)['id'] for user_id in users}
+    assert all(after[u] in (before[u], new_id) for u in users)
+
+    database.delete_promocode(new_id)
+    assert {user_id: database.get_user_promocode(user_id)['id'] for user_id in users} == before
@@ -0,0 +1,22 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from bot import broadcast
+
+
+def test_job_gives_up_when_application_never_starts():
+    async def main():
+        tasks = []
+        application = SimpleNamespace(bot=None, running=False,
+                                      create_task=lambda coro: tasks.append(asyncio.create_task(coro)))
+        started = time.monotonic()
+        broadcast.start_broadcast(application, 901, start_timeout=0.3)
+        # Отмена не ждёт таймаута
+        broadcast.start_broadcast(application, 902, start_timeout=60)
+        assert broadcast.cancel_broadcast(902)
+        assert await asyncio.wait_for(asyncio.gather(*tasks), timeout=5) == [None, None]
+        return time.monotonic() - started
+
+    assert 0.3 <= asyncio.run(main()) < 2
+    assert not broadcast.is_running(901) and not broadcast.is_running(902)
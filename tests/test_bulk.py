@@ -0,0 +1,55 @@
+import json
+import sqlite3
+
+from database import bulk, migrations
+
+
+def feed(rows):
+    return [json.dumps(row, ensure_ascii=False) + '\n' for row in rows]
+
+
+def promo(code, description='скидка', store='BulkShop'):
+    return {'store': store, 'code': code, 'description': description, 'expires_at': '2099-12-31'}
+
+
+def test_inserted_and_updated(database):
+    bulk.import_promocodes(feed([promo('OLD1'), promo('OLD2')]), 'jsonl')
+    rows = [promo('OLD1', 'новое'), promo('NEW1'), promo('NEW1', 'повтор'), promo('NEW2'), {'store': ''}]
+    report = bulk.import_promocodes(feed(rows), 'jsonl', batch_size=2)
+    assert (report['inserted'], report['updated'], report['invalid']) == (2, 2, 1)
+
+
+def test_other_writers_are_not_counted(database):
+    """Строки, которые между пачками добавил другой процесс, не считаются новыми"""
+    def stream():
+        for i, line in enumerate(feed([promo(f"RACE{i}") for i in range(6)])):
+            if i and i % 2 == 0:
+                with sqlite3.connect(database.DB_PATH) as other:
+                    other.execute(database.INSERT_PROMOCODE_SQL,
+                                  ('Other', f"OTHER{i}", 'чужая', '2099-12-31', 'other', None))
+            yield line
+
+    report = bulk.import_promocodes(stream(), 'jsonl', batch_size=2)
+    assert (report['inserted'], report['updated']) == (6, 0)
+
+
+def test_unique_code_migration_keeps_newest_active(capsys):
+    conn = sqlite3.connect(':memory:')
+    for version, _, apply in migrations.MIGRATIONS[:4]:
+        apply(conn)
+    conn.execute(f"PRAGMA user_version = {migrations.MIGRATIONS[3][0]}")
+    conn.executemany(
+        "INSERT INTO promocodes (id, store, code, is_active, created_at) VALUES (?, ?, ?, ?, ?)",
+        [
+            (1, 'Ozon', 'A', 1, '2024-01-01'),
+            (2, 'Ozon', 'A', 0, '2024-06-01'),
+            (3, 'Ozon', 'A', 1, '2024-03-01'),
+            (4, 'WB', 'B', 0, '2024-01-01'),
+            (5, 'WB', 'B', 0, '2024-02-01'),
+            (6, 'WB', 'C', 1, '2024-01-01'),
+        ],
+    )
+    conn.commit()
+    migrations.migrate(conn)
+    assert [row[0] for row in conn.execute("SELECT id FROM promocodes ORDER BY id")] == [3, 5, 6]
+    assert "повторы промокодов (магазин, код): 3" in capsys.readouterr().out
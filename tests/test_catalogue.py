@@ -0,0 +1,33 @@
+import json
+import os
+
+import pytest
+
+from database import bulk, catalogue
+
+
+def test_feed_is_valid():
+    report = bulk.import_file(catalogue.db.CATALOGUE_FEED, dry_run=True)
+    assert report['read'] > 0 and report['invalid'] == 0, report['errors']
+
+
+def test_build_static(database, tmp_path):
+    bulk.import_file(database.CATALOGUE_FEED)
+    data, size, _ = catalogue.build_static(tmp_path)
+    with open(os.path.join(tmp_path, catalogue.STATIC_NAME), encoding='utf-8') as f:
+        assert json.load(f) == json.loads(json.dumps(data))
+    assert data['promocodes'] and size > 0
+
+
+def test_empty_snapshot_is_not_written(monkeypatch, tmp_path):
+    monkeypatch.setattr(catalogue, 'snapshot', lambda: {'version': 1, 'promocodes': []})
+    with pytest.raises(ValueError):
+        catalogue.build_static(tmp_path)
+    assert not os.listdir(tmp_path)
+
+
+def test_stale_feed_is_named(database, monkeypatch, tmp_path):
+    monkeypatch.setattr(catalogue, 'snapshot', lambda: {'version': 1, 'promocodes': []})
+    with pytest.raises(SystemExit) as exit_info:
+        catalogue.main(['build', str(tmp_path)])
+    assert 'catalogue.csv' in str(exit_info.value.code)
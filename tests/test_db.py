@@ -0,0 +1,28 @@
+from database.cache import catalogue_changed
+
+
+def test_delete_signals_only_real_changes(database):
+    sent = []
+
+    def receiver(*tags, **info):
+        sent.append((tags, info['reason']))
+
+    catalogue_changed.connect(receiver)
+    try:
+        promo_id = database.add_promocode('DeleteShop', 'DELETE1', 'скидка', '2099-12-31')
+        database.add_channel('Delete', 'delete_channel')
+        channel_id = max(channel['id'] for channel in database.get_required_channels())
+        sent.clear()
+        promocodes = database.get_active_promocodes()
+
+        # Нет такой строки - снимки не сбрасываются
+        assert database.delete_promocode(promo_id + 1000) == 0
+        assert database.delete_channel(channel_id + 1000) == 0
+        assert sent == []
+        assert database.get_active_promocodes() is promocodes
+
+        assert database.delete_promocode(promo_id) == 1
+        assert database.delete_channel(channel_id) == 1
+        assert sent == [(('promocodes',), 'delete'), (('channels',), 'delete')]
+    finally:
+        catalogue_changed.disconnect(receiver)
@@ -0,0 +1,26 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from database import catalogue, search
+from database.cache import catalogue_changed, earliest_expiry
+
+
+def test_expired_promo_is_not_served_before_sweep(database):
+    yesterday = (datetime.now(timezone.utc).date() - timedelta(days=1)).isoformat()
+    with database.get_connection() as conn:
+        # Как промокод, срок которого истёк этой ночью, а сборщик ещё не прошёл
+        conn.execute(database.INSERT_PROMOCODE_SQL,
+                     ('Expired', 'EXPIREDNIGHT', 'просрочкатест', yesterday, 'other', None))
+    catalogue_changed.send('promocodes')
+
+    promocodes = database.get_active_promocodes()
+    assert 'EXPIREDNIGHT' not in {promo['code'] for promo in promocodes}
+    # Срок снимка в будущем: кэш работает, а не перечитывает базу каждый раз
+    deadline = earliest_expiry(promocodes)
+    assert deadline is None or deadline > time.time()
+    assert database.get_active_promocodes() is promocodes
+
+    page, _ = database.get_promocodes_page(store='Expired')
+    assert page == []
+    assert search.search_promocodes('просрочкатест') == []
+    assert 'Expired' not in {row[1] for row in catalogue.snapshot()['promocodes']}
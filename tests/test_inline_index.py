@@ -0,0 +1,50 @@
+from database import inline_index
+from database.inline_index import InlineIndex
+
+
+def promo(promo_id, store, code):
+    return {'id': promo_id, 'store': store, 'code': code}
+
+
+def ids(found):
+    return [promo['id'] for promo in found]
+
+
+def test_prefix_lookup():
+    # Уже по created_at DESC, как из get_active_promocodes
+    index = InlineIndex([
+        promo(4, 'Burger King', 'BK50'),
+        promo(3, 'Ёлка Маркет', 'NEWYEAR'),
+        promo(2, 'Burger House', 'BH10'),
+        promo(1, 'Ozon', 'BURGER1'),
+    ])
+    assert ids(index.search('burg')) == [4, 2, 1]
+    assert ids(index.search('King')) == [4]
+    assert ids(index.search('burger k')) == [4]
+    assert ids(index.search('house bur')) == [2]
+    assert ids(index.search('елка')) == ids(index.search('ЁЛ')) == [3]
+    assert ids(index.search('bk')) == [4]
+    assert ids(index.search('')) == [4, 3, 2, 1]
+    assert ids(index.search('', limit=2)) == [4, 3]
+    assert index.search('pizza') == []
+
+
+def test_recent_answers_are_bounded():
+    index = InlineIndex([promo(1, 'Ozon', 'OZ1'), promo(2, 'Okko', 'OK1')], cache_size=2)
+    for query in ('o', 'oz', 'o', 'ok'):
+        index.search(query)
+    # «o» спрошен повторно и стал свежим, вытеснен «oz»
+    assert (index.hits, index.misses) == (1, 3)
+    assert list(index._results) == [('o', inline_index.INLINE_RESULTS_LIMIT), ('ok', inline_index.INLINE_RESULTS_LIMIT)]
+
+
+def test_index_is_rebuilt_on_catalogue_change(database):
+    index = inline_index.get_inline_index()
+    assert inline_index.get_inline_index() is index
+    assert inline_index.search_inline('inlinetestshop') == []
+    promo_id = database.add_promocode('InlineTestShop', 'INLINE1', 'скидка', '2099-12-31')
+    # Новый индекс - без ответов старого, в том числе пустого
+    assert inline_index.get_inline_index() is not index
+    assert ids(inline_index.search_inline('inlinetestshop')) == [promo_id]
+    database.delete_promocode(promo_id)
+    assert inline_index.search_inline('inlinetestshop') == []
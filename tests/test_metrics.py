@@ -0,0 +1,40 @@
+import socket
+from urllib.request import urlopen
+
+import metrics
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_serve_listens_locally_by_default():
+    server = metrics.serve(free_port())
+    try:
+        host, port = server.server_address
+        assert host == '127.0.0.1'
+        with urlopen(f"http://{host}:{port}/metrics") as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert b'# TYPE promo_sql_seconds histogram' in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_serve_without_port():
+    assert metrics.serve(0) is None
+
+
+def test_api_metrics_requires_token(monkeypatch):
+    from bot import api
+
+    with api.app.test_client() as client:
+        monkeypatch.setattr(metrics, 'METRICS_TOKEN', None)
+        assert client.get('/metrics').status_code == 404
+        monkeypatch.setattr(metrics, 'METRICS_TOKEN', 'secret')
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        assert response.status_code == 200 and b'promo_http_request_seconds' in response.data
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+
+from benchmarks.fake_telegram import FLOOD_RETRY_AFTER, FakeTelegramServer
+from bot.outbound import OutboundLimiter
+
+TOKEN = "123456:TEST"
+FAST = 1e9
+
+
+def fast_limiter(**kwargs):
+    return OutboundLimiter(global_rate=FAST, chat_rate=FAST, chat_burst=FAST, **kwargs)
+
+
+def test_flood_control_pauses_and_retries():
+    """Поддельный API отвечает 429: сообщения доходят все, по порядку и после паузы"""
+    fake = FakeTelegramServer(flood_control=True).start()
+    limiter = fast_limiter()
+
+    async def main():
+        async with ExtBot(TOKEN, base_url=f"{fake.url}/bot", rate_limiter=limiter) as bot:
+            started = time.monotonic()
+            await asyncio.gather(*(bot.send_message(42, f"message {i}") for i in range(3)))
+            return time.monotonic() - started
+
+    try:
+        elapsed = asyncio.run(main())
+    finally:
+        fake.stop()
+    assert [params['text'] for params in fake.sent_messages] == [f"message {i}" for i in range(3)]
+    # Лимиты ограничителя выше, чем у API: каждый отказ повторён
+    assert limiter.stats['retry_after'] == fake.rejected['chat'] >= 2
+    assert limiter.stats['sent'] == 3 and limiter.stats['failed'] == 0
+    # Третье сообщение ждало двух пауз по retry_after
+    assert elapsed >= 2 * FLOOD_RETRY_AFTER
+
+
+def test_pause_applies_to_all_chats():
+    limiter = fast_limiter()
+    calls = []
+
+    async def send(chat_id):
+        calls.append((chat_id, time.monotonic()))
+        if len(calls) == 1:
+            raise RetryAfter(1)
+        return chat_id
+
+    async def main():
+        await limiter.initialize()
+        try:
+            first = asyncio.create_task(limiter.process_request(send, (1,), {}, 'sendMessage', {'chat_id': 1}, None))
+            await asyncio.sleep(0.05)
+            second = await limiter.process_request(send, (2,), {}, 'sendMessage', {'chat_id': 2}, None)
+            return await first, second
+        finally:
+            await limiter.shutdown()
+
+    assert asyncio.run(main()) == (1, 2)
+    failed_at = calls[0][1]
+    assert sorted(chat_id for chat_id, _ in calls) == [1, 1, 2]
+    # Второй чат тоже ждал конца паузы после 429 в первом
+    assert all(at - failed_at >= 0.95 for _, at in calls[1:])
+
+
+def test_gives_up_after_max_retries():
+    limiter = fast_limiter(max_retries=2)
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        raise RetryAfter(0)
+
+    async def main():
+        await limiter.initialize()
+        try:
+            await limiter.process_request(send, (), {}, 'sendMessage', {'chat_id': 1}, None)
+        finally:
+            await limiter.shutdown()
+
+    with pytest.raises(RetryAfter):
+        asyncio.run(main())
+    assert calls == 3 and limiter.stats['failed'] == 1
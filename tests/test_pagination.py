@@ -0,0 +1,44 @@
+from bot import api
+
+
+def pages(database, store, limit):
+    """Все страницы магазина по курсору: [(id на странице, курсор), ...]"""
+    result = []
+    cursor = None
+    while True:
+        rows, cursor = database.get_promocodes_page(store=store, cursor=cursor, limit=limit)
+        result.append(([row['id'] for row in rows], cursor))
+        if cursor is None:
+            return result
+
+
+def test_page_boundaries(database):
+    ids = [database.add_promocode('PageShop', f"PAGE{i}", 'скидка', '2099-12-31') for i in range(7)]
+    newest_first = ids[::-1]
+    result = pages(database, 'PageShop', 3)
+    assert [page for page, _ in result] == [newest_first[:3], newest_first[3:6], newest_first[6:]]
+    # Ровно на границе: последняя полная страница без курсора, пустой нет
+    result = pages(database, 'PageShop', 7)
+    assert result == [(newest_first, None)]
+    assert [len(page) for page, _ in pages(database, 'PageShop', 1)] == [1] * 7
+
+
+def test_cursor_is_stable_under_inserts(database):
+    ids = [database.add_promocode('CursorShop', f"CURSOR{i}", 'скидка', '2099-12-31') for i in range(6)]
+    first, cursor = database.get_promocodes_page(store='CursorShop', limit=3)
+    # Новые промокоды встают в начало и не сдвигают следующую страницу
+    added = [database.add_promocode('CursorShop', f"CURSORNEW{i}", 'скидка', '2099-12-31') for i in range(3)]
+    second, cursor = database.get_promocodes_page(store='CursorShop', cursor=cursor, limit=3)
+    assert [row['id'] for row in first + second] == ids[::-1]
+    assert cursor is None
+    assert [row['id'] for row in database.get_promocodes_page(store='CursorShop', limit=3)[0]] == added[::-1]
+
+
+def test_search_param_uses_full_text_search(database, monkeypatch):
+    monkeypatch.setattr(api, 'BOT_TOKEN', None)
+    promo_id = database.add_promocode('FtsShop', 'FTSPAGE', 'пагинациятест', '2099-12-31')
+    with api.app.test_client() as client:
+        by_search = client.get('/api/promocodes', query_string={'search': 'пагинациятест', 'user_id': 1}).get_json()
+        by_q = client.get('/api/promocodes', query_string={'q': 'пагинациятест', 'user_id': 1}).get_json()
+    assert [promo['id'] for promo in by_search['promocodes']] == [promo_id]
+    assert by_search == by_q
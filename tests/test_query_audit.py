@@ -0,0 +1,17 @@
+from database import query_audit
+
+
+def test_no_full_scans():
+    """Ни один запрос не читает большую таблицу целиком"""
+    scans = {name: found for name, (plan, found, warnings) in query_audit.audit().items() if found}
+    assert scans == {}
+
+
+def test_scan_by_index_is_a_full_scan():
+    plan = ['SCAN promocodes USING COVERING INDEX idx_promocodes_expires']
+    assert query_audit.find_problems(plan) == (plan, [])
+
+
+def test_allowed_and_constant_scans():
+    plan = ['SCAN channels', 'SCAN CONSTANT ROW', 'SEARCH promocodes USING INDEX idx (is_active=?)']
+    assert query_audit.find_problems(plan) == ([], [])
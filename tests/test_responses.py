@@ -0,0 +1,29 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from bot.responses import PreparedResponse
+
+PAYLOAD = {'promocodes': [{'code': f"CODE{i}", 'description': 'скидка'} for i in range(50)]}
+
+
+def get(prepared, **headers):
+    with Flask(__name__).test_request_context(headers=headers) as context:
+        return prepared.to_response(context.request)
+
+
+def test_brotli_preferred():
+    brotli = pytest.importorskip('brotli')
+    prepared = PreparedResponse(PAYLOAD)
+    response = get(prepared, **{'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.get_data()) == prepared.body
+
+
+def test_gzip_and_not_modified():
+    prepared = PreparedResponse(PAYLOAD)
+    response = get(prepared, **{'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()) == prepared.body
+    assert get(prepared, **{'If-None-Match': response.headers['ETag']}).status_code == 304
@@ -0,0 +1,32 @@
+import json
+
+from database import bulk, search
+
+
+def found(text):
+    return [promo['code'] for promo in search.search_promocodes(text)]
+
+
+def test_index_follows_edits(database):
+    promo = {'store': 'SearchShop', 'code': 'FTSEDIT', 'description': 'ёлочныйтест скидка', 'expires_at': '2099-12-31'}
+    bulk.import_promocodes([json.dumps(promo, ensure_ascii=False)], 'jsonl')
+    # «ё» и «е» - одно и то же, префикс находит по мере набора
+    assert found('елочныйтест') == found('ёлочн') == ['FTSEDIT']
+
+    # Обновление из фида: старый текст из индекса уходит, новый находится
+    promo['description'] = 'новогоднийтест скидка'
+    bulk.import_promocodes([json.dumps(promo, ensure_ascii=False)], 'jsonl')
+    assert found('ёлочныйтест') == []
+    assert found('новогоднийтест') == ['FTSEDIT']
+
+    # Правка руками, снятие с выдачи и удаление - тоже
+    with database.get_connection() as conn:
+        conn.execute("UPDATE promocodes SET store = 'SearchMoved' WHERE code = 'FTSEDIT'")
+    assert found('searchmoved') == ['FTSEDIT'] and found('searchshop') == []
+    with database.get_connection() as conn:
+        promo_id = conn.execute("SELECT id FROM promocodes WHERE code = 'FTSEDIT'").fetchone()[0]
+        conn.execute('UPDATE promocodes SET is_active = 0 WHERE id = ?', (promo_id,))
+    assert found('новогоднийтест') == []
+    database.delete_promocode(promo_id)
+    with database.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM promocodes_fts WHERE promocodes_fts MATCH 'новогоднийтест'").fetchone()[0] == 0
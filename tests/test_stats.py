@@ -0,0 +1,44 @@
+TRUE_COUNTS_SQL = '''
+    SELECT store, COUNT(*) AS total, SUM(is_active IS 1) AS active
+    FROM promocodes GROUP BY store
+'''
+
+
+def assert_counters_match(database):
+    """Счётчики триггеров совпадают с подсчётом по самой таблице"""
+    with database.get_connection() as conn:
+        expected = {row['store']: (row['total'], row['active']) for row in conn.execute(TRUE_COUNTS_SQL)}
+        stores = {row['store']: (row['total'], row['active'])
+                  for row in conn.execute('SELECT * FROM promo_store_counts WHERE total > 0')}
+    assert stores == expected
+    assert database.get_promo_totals() == (sum(t for t, _ in expected.values()), sum(a for _, a in expected.values()))
+
+
+def today(database):
+    with database.get_connection() as conn:
+        return dict(conn.execute("SELECT * FROM promo_stats_history WHERE day = DATE('now')").fetchone())
+
+
+def test_counters_follow_every_write(database):
+    assert_counters_match(database)
+    before = today(database)
+
+    first = database.add_promocode('StatsShop', 'STATS1', 'скидка', '2099-12-31')
+    second = database.add_promocode('StatsShop', 'STATS2', 'скидка', '2099-12-31')
+    assert_counters_match(database)
+
+    with database.get_connection() as conn:
+        conn.execute('UPDATE promocodes SET store = ? WHERE id = ?', ('StatsMoved', first))
+        conn.execute('UPDATE promocodes SET is_active = 0 WHERE id = ?', (second,))
+        # Правка без смены магазина и активности счётчики не трогает
+        conn.execute('UPDATE promocodes SET description = ? WHERE id = ?', ('другая скидка', first))
+    assert_counters_match(database)
+
+    assert database.delete_promocode(second) == 1
+    assert database.delete_promocode(first) == 1
+    assert_counters_match(database)
+
+    after = today(database)
+    assert (after['added'] - before['added'], after['deactivated'] - before['deactivated'],
+            after['deleted'] - before['deleted']) == (2, 1, 2)
+    assert (after['total'], after['active']) == database.get_promo_totals()
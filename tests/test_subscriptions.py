@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from bot.subscriptions import SubscriptionChecker
+
+TOKEN = "123456:TEST"
+
+
+class FlakyTelegramServer(FakeTelegramServer):
+    """Первый getChatMember - 429, дальше - как обычно"""
+
+    def api_getChatMember(self, params):
+        if self.calls['getChatMember'] == 1:
+            return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                         'parameters': {'retry_after': 1}}
+        return super().api_getChatMember(params)
+
+
+class SlowStartServer(FakeTelegramServer):
+    """getMe отвечает не сразу; getChatMember запоминает, был ли уже ответ на getMe"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.started = False
+        self.member_after_start = []
+
+    def api_getMe(self, params):
+        time.sleep(0.2)
+        self.started = True
+        return super().api_getMe(params)
+
+    def api_getChatMember(self, params):
+        self.member_after_start.append(self.started)
+        return super().api_getChatMember(params)
+
+
+def run_checks(server, checks):
+    """checks(checker) - корутина; возвращает её результат"""
+    async def main():
+        checker = SubscriptionChecker(TOKEN, api_url=server.url)
+        try:
+            return await checks(checker)
+        finally:
+            await checker.close()
+
+    try:
+        return asyncio.run(main())
+    finally:
+        server.stop()
+
+
+def test_concurrent_first_checks_wait_for_initialization():
+    server = SlowStartServer().start()
+    results = run_checks(server, lambda checker: asyncio.gather(
+        *(checker.check(user_id, ['channel_one']) for user_id in range(2, 12))
+    ))
+    # Чётные пользователи подписаны (default_member_status)
+    assert results == [{'channel_one': user_id % 2 == 0} for user_id in range(2, 12)]
+    assert server.calls['getMe'] == 1
+    assert server.member_after_start == [True] * 10
+
+
+def test_transient_error_is_raised_and_not_cached():
+    server = FlakyTelegramServer().start()
+
+    async def checks(checker):
+        with pytest.raises(RetryAfter):
+            await checker.check(2, ['channel_one'])
+        return await checker.check(2, ['channel_one'])
+
+    assert run_checks(server, checks) == {'channel_one': True}
+    assert server.calls['getChatMember'] == 2
+
+
+def test_definitive_refusal_is_cached():
+    server = FakeTelegramServer(member_status=lambda user_id, chat_id: None).start()
+
+    async def checks(checker):
+        return [await checker.check(2, ['missing']) for _ in range(2)]
+
+    assert run_checks(server, checks) == [{'missing': False}] * 2
+    assert server.calls['getChatMember'] == 1
+
+
+def test_api_answers_503_on_transient_error(database, monkeypatch):
+    from telegram.error import NetworkError
+    from bot import api
+
+    def unavailable(user_id, channels):
+        raise NetworkError("connection reset")
+
+    monkeypatch.setattr(api, 'BOT_TOKEN', None)
+    monkeypatch.setattr(api, 'check_subscriptions', unavailable)
+    with api.app.test_client() as client:
+        assert client.post('/api/check_subscriptions', json={'user_id': 2}).status_code == 503
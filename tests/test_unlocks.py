@@ -0,0 +1,66 @@
+import pytest
+
+from bot import api
+from bot.webapp_auth import sign_init_data, verify_init_data
+from database import unlocks
+
+TOKEN = "123456:TEST"
+USER = {'id': 777, 'first_name': 'Тест'}
+
+
+def test_ids_round_trip():
+    for ids in ([], [1], [7, 8, 9], list(range(1, 5000, 3)), [2 ** 20]):
+        assert unlocks.to_ids(unlocks.decode(unlocks.encode(unlocks.from_ids(ids)))) == ids
+
+
+def test_unknown_ids_are_dropped(database):
+    last = database.add_promocode('UnlockShop', 'UNLOCK1', 'скидка', '2099-12-31')
+    unlocked, visited = unlocks.update_unlocks(501, unlock=[last, last + 1, 2 ** 31 - 1], visit=[2 ** 27])
+    assert (unlocks.to_ids(unlocked), visited) == ([last], 0)
+    # Новый промокод поднимает границу
+    added = database.add_promocode('UnlockShop', 'UNLOCK2', 'скидка', '2099-12-31')
+    unlocked, _ = unlocks.update_unlocks(501, unlock=[added])
+    assert unlocks.to_ids(unlocked) == [last, added]
+    with pytest.raises(ValueError):
+        unlocks.update_unlocks(501, unlock=[0])
+
+
+def test_init_data_signature():
+    init_data = sign_init_data(USER, TOKEN, query_id='AAE')
+    assert verify_init_data(init_data, TOKEN) == USER
+    assert verify_init_data(init_data, "654321:OTHER") is None
+    assert verify_init_data(init_data.replace('777', '778'), TOKEN) is None
+    assert verify_init_data(sign_init_data(USER, TOKEN, auth_date=1), TOKEN) is None
+    assert verify_init_data('user=%7B%22id%22%3A777%7D', TOKEN) is None
+    assert verify_init_data('', TOKEN) is None
+
+
+def test_api_requires_init_data(database, monkeypatch):
+    monkeypatch.setattr(api, 'BOT_TOKEN', TOKEN)
+    monkeypatch.setattr(api, 'check_subscriptions', lambda user_id, channels: [])
+    last = database.add_promocode('UnlockShop', 'UNLOCK3', 'скидка', '2099-12-31')
+    with api.app.test_client() as client:
+        forged = client.post('/api/unlocks', json={'user_id': USER['id'], 'unlock': [last]})
+        assert forged.status_code == 401
+        response = client.post('/api/unlocks', json={
+            'init_data': sign_init_data(USER, TOKEN), 'unlock': [last], 'user_id': 1,
+        })
+        assert response.status_code == 200 and response.get_json()['unlocked'] == [last]
+        state = client.get('/api/unlocks', headers={'X-Telegram-Init-Data': sign_init_data(USER, TOKEN)})
+        assert state.get_json()['unlocked'] == [last]
+
+
+def test_codes_only_for_subscribers(database, monkeypatch):
+    monkeypatch.setattr(api, 'BOT_TOKEN', TOKEN)
+    promo_id = database.add_promocode('UnlockShop', 'UNLOCK4', 'скидка', '2099-12-31')
+    missing = []
+    monkeypatch.setattr(api, 'check_subscriptions', lambda user_id, channels: missing)
+    body = {'init_data': sign_init_data({'id': 778, 'first_name': 'Тест'}, TOKEN), 'unlock': [promo_id]}
+    with api.app.test_client() as client:
+        catalogue = client.get('/api/catalogue').get_json()
+        assert 'code' not in catalogue['fields']
+        assert 'UNLOCK4' not in str(catalogue['promocodes'])
+        missing.append({'username': 'channel_one'})
+        assert 'codes' not in client.post('/api/unlocks', json=body).get_json()
+        missing.clear()
+        assert client.post('/api/unlocks', json=body).get_json()['codes'] == {str(promo_id): 'UNLOCK4'}
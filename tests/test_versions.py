@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import time
+
+from database.versions import VersionWatcher
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+CHECK_INTERVAL = 0.2
+# Запас на планировщик ОС и чтение: читатель - отдельный процесс
+SLACK = 0.3
+# Второй процесс читает каталог через кэш и печатает, когда увидел
+# промокод STALE_PROMO и канал stale_channel (не дольше READER_TIMEOUT)
+READER_TIMEOUT = 5
+READER = '''
+import sys, time
+from database import db
+db.get_active_promocodes(), db.get_required_channels()
+print('ready', flush=True)
+wanted = {'STALE_PROMO', 'stale_channel'}
+deadline = time.time() + float(sys.argv[1])
+while wanted and time.time() < deadline:
+    seen = {promo['code'] for promo in db.get_active_promocodes()}
+    seen |= {channel['username'] for channel in db.get_required_channels()}
+    for name in wanted & seen:
+        print(name, time.time(), flush=True)
+    wanted -= seen
+    time.sleep(0.005)
+'''
+
+
+def test_other_process_sees_writes_within_interval(database):
+    env = {**os.environ, 'CACHE_VERSION_CHECK_INTERVAL': str(CHECK_INTERVAL)}
+    reader = subprocess.Popen([sys.executable, '-c', READER, str(READER_TIMEOUT)], cwd=ROOT, env=env,
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        assert reader.stdout.readline().strip() == 'ready'
+        windows = {}
+        for name, write in (('STALE_PROMO', lambda: database.add_promocode('Stale', 'STALE_PROMO', 'скидка', '2099-12-31')),
+                            ('stale_channel', lambda: database.add_channel('Stale', 'stale_channel'))):
+            # Записи, не меняющие каталог, снимки не сбрасывают и не мешают
+            database.upsert_user(900001, 'Stale')
+            write()
+            committed = time.time()
+            line = reader.stdout.readline()
+            assert line, f"второй процесс не увидел {name}"
+            seen_name, seen_at = line.split()
+            assert seen_name == name
+            windows[name] = float(seen_at) - committed
+        assert reader.wait(timeout=READER_TIMEOUT) == 0
+    finally:
+        reader.kill()
+    assert all(window <= CHECK_INTERVAL + SLACK for window in windows.values()), windows
+
+
+def test_only_catalogue_writes_count(database):
+    watcher = VersionWatcher(database.DB_PATH, interval=0)
+    watcher.check()
+    database.upsert_user(900002, 'Watcher')
+    watcher.check()
+    assert watcher.external == 0
+    database.add_promocode('Watcher', 'WATCHED', 'скидка', '2099-12-31')
+    watcher.check()
+    assert watcher.external == 1
@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from bot import webhook
+from bot.webhook import BoundedUpdateQueue, OrderedUpdateProcessor
+
+TOKEN = "123456:TEST"
+
+
+def make_update(update_id, user_id):
+    person = {'id': user_id, 'is_bot': False, 'first_name': 'User'}
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': person,
+            'text': '/start',
+        },
+    }, None)
+
+
+def run_updates(processor, updates, delay=0.005):
+    """Прогоняет апдейты через processor как Application (задача на апдейт);
+    возвращает порядок завершения по пользователям и пик параллельности
+    """
+    done = {}
+    running = peak = 0
+
+    async def handle(update):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(delay)
+        running -= 1
+        done.setdefault(update.effective_user.id, []).append(update.update_id)
+
+    async def main():
+        async with processor:
+            tasks = [asyncio.create_task(processor.process_update(update, handle(update)))
+                     for update in updates]
+            await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    return done, peak
+
+
+def test_order_per_user_and_bounded_concurrency():
+    updates = [make_update(i, 100 + i % 5) for i in range(60)]
+    processor = OrderedUpdateProcessor(workers=3, queue_size=100)
+    done, peak = run_updates(processor, updates)
+    for user_id, update_ids in done.items():
+        assert update_ids == sorted(update_ids)
+    assert sum(map(len, done.values())) == len(updates)
+    assert 1 < peak <= 3
+    assert processor.pending == 0 and processor.stats['processed'] == len(updates)
+
+
+def test_busy_user_does_not_block_others():
+    """Очередь одного пользователя не занимает обработчики, пока ждёт"""
+    updates = [make_update(i, 1) for i in range(20)] + [make_update(100, 2)]
+    finished = []
+    processor = OrderedUpdateProcessor(workers=2, queue_size=100)
+
+    async def handle(update):
+        await asyncio.sleep(0.01)
+        finished.append(update.update_id)
+
+    async def main():
+        async with processor:
+            await asyncio.gather(*(processor.process_update(update, handle(update)) for update in updates))
+
+    asyncio.run(main())
+    assert finished.index(100) < 3
+
+
+def test_secret_is_generated_and_passed(monkeypatch, capsys):
+    monkeypatch.setattr(webhook, 'WEBHOOK_SECRET', None)
+    calls = []
+    application = SimpleNamespace(update_processor=OrderedUpdateProcessor(),
+                                  update_queue=BoundedUpdateQueue(),
+                                  run_webhook=lambda **kwargs: calls.append(kwargs))
+    webhook.run_webhook(application)
+    webhook.run_webhook(application)
+    secrets = [call['secret_token'] for call in calls]
+    assert all(len(secret) >= 32 for secret in secrets) and secrets[0] != secrets[1]
+    assert "WEBHOOK_SECRET не задан" in capsys.readouterr().out
+
+
+def test_configured_secret(monkeypatch):
+    monkeypatch.setattr(webhook, 'WEBHOOK_SECRET', 'configured')
+    assert webhook.webhook_secret() == 'configured'
+
+
+def test_intake_waits_when_queue_is_full():
+    """Апдейтов больше queue_size: приём (как обработчик вебхука) ждёт места"""
+    fake = FakeTelegramServer().start()
+    processor = OrderedUpdateProcessor(workers=2, queue_size=5)
+    queue = BoundedUpdateQueue(processor.queue_size)
+    application = (Application.builder().token(TOKEN).base_url(f"{fake.url}/bot")
+                   .updater(None).update_queue(queue).concurrent_updates(processor).build())
+    handled = []
+
+    async def handle(update, context):
+        await asyncio.sleep(0.02)
+        handled.append(update.update_id)
+
+    application.add_handler(TypeHandler(Update, handle))
+
+    async def main():
+        async with application:
+            await application.start()
+            puts = [asyncio.create_task(queue.put(make_update(i, 100 + i))) for i in range(20)]
+            await asyncio.sleep(0.01)
+            # Пять приняты, остальные запросы ещё без ответа
+            waiting = sum(not put.done() for put in puts)
+            await asyncio.gather(*puts)
+            await queue.join()
+            await application.stop()
+            return waiting
+
+    try:
+        waiting = asyncio.run(main())
+    finally:
+        fake.stop()
+    assert waiting == 15
+    assert sorted(handled) == list(range(20))
+    assert queue.stats['max_accepted'] == 5 and queue.stats['waited'] == 15
+    assert queue.accepted == 0 and processor.stats['max_pending'] <= 5
@@ -1,23 +1,83 @@
-from flask import Flask, send_from_directory
+from flask import Flask, abort, request, send_file, send_from_directory
+import json
 import os
 
 app = Flask(__name__)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Сборка из webapp/build.py; если её нет - режим разработки, файлы как есть
+DIST_DIR = os.getenv('WEBAPP_DIST', os.path.join(BASE_DIR, 'dist'))
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+# Файлы с отпечатком в имени не меняются никогда
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# index.html и каталог перепроверяются при каждом открытии (дешёвый 304)
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+ENCODINGS = ('br', 'gzip')
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    with open(MANIFEST_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+manifest = load_manifest()
+
+def choose_encoding(entry):
+    """Лучший предсжатый вариант, который понимает клиент (None - без сжатия)"""
+    accepted = {part.split(';')[0].strip() for part in request.headers.get('Accept-Encoding', '').split(',')}
+    for encoding in ENCODINGS:
+        if encoding in entry['encodings'] and encoding in accepted:
+            return encoding
+    return None
+
+def serve_built(path):
+    """Файл из сборки: предсжатый вариант, ETag, Range и заголовки кэша"""
+    entry = manifest['files'].get('/' + path)
+    if entry is None:
+        abort(404)
+    encoding = choose_encoding(entry)
+    filename = entry['encodings'][encoding]['file'] if encoding else entry['file']
+    # У каждого варианта свои байты - и свой ETag. send_file сам отвечает
+    # 304 по If-None-Match и 206 на Range
+    response = send_file(
+        os.path.join(DIST_DIR, filename),
+        mimetype=entry['type'],
+        etag=f"{entry['etag']}-{encoding}" if encoding else entry['etag'],
+        conditional=True,
+        last_modified=manifest['built_at'],
+    )
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if entry['immutable'] else REVALIDATE_CACHE_CONTROL
+    if entry['encodings']:
+        response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/')
 def serve_index():
-    return send_from_directory('.', 'index.html')
+    if manifest is not None:
+        return serve_built('index.html')
+    return send_from_directory(BASE_DIR, 'index.html')
 
 @app.route('/assets/<path:filename>')
 def serve_assets(filename):
-    return send_from_directory('assets', filename)
+    if manifest is not None:
+        return serve_built(f'assets/{filename}')
+    return send_from_directory(os.path.join(BASE_DIR, 'assets'), filename)
 
 @app.route('/<path:filename>')
 def serve_file(filename):
-    return send_from_directory('.', filename)
+    if manifest is not None:
+        return serve_built(filename)
+    return send_from_directory(BASE_DIR, filename)
 
 if __name__ == '__main__':
+    # В продакшене: python webapp/build.py, затем gunicorn --chdir webapp app:app
     print("🚀 Запускаю веб-сервер для мини-аппы...")
+    if manifest is not None:
+        print(f"📦 Отдаю сборку из {DIST_DIR} ({len(manifest['files'])} файлов)")
+    else:
+        print("🛠️  Сборки нет (python webapp/build.py) - отдаю файлы как есть, режим разработки")
     print("📱 Мини-аппа доступна по адресу: http://localhost:5000")
     print("🖼️  Папка assets доступна по адресу: http://localhost:5000/assets/")
     print("⏹️  Чтобы остановить сервер, нажми Ctrl+C")
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=manifest is None and os.getenv('WEBAPP_DEBUG', '1') == '1')
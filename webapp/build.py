@@ -0,0 +1,160 @@
+"""Сборка мини-аппы для продакшена: отпечатки, предсжатие, манифест.
+
+Файлы из assets/ копируются в dist/assets/ с хэшем содержимого в имени
+(logo_ozon.3f2a9c1d07.png) - такие можно кэшировать навсегда, новая
+версия придёт под другим именем. Ссылки на них в index.html
+переписываются. index.html и catalogue.json сохраняют имена и
+перепроверяются по ETag. Текстовые файлы заранее сжимаются в .gz (и .br,
+если установлен brotli), чтобы сервер не сжимал их на каждый запрос.
+manifest.json описывает всё это для webapp/app.py.
+
+Если есть generated/ от webapp/images.py, вместо исходных картинок в
+сборку идут их оптимизированные варианты, а ссылки index.html
+переписываются на них (логотипы встраиваются как data URI).
+
+Запуск: python webapp/build.py [--out webapp/dist]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import time
+
+import images
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него только .gz
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = 'assets'
+MANIFEST_NAME = 'manifest.json'
+# Файлы корня мини-аппы, которые попадают в сборку под своими именами
+ROOT_FILES = ('index.html', 'catalogue.json')
+# Картинки уже сжаты: gzip их только раздувает
+COMPRESSIBLE = ('.html', '.json', '.js', '.css', '.svg', '.txt')
+# Меньше этого сжимать невыгодно
+MIN_COMPRESS_SIZE = 512
+HASH_LENGTH = 10
+
+ASSET_REF_RE = re.compile(r'(?:\./)?assets/([\w.-]+)')
+
+
+def file_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def fingerprint(name, data):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{file_hash(data)[:HASH_LENGTH]}{ext}"
+
+
+def precompress(path, data):
+    """Пишем .gz и .br рядом с файлом, если они заметно меньше; {кодировка: имя}"""
+    variants = {}
+    if not path.endswith(COMPRESSIBLE) or len(data) < MIN_COMPRESS_SIZE:
+        return variants
+    encoders = [('gzip', '.gz', lambda body: gzip.compress(body, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.insert(0, ('br', '.br', lambda body: brotli.compress(body, quality=11)))
+    for encoding, suffix, encode in encoders:
+        packed = encode(data)
+        if len(packed) < len(data) * 0.9:
+            with open(path + suffix, 'wb') as f:
+                f.write(packed)
+            variants[encoding] = (os.path.basename(path) + suffix, len(packed))
+    return variants
+
+
+def add_file(manifest, out_dir, url_path, data, immutable):
+    """Пишем файл сборки и его запись в манифест"""
+    path = os.path.join(out_dir, *url_path.strip('/').split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    variants = precompress(path, data)
+    directory = os.path.dirname(url_path.strip('/'))
+    manifest['files'][url_path] = {
+        'file': url_path.strip('/'),
+        'type': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+        'size': len(data),
+        'etag': file_hash(data),
+        'immutable': immutable,
+        'encodings': {
+            encoding: {'file': '/'.join(filter(None, (directory, name))), 'size': size}
+            for encoding, (name, size) in variants.items()
+        },
+    }
+
+
+def build(src_dir=BASE_DIR, out_dir=None):
+    """Собираем мини-аппу в out_dir, возвращаем манифест"""
+    out_dir = out_dir or os.path.join(src_dir, 'dist')
+    # Собираем рядом и подменяем каталог целиком: сервер не увидит полсборки
+    tmp_dir = out_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    manifest = {'built_at': time.time(), 'assets': {}, 'files': {}}
+
+    generated_dir = os.path.join(src_dir, os.path.basename(images.OUT_DIR))
+    optimised = images.load_manifest(generated_dir) or {}
+    assets_dir = os.path.join(src_dir, ASSETS_DIR)
+    # Исходники, у которых есть оптимизированные варианты, в сборку не идут
+    sources = [(assets_dir, name) for name in sorted(os.listdir(assets_dir)) if name not in optimised]
+    sources += [(generated_dir, variant['file'])
+                for entry in optimised.values() for variant in entry['variants']]
+    for directory, name in sources:
+        with open(os.path.join(directory, name), 'rb') as f:
+            data = f.read()
+        hashed = f"{ASSETS_DIR}/{fingerprint(name, data)}"
+        manifest['assets'][f"{ASSETS_DIR}/{name}"] = hashed
+        add_file(manifest, tmp_dir, '/' + hashed, data, immutable=True)
+
+    for name in ROOT_FILES:
+        path = os.path.join(src_dir, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        if name.endswith('.html'):
+            text = images.rewrite_html(data.decode('utf-8'), optimised, generated_dir)
+            # Ссылки на assets/ - на имена с отпечатком (неизвестные не трогаем)
+            text = ASSET_REF_RE.sub(
+                lambda m: manifest['assets'].get(f"{ASSETS_DIR}/{m.group(1)}", m.group(0)),
+                text,
+            )
+            data = text.encode('utf-8')
+        add_file(manifest, tmp_dir, '/' + name, data, immutable=False)
+
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сборка мини-аппы для продакшена")
+    parser.add_argument('--src', default=BASE_DIR)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    manifest = build(args.src, args.out)
+    files = manifest['files']
+    size = sum(entry['size'] for entry in files.values())
+    packed = sum(min([entry['size']] + [variant['size'] for variant in entry['encodings'].values()])
+                 for entry in files.values())
+    print(f"✅ Собрано файлов: {len(files)}, {size:,} Б (в лучшем сжатии {packed:,} Б) "
+          f"за {time.perf_counter() - started:.1f} с")
+    for original, hashed in manifest['assets'].items():
+        print(f"   {original} → {hashed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""Оптимизация картинок мини-аппы: уменьшенные WebP/AVIF под плотности экрана.
+
+Исходники в assets/ - логотипы 1000×1000 и фон в полном размере, а на
+телефоне логотип занимает около 128 CSS-пикселей. Для каждой картинки
+из IMAGES пишутся варианты шириной css_width × 1, 2, 3 (не больше
+исходника) в WebP и AVIF, без метаданных (EXIF, ICC, «Software»).
+Маленькие логотипы при сборке (webapp/build.py) встраиваются в
+index.html как data URI, поэтому главный экран не делает ни одного
+запроса за логотипами; фон подключается через image-set с AVIF и WebP.
+
+Обработка инкрементальная: в generated/images.json хранится хэш
+исходника и настроек, неизменившиеся картинки не пересчитываются.
+
+Нужен Pillow (pip install Pillow), сборке без него хватает готового
+generated/. Запуск: python webapp/images.py [--force]
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+OUT_DIR = os.path.join(BASE_DIR, 'generated')
+MANIFEST_NAME = 'images.json'
+
+# Имя исходника: ширина на экране в CSS-пикселях
+IMAGES = {
+    'logo_yamarket.png': 128,
+    'logo_ozon.png': 128,
+    'logo_wb.png': 128,
+    'logo_aliexpress.png': 128,
+    'bg_autumn.webp': 408,
+}
+DENSITIES = (1, 2, 3)
+# Качество подобрано на глаз по логотипам и фону; method=6 - медленнее, но меньше
+FORMATS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 80, 'method': 6},
+}
+# Логотип встраивается в HTML, если вариант для 2x не больше этого
+INLINE_MAX_BYTES = int(os.getenv('INLINE_MAX_BYTES', '12000'))
+INLINE_DENSITY = 2
+INLINE_FORMAT = 'webp'
+
+SETTINGS = json.dumps([IMAGES, DENSITIES, FORMATS], sort_keys=True)
+
+
+def file_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def load_manifest(out_dir=OUT_DIR):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def variant_name(name, width, fmt):
+    return f"{os.path.splitext(name)[0]}-{width}w.{fmt}"
+
+
+def optimise_image(name, data, css_width, out_dir):
+    """Пишем варианты одной картинки, возвращаем её запись для манифеста"""
+    from PIL import Image
+
+    source = Image.open(io.BytesIO(data))
+    source.load()
+    mode = 'RGBA' if 'A' in source.getbands() or 'transparency' in source.info else 'RGB'
+    source = source.convert(mode)
+
+    variants = []
+    widths = sorted({min(css_width * density, source.width) for density in DENSITIES})
+    for width in widths:
+        height = round(source.height * width / source.width)
+        image = source.resize((width, height), Image.LANCZOS) if width != source.width else source.copy()
+        # Без info Pillow не допишет ни ICC-профиль, ни текстовые чанки
+        image.info = {}
+        for fmt, options in FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, fmt.upper(), **options)
+            filename = variant_name(name, width, fmt)
+            with open(os.path.join(out_dir, filename), 'wb') as f:
+                f.write(buffer.getvalue())
+            variants.append({
+                'file': filename,
+                'format': fmt,
+                'width': width,
+                'height': height,
+                'density': round(width / css_width, 2),
+                'size': len(buffer.getvalue()),
+            })
+    return {
+        'hash': file_hash(data),
+        'settings': SETTINGS,
+        'size': len(data),
+        'width': source.width,
+        'height': source.height,
+        'css_width': css_width,
+        'variants': variants,
+    }
+
+
+def optimise(assets_dir=ASSETS_DIR, out_dir=OUT_DIR, force=False):
+    """Обновляем generated/, возвращаем (манифест, имена пересчитанных картинок)"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir) or {}
+    processed = []
+    for name, css_width in IMAGES.items():
+        path = os.path.join(assets_dir, name)
+        if not os.path.exists(path):
+            manifest.pop(name, None)
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        entry = manifest.get(name)
+        fresh = (
+            not force and entry is not None
+            and entry['hash'] == file_hash(data) and entry['settings'] == SETTINGS
+            and all(os.path.exists(os.path.join(out_dir, v['file'])) for v in entry['variants'])
+        )
+        if not fresh:
+            manifest[name] = optimise_image(name, data, css_width, out_dir)
+            processed.append(name)
+
+    # Варианты удалённых исходников и старых настроек больше не нужны
+    keep = {v['file'] for entry in manifest.values() for v in entry['variants']} | {MANIFEST_NAME}
+    for filename in os.listdir(out_dir):
+        if filename not in keep:
+            os.remove(os.path.join(out_dir, filename))
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest, processed
+
+
+def best_variants(entry, fmt):
+    """{плотность: вариант} в формате fmt"""
+    return {v['density']: v for v in entry['variants'] if v['format'] == fmt}
+
+
+def inline_uri(entry, out_dir=OUT_DIR):
+    """data URI для встраивания или None, если картинка великовата"""
+    variants = best_variants(entry, INLINE_FORMAT)
+    variant = variants.get(INLINE_DENSITY) or variants[max(variants)]
+    if variant['size'] > INLINE_MAX_BYTES:
+        return None
+    with open(os.path.join(out_dir, variant['file']), 'rb') as f:
+        encoded = base64.b64encode(f.read()).decode()
+    return f"data:image/{INLINE_FORMAT};base64,{encoded}"
+
+
+def srcset(entry, fmt):
+    return ', '.join(f"assets/{v['file']} {density:g}x" for density, v in sorted(best_variants(entry, fmt).items()))
+
+
+def image_set(entry):
+    """CSS image-set: AVIF, затем WebP, по плотностям"""
+    parts = [f"url('assets/{v['file']}') {density:g}x type('image/{fmt}')"
+             for fmt in FORMATS for density, v in sorted(best_variants(entry, fmt).items())]
+    return f"image-set({', '.join(parts)})"
+
+
+def rewrite_html(html, manifest, out_dir=OUT_DIR):
+    """Ссылки index.html на исходники - на оптимизированные варианты.
+
+    <img src> логотипа становится data URI (или WebP с srcset), а фон в
+    url() - image-set; перед ним остаётся url() на WebP для WebView,
+    которые image-set не понимают.
+    """
+    for name, entry in manifest.items():
+        ref = r'(?:\./)?assets/' + re.escape(name)
+        uri = inline_uri(entry, out_dir)
+        if uri is not None:
+            html = re.sub(r'src="' + ref + '"', f'src="{uri}"', html)
+        else:
+            fallback = best_variants(entry, 'webp')
+            html = re.sub(
+                r'src="' + ref + '"',
+                f'src="assets/{fallback[min(fallback)]["file"]}" srcset="{srcset(entry, "webp")}"',
+                html,
+            )
+        fallback = best_variants(entry, 'webp')
+        html = re.sub(
+            r'(background(?:-image)?:\s*)url\([\'"]?' + ref + r'[\'"]?\);',
+            lambda m: (f"{m.group(1)}url('assets/{fallback[max(fallback)]['file']}');\n"
+                       f"            {m.group(1)}{image_set(entry)};"),
+            html,
+        )
+    return html
+
+
+def report(manifest, out_dir=OUT_DIR):
+    """Строки отчёта: исходник → что реально скачает телефон с экраном 3x"""
+    lines = []
+    before = after = 0
+    for name, entry in manifest.items():
+        uri = inline_uri(entry, out_dir)
+        webp = best_variants(entry, 'webp')
+        avif = best_variants(entry, 'avif')
+        served = min(avif[max(avif)]['size'], webp[max(webp)]['size'])
+        how = f"AVIF/WebP {max(webp):g}x"
+        if uri is not None:
+            served, how = len(uri), "data URI в index.html"
+        before += entry['size']
+        after += served
+        lines.append(f"   {name}: {entry['size']:,} Б → {served:,} Б ({how})")
+    if before:
+        lines.append(f"   итого: {before:,} Б → {after:,} Б (−{1 - after / before:.0%})")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Оптимизация картинок мини-аппы")
+    parser.add_argument('--force', action='store_true', help="пересчитать всё")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    manifest, processed = optimise(force=args.force)
+    print(f"✅ Картинок: {len(manifest)}, пересчитано: {len(processed)} "
+          f"за {time.perf_counter() - started:.1f} с")
+    for line in report(manifest):
+        print(line)
+
+
+if __name__ == '__main__':
+    main()